@@ -1,15 +1,85 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlmodel import create_engine, SQLModel, Session
+from fastapi.concurrency import run_in_threadpool
 import os
 from dotenv import load_dotenv
+from app.migrations import run_migrations
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./bot_gpt.db")
-engine = create_engine(DATABASE_URL, echo=False)
+
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000)),
+    "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
+    "cache_size": -int(os.getenv("SQLITE_CACHE_SIZE_KB", 64 * 1024)),  # negative = KiB
+}
+
+POOL_SETTINGS = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", 10)),
+    "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", 20)),
+    "pool_timeout": float(os.getenv("DB_POOL_TIMEOUT", 30)),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", 1800)),
+}
+
+
+def apply_sqlite_pragmas(engine, pragmas=None):
+    """Run the PRAGMAs on every new connection the engine opens."""
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def create_app_engine(url=DATABASE_URL, pragmas=None, **pool_overrides):
+    """Engine with pragmas for SQLite files and a sized pool for server databases."""
+    backend = make_url(url).get_backend_name()
+    if backend == "sqlite":
+        # Async handlers run DB work on threadpool workers, so a connection may be
+        # used by a different thread than the one that opened it
+        kwargs = {"connect_args": {"check_same_thread": False}}
+        if make_url(url).database not in (None, "", ":memory:"):
+            kwargs.update(pool_size=POOL_SETTINGS["pool_size"],
+                          max_overflow=POOL_SETTINGS["max_overflow"],
+                          pool_timeout=POOL_SETTINGS["pool_timeout"])
+    else:
+        kwargs = {**POOL_SETTINGS, "pool_pre_ping": True}
+    kwargs.update(pool_overrides)
+    engine = create_engine(url, echo=False, **kwargs)
+    if backend == "sqlite":
+        apply_sqlite_pragmas(engine, pragmas)
+    return engine
+
+
+engine = create_app_engine()
+
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "1") != "0"
 
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+    if AUTO_MIGRATE:
+        run_migrations(engine)
 
 def get_session():
     with Session(engine) as session:
-        yield session
\ No newline at end of file
+        yield session
+
+async def run_in_session(db, fn, *args):
+    """Run blocking session work fn(db, *args) on the threadpool.
+
+    The transaction is ended afterwards so no pooled connection stays
+    checked out while the handler awaits an LLM call.
+    """
+    def work():
+        try:
+            return fn(db, *args)
+        finally:
+            db.rollback()
+    return await run_in_threadpool(work)
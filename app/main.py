@@ -1,10 +1,23 @@
-from fastapi import FastAPI
+import logging
+import os
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import create_db_and_tables
-from app.routes import conversations
+from app.database import create_db_and_tables, engine
+from app.middleware import RequestMetricsMiddleware
+from app.routes import conversations, stats
+from app.services.extraction import shutdown_pdf_pool
+from app.services.ingestion import recover_interrupted_jobs
+from app.services.metrics import registry
+
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+)
 
 app = FastAPI(title="BOT GPT Backend")
 
+app.add_middleware(RequestMetricsMiddleware)
+
 # Add CORS
 app.add_middleware(
     CORSMiddleware,
@@ -12,14 +25,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Server-Timing", "X-Profile-Path", "Retry-After"],
 )
 
 @app.on_event("startup")
 def on_startup():
     create_db_and_tables()
+    recover_interrupted_jobs(engine)
+
+@app.on_event("shutdown")
+def on_shutdown():
+    shutdown_pdf_pool()
 
 app.include_router(conversations.router, prefix="/api", tags=["Conversations"])
+app.include_router(stats.router, prefix="/api", tags=["Stats"])
 
 @app.get("/")
 def root():
-    return {"message": "BOT GPT API is running"}
\ No newline at end of file
+    return {"message": "BOT GPT API is running"}
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Request, stage and error metrics in the Prometheus text format"""
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
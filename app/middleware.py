@@ -0,0 +1,64 @@
+import logging
+import time
+from app.services.metrics import REQUEST_SECONDS, end_trace, server_timing, start_trace
+from app.services.profiler import SamplingProfiler, new_profile_path, wants_profile
+
+logger = logging.getLogger(__name__)
+
+
+class RequestMetricsMiddleware:
+    """Times each HTTP request and collects the spans it records.
+
+    The duration runs until the last body chunk is sent, so streamed
+    replies are measured in full. Spans finished before the response
+    starts are returned as a Server-Timing header; the whole trace is
+    logged at DEBUG level. Requests are labelled by route template, not
+    by raw path, to keep the number of series bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"]}
+        profiler = profile_path = None
+        if wants_profile(headers):
+            profile_path = new_profile_path(f"{scope['method']}-{scope['path']}")
+            profiler = SamplingProfiler().start()
+        spans, token = start_trace()
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                extra = []
+                timing = server_timing(spans)
+                if timing:
+                    extra.append((b"server-timing", timing.encode("latin-1")))
+                if profile_path:
+                    extra.append((b"x-profile-path", profile_path.encode("latin-1")))
+                if extra:
+                    message["headers"] = list(message.get("headers", [])) + extra
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - start
+            end_trace(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(elapsed, method=scope["method"], route=route_path, status=status)
+            if logger.isEnabledFor(logging.DEBUG):
+                stages = " ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in spans)
+                logger.debug("%s %s %s %.1fms %s", scope["method"], route_path, status, elapsed * 1000, stages)
+            if profiler is not None:
+                profiler.stop().save(profile_path)
+                logger.info("Profiled %s %s: %d samples written to %s",
+                            scope["method"], scope["path"], profiler.samples, profile_path)
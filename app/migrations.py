@@ -0,0 +1,236 @@
+"""Versioned schema migrations.
+
+`SQLModel.metadata.create_all` only creates missing tables, so every change
+to an existing table is a numbered step below. Applied versions are recorded
+in `schema_version`; each step runs at most once per database and is written
+to be safe on a database whose tables create_all has just built.
+
+Run at startup (unless AUTO_MIGRATE=0) or by hand:
+    python -m app.migrations upgrade | current | history
+"""
+import argparse
+import logging
+import os
+import time
+from datetime import datetime
+from sqlalchemy import inspect, text
+from app.services.document_store import migrate_document_storage
+
+BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", 1000))
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = []
+
+
+def migration(version, name):
+    """Register fn(engine) as schema version `version`."""
+    def register(fn):
+        MIGRATIONS.append((version, name, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+def _column_ddl(engine, ddl):
+    if engine.dialect.name == "postgresql":
+        return ddl.replace("BLOB", "BYTEA")
+    return ddl
+
+
+def add_missing_columns(engine, table, columns):
+    """ALTER TABLE ... ADD COLUMN for every column in {name: ddl} the table lacks.
+
+    Columns are added with a constant default, which both SQLite and
+    PostgreSQL apply without rewriting existing rows.
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table(table):
+        return []
+    existing = {c["name"] for c in inspector.get_columns(table)}
+    added = [name for name in columns if name not in existing]
+    with engine.begin() as conn:
+        for name in added:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {_column_ddl(engine, columns[name])}"))
+    return added
+
+
+def create_index(engine, name, table, columns):
+    """CREATE INDEX IF NOT EXISTS, without blocking writers where the backend allows it.
+
+    PostgreSQL builds it CONCURRENTLY (outside a transaction). SQLite has no
+    online build, but a single index build holds the write lock far shorter
+    than a table rewrite would.
+    """
+    if not inspect(engine).has_table(table):
+        return
+    column_list = ", ".join(columns)
+    if engine.dialect.name == "postgresql":
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({column_list})"))
+    else:
+        with engine.begin() as conn:
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({column_list})"))
+
+
+def backfill_in_batches(engine, table, assignment, batch_size=None, where=None):
+    """UPDATE table SET <assignment> [AND <where>] over id ranges, committing each range.
+
+    Keeps every write transaction short so requests can interleave with
+    the backfill of a large table. Returns the number of batches run.
+    """
+    batch_size = batch_size or BATCH_SIZE
+    with engine.connect() as conn:
+        max_id = conn.execute(text(f"SELECT MAX(id) FROM {table}")).scalar()
+    if max_id is None:
+        return 0
+    condition = f" AND ({where})" if where else ""
+    batches = 0
+    for start in range(0, max_id, batch_size):
+        with engine.begin() as conn:
+            conn.execute(
+                text(f"UPDATE {table} SET {assignment} WHERE id > :start AND id <= :end{condition}"),
+                {"start": start, "end": start + batch_size}
+            )
+        batches += 1
+    return batches
+
+
+@migration(1, "document binary embedding storage")
+def _document_binary_storage(engine):
+    add_missing_columns(engine, "document", {
+        "chunk_count": "INTEGER NOT NULL DEFAULT 0",
+        "embedding_dim": "INTEGER NOT NULL DEFAULT 0",
+        "embedding_matrix": "BLOB",
+    })
+    migrate_document_storage(engine)
+
+
+@migration(2, "conversation summary and message counters")
+def _conversation_counters(engine):
+    add_missing_columns(engine, "conversation", {
+        "summarized_count": "INTEGER NOT NULL DEFAULT 0",
+        "message_count": "INTEGER NOT NULL DEFAULT 0",
+    })
+    # Summaries written before the counter existed were refreshed every 15
+    # messages and cover every complete block. message_count is only
+    # backfilled by version 4, so count the rows here.
+    backfill_in_batches(
+        engine, "conversation",
+        "summarized_count = (SELECT COUNT(*) - COUNT(*) % 15 FROM message "
+        "WHERE message.conversation_id = conversation.id)",
+        where="summary IS NOT NULL AND summarized_count = 0"
+    )
+
+
+@migration(3, "index message (conversation_id, timestamp)")
+def _message_timestamp_index(engine):
+    create_index(engine, "ix_message_conversation_timestamp", "message", ["conversation_id", "timestamp"])
+
+
+@migration(4, "backfill conversation.message_count")
+def _backfill_message_count(engine):
+    # Runs after the message index so every batch is an index range count
+    backfill_in_batches(
+        engine, "conversation",
+        "message_count = (SELECT COUNT(*) FROM message WHERE message.conversation_id = conversation.id)"
+    )
+
+
+@migration(5, "index conversation (user_id, last_updated)")
+def _conversation_list_index(engine):
+    create_index(engine, "ix_conversation_user_last_updated", "conversation", ["user_id", "last_updated"])
+
+
+@migration(6, "foreign-key indexes on document and ingestionjob")
+def _foreign_key_indexes(engine):
+    create_index(engine, "ix_document_conversation_id", "document", ["conversation_id"])
+    create_index(engine, "ix_ingestionjob_conversation_id", "ingestionjob", ["conversation_id"])
+
+
+@migration(7, "document BM25 lexical index column")
+def _document_lexical_index(engine):
+    # Older documents get their BM25 index built from chunks when first loaded
+    add_missing_columns(engine, "document", {"lexical_index": "BLOB"})
+
+
+@migration(8, "document chunking parameters")
+def _document_chunking_params(engine):
+    # Left at 0 / '' for documents chunked by the old fixed 500-word splitter
+    add_missing_columns(engine, "document", {
+        "chunk_max_tokens": "INTEGER NOT NULL DEFAULT 0",
+        "chunk_overlap_tokens": "INTEGER NOT NULL DEFAULT 0",
+        "chunker": "VARCHAR NOT NULL DEFAULT ''",
+    })
+
+
+@migration(9, "ingestion job page progress")
+def _ingestion_page_progress(engine):
+    add_missing_columns(engine, "ingestionjob", {
+        "pages_total": "INTEGER NOT NULL DEFAULT 0",
+        "pages_extracted": "INTEGER NOT NULL DEFAULT 0",
+    })
+
+
+def _ensure_version_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_version ("
+            "version INTEGER PRIMARY KEY, name VARCHAR NOT NULL, applied_at TIMESTAMP NOT NULL)"
+        ))
+
+
+def applied_versions(engine):
+    _ensure_version_table(engine)
+    with engine.connect() as conn:
+        return [row[0] for row in conn.execute(text("SELECT version FROM schema_version ORDER BY version"))]
+
+
+def current_version(engine):
+    versions = applied_versions(engine)
+    return versions[-1] if versions else 0
+
+
+def run_migrations(engine, target=None):
+    """Apply every pending migration up to `target`; returns the versions applied."""
+    done = set(applied_versions(engine))
+    applied = []
+    for version, name, fn in MIGRATIONS:
+        if version in done or (target is not None and version > target):
+            continue
+        start = time.perf_counter()
+        fn(engine)
+        with engine.begin() as conn:
+            conn.execute(
+                text("INSERT INTO schema_version (version, name, applied_at) VALUES (:v, :n, :t)"),
+                {"v": version, "n": name, "t": datetime.utcnow()}
+            )
+        logger.info("Applied migration %d: %s (%.2fs)", version, name, time.perf_counter() - start)
+        applied.append(version)
+    return applied
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.migrations")
+    parser.add_argument("command", choices=["upgrade", "current", "history"])
+    parser.add_argument("--target", type=int, help="stop after this version (upgrade)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    from sqlmodel import SQLModel
+    from app.database import engine
+
+    if args.command == "upgrade":
+        SQLModel.metadata.create_all(engine)
+        applied = run_migrations(engine, args.target)
+        print(f"Schema at version {current_version(engine)} ({len(applied)} applied)")
+    elif args.command == "current":
+        print(current_version(engine))
+    else:
+        done = set(applied_versions(engine))
+        for version, name, _ in MIGRATIONS:
+            print(f"{'*' if version in done else ' '} {version:3d}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 from sqlmodel import SQLModel, Field
+from sqlalchemy import Index
 from datetime import datetime
 from typing import Optional
 
@@ -9,15 +10,21 @@ class User(SQLModel, table=True):
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
 class Conversation(SQLModel, table=True):
+    __table_args__ = (Index("ix_conversation_user_last_updated", "user_id", "last_updated"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: int = Field(foreign_key="user.id")
     title: str
     mode: str = "chat"
     summary: Optional[str] = None
+    summarized_count: int = 0  # messages already folded into summary
+    message_count: int = 0
     created_at: datetime = Field(default_factory=datetime.utcnow)
     last_updated: datetime = Field(default_factory=datetime.utcnow)
 
 class Message(SQLModel, table=True):
+    __table_args__ = (Index("ix_message_conversation_timestamp", "conversation_id", "timestamp"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     conversation_id: int = Field(foreign_key="conversation.id")
     role: str
@@ -26,9 +33,35 @@ class Message(SQLModel, table=True):
 
 class Document(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    conversation_id: int = Field(foreign_key="conversation.id")
+    conversation_id: int = Field(foreign_key="conversation.id", index=True)
     title: str
     text: str
-    chunks: str
-    embeddings: str
-    created_at: datetime = Field(default_factory=datetime.utcnow)
\ No newline at end of file
+    chunks: str = ""  # legacy JSON column, emptied by migrate_document_storage
+    embeddings: str = ""  # legacy JSON column, emptied by migrate_document_storage
+    chunk_count: int = 0
+    embedding_dim: int = 0
+    embedding_matrix: Optional[bytes] = None  # float32, chunk_count x embedding_dim
+    lexical_index: Optional[bytes] = None  # zlib-compressed BM25 postings, see BM25Index
+    chunk_max_tokens: int = 0  # chunking parameters, see ChunkParams; 0 = legacy 500-word chunks
+    chunk_overlap_tokens: int = 0
+    chunker: str = ""
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class DocumentChunk(SQLModel, table=True):
+    document_id: int = Field(foreign_key="document.id", primary_key=True)
+    position: int = Field(primary_key=True)
+    text: str
+class IngestionJob(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    conversation_id: int = Field(foreign_key="conversation.id", index=True)
+    filename: str
+    title: str
+    status: str = "pending"  # pending / running / completed / failed
+    pages_total: int = 0
+    pages_extracted: int = 0
+    chunks_total: int = 0
+    chunks_embedded: int = 0
+    document_id: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
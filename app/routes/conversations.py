@@ -1,16 +1,38 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from sqlmodel import Session, select
-from app.database import get_session
-from app.models import User, Conversation, Message, Document
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Response, UploadFile, File, Form
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlmodel import Session, select, update
+from app.database import get_session, run_in_session
+from app.models import User, Conversation, Message, Document, IngestionJob
 from app.schemas import *
-from app.services.llm_service import call_gemini_chat, call_gemini_rag, generate_summary
-from app.services.rag_service import chunk_text, get_embeddings, retrieve_relevant_chunks
+from app.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, before_cursor, encode_cursor
+from app.services.llm_service import (
+    RAG_FALLBACK, call_gemini_chat_async, call_gemini_rag_async, stream_gemini_chat, stream_gemini_rag
+)
+from app.services.rag_service import (
+    RETRIEVAL_MODE, EmbeddingError, embed_query, format_sources, search_documents
+)
+from app.services.context_builder import pack_context
+from app.services.deletion import (
+    conversation_documents, delete_conversations, delete_document, delete_user_data, invalidate_conversations
+)
+from app.services.document_store import load_conversation_documents
+from app.services.ingestion import (
+    ACTIVE_STATUSES, SUPPORTED_EXTENSIONS, UploadTooLarge, discard_upload, job_to_dict, spool_upload,
+    submit_ingestion
+)
+from app.services.index_cache import index_cache
+from app.services.knowledge_base import DEFAULT_NPROBE, knowledge_base
+from app.services.llm_scheduler import Overloaded, llm_scheduler
+from app.services.metrics import span
+from app.services.response_cache import response_cache
+from app.services.summarizer import needs_summary, schedule_summary
+from app.services.vector_index import ConversationIndex, RetrievalResult
 from datetime import datetime
 import json
-import PyPDF2
-from docx import Document as DocxDocument
-import io
+import logging
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
 @router.post("/users", response_model=dict)
 def create_user(name: str, email: str, db: Session = Depends(get_session)):
@@ -45,8 +67,57 @@ def get_user(user_id: int, db: Session = Depends(get_session)):
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     return {"user_id": user.id, "name": user.name, "email": user.email}
-@router.post("/conversations", response_model=dict)
-def create_conversation(request: CreateConversationRequest, db: Session = Depends(get_session)):
+
+@router.delete("/users/{user_id}", response_model=dict)
+def delete_user(user_id: int, db: Session = Depends(get_session)):
+    """Delete a user together with all of their conversations and documents"""
+    if not db.get(User, user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    deleted = delete_user_data(db, user_id)
+    db.commit()
+    invalidate_conversations(deleted)
+    knowledge_base.drop_user(user_id)
+    
+    return {"status": "deleted", "conversations_deleted": len(deleted)}
+
+@router.get("/users/{user_id}/search", response_model=dict)
+def search_knowledge_base(
+    user_id: int,
+    q: str,
+    top_k: int = Query(5, ge=1, le=50),
+    nprobe: int = Query(DEFAULT_NPROBE, ge=1, description="Index buckets scanned; higher is slower but more exact"),
+    db: Session = Depends(get_session)
+):
+    """Search every document the user has uploaded, across all conversations"""
+    if not db.get(User, user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    try:
+        query_embedding = embed_query(q)
+    except EmbeddingError as e:
+        raise HTTPException(status_code=503, detail=f"Embedding service unavailable: {e}")
+    
+    return {"results": knowledge_base.search(db, user_id, query_embedding, top_k, nprobe)}
+# Upper bound on unsummarized messages loaded per turn; the token budget trims further
+HISTORY_MAX_MESSAGES = 40
+NOT_READY_RETRY_AFTER = 5  # seconds a client waits before asking again while a document is ingested
+
+def _overloaded(error):
+    return HTTPException(
+        status_code=error.status_code, detail=str(error), headers={"Retry-After": str(error.retry_after)}
+    )
+
+def _append_message(db, conv_id, role, content):
+    """Insert a message and bump the denormalized count in the same transaction."""
+    db.add(Message(conversation_id=conv_id, role=role, content=content))
+    db.exec(
+        update(Conversation)
+        .where(Conversation.id == conv_id)
+        .values(message_count=Conversation.message_count + 1)
+    )
+
+def _start_conversation(db, request):
     conv = Conversation(
         user_id=request.user_id,
         title=request.first_message[:50],
@@ -56,113 +127,403 @@ def create_conversation(request: CreateConversationRequest, db: Session = Depend
     db.commit()
     db.refresh(conv)
     
-    user_msg = Message(conversation_id=conv.id, role="user", content=request.first_message)
-    db.add(user_msg)
+    _append_message(db, conv.id, "user", request.first_message)
     db.commit()
-    
-    if request.mode == "chat":
-        response_text = call_gemini_chat(None, [{"role": "user", "content": request.first_message}])
-    else:
-        response_text = "Please upload a document to start RAG conversation."
-    
-    model_msg = Message(conversation_id=conv.id, role="model", content=response_text)
-    db.add(model_msg)
+    return conv.id
+
+def _save_model_message(db, conv_id, response_text):
+    _append_message(db, conv_id, "model", response_text)
+    db.exec(
+        update(Conversation)
+        .where(Conversation.id == conv_id)
+        .values(last_updated=datetime.utcnow())
+    )
     db.commit()
-    
-    return {"conversation_id": conv.id, "response": response_text}
+
+def _recent_messages(db, conv_id, limit=HISTORY_MAX_MESSAGES):
+    """Last `limit` messages, oldest first, read through the (conversation_id, timestamp) index."""
+    rows = db.exec(
+        select(Message.role, Message.content)
+        .where(Message.conversation_id == conv_id)
+        .order_by(Message.timestamp.desc(), Message.id.desc())
+        .limit(limit)
+    ).all()
+    return [{"role": role, "content": content} for role, content in reversed(rows)]
+
+@router.post("/conversations", response_model=dict)
+async def create_conversation(request: CreateConversationRequest, db: Session = Depends(get_session)):
+    if request.mode != "chat":
+        conv_id = await run_in_session(db, _start_conversation, request)
+        response_text = "Please upload a document to start RAG conversation."
+        await run_in_session(db, _save_model_message, conv_id, response_text)
+        return {"conversation_id": conv_id, "response": response_text}
+    
+    # The slot is taken before anything is stored, so a refused request leaves no conversation behind
+    try:
+        async with llm_scheduler.slot(request.user_id):
+            conv_id = await run_in_session(db, _start_conversation, request)
+            response_text = await call_gemini_chat_async(
+                None, [{"role": "user", "content": request.first_message}]
+            )
+            await run_in_session(db, _save_model_message, conv_id, response_text)
+    except Overloaded as e:
+        raise _overloaded(e)
+    
+    return {"conversation_id": conv_id, "response": response_text}
 
 @router.get("/conversations", response_model=List[ConversationResponse])
-def list_conversations(user_id: int, db: Session = Depends(get_session)):
+def list_conversations(
+    user_id: int,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_session)
+):
+    """Most recently updated first; pass the X-Next-Cursor header back as `cursor` for the next page"""
+    query = select(Conversation).where(Conversation.user_id == user_id)
+    if cursor:
+        query = query.where(before_cursor(Conversation.last_updated, Conversation.id, cursor))
     conversations = db.exec(
-        select(Conversation).where(Conversation.user_id == user_id).order_by(Conversation.last_updated.desc())
+        query.order_by(Conversation.last_updated.desc(), Conversation.id.desc()).limit(limit + 1)
     ).all()
+    
+    if len(conversations) > limit:
+        conversations = conversations[:limit]
+        last = conversations[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last.last_updated, last.id)
     return conversations
 
 @router.get("/conversations/{conv_id}", response_model=ConversationDetailResponse)
-def get_conversation(conv_id: int, db: Session = Depends(get_session)):
+def get_conversation(
+    conv_id: int,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    before: Optional[str] = None,
+    db: Session = Depends(get_session)
+):
+    """Newest page of messages (oldest first); pass next_cursor as `before` for older ones.
+    
+    The cursor is also sent as X-Next-Cursor, like the conversation list,
+    whose body stays a plain array for existing clients.
+    """
     conv = db.get(Conversation, conv_id)
     if not conv:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
+    query = select(Message).where(Message.conversation_id == conv_id)
+    if before:
+        query = query.where(before_cursor(Message.timestamp, Message.id, before))
     messages = db.exec(
-        select(Message).where(Message.conversation_id == conv_id).order_by(Message.timestamp)
+        query.order_by(Message.timestamp.desc(), Message.id.desc()).limit(limit + 1)
     ).all()
     
-    return {"conversation": conv, "messages": messages}
+    next_cursor = None
+    if len(messages) > limit:
+        messages = messages[:limit]
+        oldest = messages[-1]
+        next_cursor = encode_cursor(oldest.timestamp, oldest.id)
+        response.headers["X-Next-Cursor"] = next_cursor
+    
+    return {"conversation": conv, "messages": list(reversed(messages)), "next_cursor": next_cursor}
 
-@router.post("/conversations/{conv_id}/messages", response_model=dict)
-def add_message(conv_id: int, request: AddMessageRequest, db: Session = Depends(get_session)):
+def _pending_ingestion(db, conv_id):
+    """The active ingestion job of a conversation that has no document yet, else None."""
+    if db.exec(select(Document.id).where(Document.conversation_id == conv_id)).first():
+        return None
+    return db.exec(
+        select(IngestionJob)
+        .where(IngestionJob.conversation_id == conv_id)
+        .where(IngestionJob.status.in_(ACTIVE_STATUSES))
+    ).first()
+
+def _turn_owner(db, conv_id):
+    """Owner of the conversation a turn is for; checked before anything is stored.
+    
+    Raises 404 if the conversation is gone, and 409 with Retry-After while a
+    RAG conversation's first document is still being ingested.
+    """
     conv = db.get(Conversation, conv_id)
     if not conv:
         raise HTTPException(status_code=404, detail="Conversation not found")
+    if conv.mode != "chat":
+        job = _pending_ingestion(db, conv_id)
+        if job:
+            raise HTTPException(
+                status_code=409,
+                detail={
+                    "error": "Document is still being processed, please try again shortly",
+                    "status": "not_ready",
+                    "job_id": job.id,
+                    "chunks_embedded": job.chunks_embedded,
+                    "chunks_total": job.chunks_total
+                },
+                headers={"Retry-After": str(NOT_READY_RETRY_AFTER)}
+            )
+    return conv.user_id
+
+def _record_user_message(db, conv_id, content):
+    """Store the user's message; returns (conversation fields, unsummarized history as dicts).
     
-    user_msg = Message(conversation_id=conv_id, role="user", content=request.content)
-    db.add(user_msg)
-    db.commit()
-    
-    all_messages = db.exec(
-        select(Message).where(Message.conversation_id == conv_id).order_by(Message.timestamp)
-    ).all()
+    History starts at the first message the summary does not cover rather
+    than sliding with every turn, so prompts keep a stable prefix.
+    """
+    conv = db.get(Conversation, conv_id)
+    if not conv:
+        return None, None
     
-    message_count = len(all_messages)
+    _append_message(db, conv_id, "user", content)
+    db.commit()
+    db.refresh(conv)
     
-    if message_count % 15 == 0 and message_count > 0:
-        start_idx = max(0, message_count - 15)
-        messages_to_summarize = all_messages[start_idx:message_count]
-        msg_dicts = [{"role": m.role, "content": m.content} for m in messages_to_summarize]
-        new_summary = generate_summary(msg_dicts)
-        
-        if conv.summary:
-            conv.summary = f"{conv.summary}\n\n{new_summary}"
+    conv_info = {"mode": conv.mode, "summary": conv.summary, "message_count": conv.message_count,
+                 "user_id": conv.user_id}
+    unsummarized = max(conv.message_count - conv.summarized_count, 1)
+    return conv_info, _recent_messages(db, conv_id, min(unsummarized, HISTORY_MAX_MESSAGES))
+
+def _load_rag_index(db, conv_id):
+    """The conversation's (cached) ConversationIndex, or an error response dict."""
+    doc_id = db.exec(select(Document.id).where(Document.conversation_id == conv_id)).first()
+    if not doc_id:
+        # An upload that started after _turn_owner checked
+        pending_job = _pending_ingestion(db, conv_id)
+        if pending_job:
+            return None, {
+                "error": "Document is still being processed, please try again shortly",
+                "status": "not_ready",
+                "job_id": pending_job.id,
+                "chunks_embedded": pending_job.chunks_embedded,
+                "chunks_total": pending_job.chunks_total
+            }
+        return None, {"error": "No document uploaded for RAG mode"}
+    
+    with span("index.load"):
+        conv_index = index_cache.get_or_load(
+            conv_id, lambda: ConversationIndex.from_documents(load_conversation_documents(db, conv_id))
+        )
+    return conv_index, None
+
+def _rag_context(conv_id, conv_index, question, mode=None, use_cache=True, summary=None):
+    """Retrieve context from a loaded index; needs no database session.
+    
+    Returns {"result", "cached", "cache_slot"}: a semantically matching cached
+    answer skips retrieval, and cache_slot is where a fresh answer is stored.
+    Answers are shared with other conversations over the same documents
+    unless the prompt carries this conversation's summary.
+    """
+    cache_owner = conv_id if summary else None
+    rag = {"result": None, "cached": None, "cache_slot": None}
+    question_embedding = None
+    # Lexical retrieval exists to skip the embedding call, so it never consults the cache
+    if use_cache and response_cache.enabled and len(conv_index) and (mode or RETRIEVAL_MODE) != "lexical":
+        try:
+            question_embedding = embed_query(question)
+        except EmbeddingError as e:
+            logger.warning("Response cache skipped: %s", e)
+            mode = "lexical"  # the embedder is down; don't retry it for retrieval
         else:
-            conv.summary = new_summary
-        
-        db.add(conv)
-        db.commit()
+            with span("response_cache.lookup"):
+                rag["cached"] = response_cache.lookup(cache_owner, conv_index, question_embedding)
+            if rag["cached"]:
+                return rag
+            rag["cache_slot"] = (cache_owner, conv_index, question_embedding)
+    
+    with span("search"):
+        rag["result"] = search_documents(question, conv_index, mode=mode, question_embedding=question_embedding)
+    return rag
+
+def _cache_answer(turn, response_text):
+    if turn["cache_slot"] and response_text != RAG_FALLBACK:
+        cache_owner, conv_index, question_embedding = turn["cache_slot"]
+        response_cache.store(cache_owner, conv_index, question_embedding, response_text, turn["citations"])
+
+async def _prepare_turn(db, conv_id, content, background_tasks, retrieval=None, use_cache=True):
+    """Record the user message and gather summary, history and RAG context for the reply.
     
-    recent_messages = all_messages[-10:]
-    recent_msg_dicts = [{"role": m.role, "content": m.content} for m in recent_messages]
+    Callers hold the turn's model slot, so nothing is stored for a turn that is refused.
+    """
+    with span("db.record_message"):
+        conv, recent_messages = await run_in_session(db, _record_user_message, conv_id, content)
+    if not conv:
+        raise HTTPException(status_code=404, detail="Conversation not found")
     
-    if conv.mode == "chat":
-        response_text = call_gemini_chat(conv.summary, recent_msg_dicts)
+    message_count = conv["message_count"]
+    summary = conv["summary"]
+    
+    # Summarization runs after the reply is sent; this turn uses the last completed summary
+    if needs_summary(message_count):
+        schedule_summary(background_tasks, db.get_bind(), conv_id, message_count)
+    
+    turn = {"mode": conv["mode"], "user_id": conv["user_id"], "summary": summary, "recent": recent_messages,
+            "question": content,
+            "context": None, "citations": [], "cached": None, "cache_slot": None}
+    if conv["mode"] == "chat":
+        with span("context.pack"):
+            packed = pack_context(summary, recent_messages)
+        turn["summary"], turn["recent"] = packed.summary, packed.messages
+        return turn, None
+    
+    with span("retrieval"):
+        conv_index, error = await run_in_session(db, _load_rag_index, conv_id)
+        if error:
+            return None, error
+        # The question is embedded with no database connection checked out
+        rag = await run_in_threadpool(_rag_context, conv_id, conv_index, content, retrieval, use_cache, summary)
+    if rag["cached"]:
+        turn["cached"], turn["citations"] = rag["cached"]
+        return turn, None
+    
+    # RAG prompts carry the summary but not the raw history
+    with span("context.pack"):
+        packed = pack_context(summary, [{"role": "user", "content": content}], rag["result"].sources)
+    result = RetrievalResult(text=format_sources(packed.sources), sources=packed.sources)
+    turn["summary"], turn["question"] = packed.summary, packed.messages[-1]["content"]
+    turn["context"] = result.text if packed.sources else rag["result"].text
+    turn["citations"] = result.citations()
+    turn["cache_slot"] = rag["cache_slot"]
+    return turn, None
+
+@router.post("/conversations/{conv_id}/messages", response_model=dict)
+async def add_message(
+    conv_id: int,
+    request: AddMessageRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_session)
+):
+    user_id = await run_in_session(db, _turn_owner, conv_id)
+    
+    try:
+        async with llm_scheduler.slot(user_id):
+            turn, error = await _prepare_turn(
+                db, conv_id, request.content, background_tasks, request.retrieval, request.use_cache
+            )
+            if error:
+                return error
+            
+            if turn["cached"] is not None:
+                response_text = turn["cached"]
+            else:
+                if turn["mode"] == "chat":
+                    response_text = await call_gemini_chat_async(turn["summary"], turn["recent"])
+                else:
+                    response_text = await call_gemini_rag_async(turn["question"], turn["context"], turn["summary"])
+                    _cache_answer(turn, response_text)
+            
+            with span("db.save_reply"):
+                await run_in_session(db, _save_model_message, conv_id, response_text)
+    except Overloaded as e:
+        raise _overloaded(e)
+    
+    if turn["mode"] == "chat":
+        return {"response": response_text}
+    return {"response": response_text, "citations": turn["citations"], "cached": turn["cached"] is not None}
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _single(text):
+    yield text
+
+async def _stream_turn(db, conv_id, request, background_tasks):
+    try:
+        turn, error = await _prepare_turn(
+            db, conv_id, request.content, background_tasks, request.retrieval, request.use_cache
+        )
+    except HTTPException as e:
+        error = {"error": e.detail}
+    if error:
+        yield _sse("error", error)
+        return
+    
+    if turn["mode"] == "chat":
+        tokens = stream_gemini_chat(turn["summary"], turn["recent"])
+    elif turn["cached"] is not None:
+        tokens = _single(turn["cached"])
     else:
-        doc = db.exec(select(Document).where(Document.conversation_id == conv_id)).first()
-        if not doc:
-            return {"error": "No document uploaded for RAG mode"}
-        
-        chunks = json.loads(doc.chunks)
-        embeddings = json.loads(doc.embeddings)
-        context = retrieve_relevant_chunks(request.content, chunks, embeddings)
-        response_text = call_gemini_rag(request.content, context, conv.summary)
-    
-    model_msg = Message(conversation_id=conv_id, role="model", content=response_text)
-    db.add(model_msg)
-    
-    conv.last_updated = datetime.utcnow()
-    db.add(conv)
-    db.commit()
-    
-    return {"response": response_text}
+        tokens = stream_gemini_rag(turn["question"], turn["context"], turn["summary"])
+    
+    parts = []
+    async for token in tokens:
+        parts.append(token)
+        yield _sse("token", {"text": token})
+    
+    response_text = "".join(parts)
+    if turn["mode"] != "chat" and turn["cached"] is None:
+        _cache_answer(turn, response_text)
+    with span("db.save_reply"):
+        await run_in_session(db, _save_model_message, conv_id, response_text)
+    done = {"response": response_text}
+    if turn["mode"] != "chat":
+        done["citations"] = turn["citations"]
+        done["cached"] = turn["cached"] is not None
+    yield _sse("done", done)
+
+@router.post("/conversations/{conv_id}/messages/stream")
+async def add_message_stream(
+    conv_id: int,
+    request: AddMessageRequest,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_session)
+):
+    """Same as add_message, but streams the reply as server-sent events"""
+    user_id = await run_in_session(db, _turn_owner, conv_id)
+    try:
+        llm_scheduler.check(user_id)
+    except Overloaded as e:
+        raise _overloaded(e)
+    
+    async def events():
+        # The slot is taken before the message is stored; once the response has
+        # started, a turn that still loses its slot is reported as an error event
+        try:
+            async with llm_scheduler.slot(user_id):
+                async for event in _stream_turn(db, conv_id, request, background_tasks):
+                    yield event
+        except Overloaded as e:
+            yield _sse("error", {"error": str(e), "status": "overloaded", "retry_after": e.retry_after})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=background_tasks
+    )
 
 @router.delete("/conversations/{conv_id}", response_model=dict)
 def delete_conversation(conv_id: int, db: Session = Depends(get_session)):
-    conv = db.get(Conversation, conv_id)
-    if not conv:
+    documents = conversation_documents(db, [conv_id])
+    deleted = delete_conversations(db, [conv_id])
+    if not deleted:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    db.exec(select(Message).where(Message.conversation_id == conv_id)).all()
-    for msg in db.exec(select(Message).where(Message.conversation_id == conv_id)):
-        db.delete(msg)
-    
-    db.exec(select(Document).where(Document.conversation_id == conv_id)).all()
-    for doc in db.exec(select(Document).where(Document.conversation_id == conv_id)):
-        db.delete(doc)
-    
-    db.delete(conv)
     db.commit()
+    invalidate_conversations(deleted, documents)
     
     return {"status": "deleted"}
 
+@router.post("/conversations/bulk-delete", response_model=dict)
+def bulk_delete_conversations(request: BulkDeleteRequest, db: Session = Depends(get_session)):
+    query = select(Conversation.id).where(Conversation.id.in_(request.conversation_ids))
+    if request.user_id is not None:
+        query = query.where(Conversation.user_id == request.user_id)
+    documents = conversation_documents(db, query)
+    deleted = delete_conversations(db, query)
+    db.commit()
+    invalidate_conversations(deleted, documents)
+    
+    return {"status": "deleted", "deleted": len(deleted)}
+
+def _conversation_exists(db, conv_id):
+    return db.get(Conversation, conv_id) is not None
+
+def _create_ingestion_job(db, conv_id, filename, title):
+    """Insert a pending job; returns its id, or None if the conversation is gone."""
+    if not db.get(Conversation, conv_id):
+        return None
+    job = IngestionJob(conversation_id=conv_id, filename=filename, title=title)
+    db.add(job)
+    db.commit()
+    return job.id
+
 @router.post("/conversations/{conv_id}/documents", response_model=dict)
 async def upload_document(
     conv_id: int, 
@@ -170,80 +531,73 @@ async def upload_document(
     title: str = Form(None),
     db: Session = Depends(get_session)
 ):
-    conv = db.get(Conversation, conv_id)
-    if not conv:
+    # Session work goes through run_in_session so no connection is held while the upload spools
+    if not await run_in_session(db, _conversation_exists, conv_id):
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    print(f"Uploading file: {file.filename}")
-    file_content = await file.read()
-    
-    if file.filename.endswith('.pdf'):
-        try:
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-            text = ""
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            print(f"Extracted {len(text)} characters from PDF")
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Error reading PDF: {str(e)}")
-    
-    elif file.filename.endswith('.docx'):
-        try:
-            doc = DocxDocument(io.BytesIO(file_content))
-            text = "\n".join([para.text for para in doc.paragraphs])
-            print(f"Extracted {len(text)} characters from DOCX")
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Error reading DOCX: {str(e)}")
-    
-    elif file.filename.endswith('.txt'):
-        try:
-            text = file_content.decode('utf-8')
-            print(f"Extracted {len(text)} characters from TXT")
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Error reading TXT: {str(e)}")
-    
-    else:
+    logger.info("Uploading file: %s", file.filename)
+    if not file.filename.endswith(SUPPORTED_EXTENSIONS):
         raise HTTPException(status_code=400, detail="Unsupported file type. Use PDF, DOCX, or TXT")
     
-    if not text.strip():
-        raise HTTPException(status_code=400, detail="Document is empty or could not extract text")
-    
-    print("Chunking text...")
-    chunks = chunk_text(text)
-    print(f"Created {len(chunks)} chunks")
-    
-    print("Generating embeddings...")
-    embeddings = get_embeddings(chunks)
-    print(f"Generated {len(embeddings)} embeddings")
-    
-    if not embeddings or len(embeddings) != len(chunks):
-        raise HTTPException(status_code=500, detail="Failed to generate embeddings")
-    
+    try:
+        with span("upload.spool"):
+            path = await spool_upload(file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     doc_title = title if title else file.filename
     
-    doc = Document(
-        conversation_id=conv_id,
-        title=doc_title,
-        text=text[:1000],  # Store first 1000 chars only to save space
-        chunks=json.dumps(chunks),
-        embeddings=json.dumps(embeddings)
-    )
-    db.add(doc)
-    db.commit()
+    try:
+        with span("db.create_job"):
+            job_id = await run_in_session(db, _create_ingestion_job, conv_id, file.filename, doc_title)
+    except BaseException:
+        discard_upload(path)
+        raise
+    if job_id is None:
+        discard_upload(path)
+        raise HTTPException(status_code=404, detail="Conversation not found")
     
-    print("Document saved successfully!")
+    submit_ingestion(db.get_bind(), job_id, file.filename, path)
+    logger.info("Queued ingestion job %d", job_id)
     
     return {
-        "status": "uploaded", 
+        "status": "processing",
+        "job_id": job_id,
         "filename": file.filename,
-        "title": doc_title,
-        "chunks_count": len(chunks),
-        "embeddings_count": len(embeddings),
-        "text_length": len(text)
+        "title": doc_title
     }
 
+@router.get("/ingestion-jobs/{job_id}", response_model=dict)
+def get_ingestion_job(job_id: int, db: Session = Depends(get_session)):
+    """Progress and final state of a document ingestion job"""
+    job = db.get(IngestionJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Ingestion job not found")
+    return job_to_dict(job)
+
+@router.get("/conversations/{conv_id}/ingestion-jobs", response_model=list)
+def list_ingestion_jobs(conv_id: int, db: Session = Depends(get_session)):
+    """All ingestion jobs of a conversation, newest first"""
+    jobs = db.exec(
+        select(IngestionJob).where(IngestionJob.conversation_id == conv_id).order_by(IngestionJob.id.desc())
+    ).all()
+    return [job_to_dict(job) for job in jobs]
+
 @router.get("/conversations/{conv_id}/documents", response_model=list)
 def get_conversation_documents(conv_id: int, db: Session = Depends(get_session)):
     """Get all documents for a conversation"""
     docs = db.exec(select(Document).where(Document.conversation_id == conv_id)).all()
-    return [{"id": d.id, "title": d.title, "created_at": d.created_at} for d in docs]
\ No newline at end of file
+    return [{"id": d.id, "title": d.title, "chunk_count": d.chunk_count, "created_at": d.created_at} for d in docs]
+
+@router.delete("/conversations/{conv_id}/documents/{doc_id}", response_model=dict)
+def delete_conversation_document(conv_id: int, doc_id: int, db: Session = Depends(get_session)):
+    """Remove one document; later questions search the remaining ones"""
+    doc = db.get(Document, doc_id)
+    if not doc or doc.conversation_id != conv_id:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    delete_document(db, doc_id)
+    db.commit()
+    index_cache.remove_document(conv_id, doc_id)
+    knowledge_base.remove_documents(db.get(Conversation, conv_id).user_id, [doc_id])
+    
+    return {"status": "deleted"}
\ No newline at end of file
@@ -0,0 +1,37 @@
+from fastapi import APIRouter
+from app.services.index_cache import index_cache
+from app.services.embedding_cache import get_embedding_cache
+from app.services.llm_scheduler import llm_scheduler
+from app.services.rag_service import embed_flights
+from app.services.response_cache import response_cache
+from app.services import summarizer
+
+router = APIRouter()
+
+@router.get("/stats/index-cache", response_model=dict)
+def get_index_cache_stats():
+    """Hit/miss/eviction counters of the document index cache"""
+    return index_cache.stats()
+
+@router.get("/stats/embedding-cache", response_model=dict)
+def get_embedding_cache_stats():
+    """Hit rate of the persistent embedding cache"""
+    cache = get_embedding_cache()
+    if cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **cache.stats()}
+
+@router.get("/stats/response-cache", response_model=dict)
+def get_response_cache_stats():
+    """Hit rate of the semantic RAG answer cache"""
+    return {"enabled": response_cache.enabled, **response_cache.stats()}
+
+@router.get("/stats/llm-scheduler", response_model=dict)
+def get_llm_scheduler_stats():
+    """Model call slots in use, queue depth and admission rejections"""
+    return {**llm_scheduler.stats(), "embedding_calls_collapsed": embed_flights.collapsed}
+
+@router.get("/stats/summarization", response_model=dict)
+def get_summarization_stats():
+    """Background summarization counts, duration and lag"""
+    return summarizer.stats.snapshot()
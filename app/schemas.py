@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 class CreateConversationRequest(BaseModel):
     user_id: int
@@ -9,6 +9,12 @@ class CreateConversationRequest(BaseModel):
 
 class AddMessageRequest(BaseModel):
     content: str
+    retrieval: Optional[Literal["hybrid", "vector", "lexical"]] = None  # RAG only; default RETRIEVAL_MODE
+    use_cache: bool = True  # RAG only; False always generates a fresh answer
+
+class BulkDeleteRequest(BaseModel):
+    conversation_ids: List[int]
+    user_id: Optional[int] = None
 
 class MessageResponse(BaseModel):
     id: int
@@ -25,4 +31,5 @@ class ConversationResponse(BaseModel):
 
 class ConversationDetailResponse(BaseModel):
     conversation: ConversationResponse
-    messages: List[MessageResponse]
\ No newline at end of file
+    messages: List[MessageResponse]
+    next_cursor: Optional[str] = None
\ No newline at end of file
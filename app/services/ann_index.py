@@ -0,0 +1,181 @@
+import os
+import numpy as np
+from app.services.vector_index import normalize_rows
+
+KMEANS_ITERATIONS = 10
+TRAIN_SAMPLES_PER_LIST = 64
+
+
+def spherical_kmeans(vectors, n_clusters, iterations=KMEANS_ITERATIONS, seed=0):
+    """Unit-length centroids that maximise the dot product with their members."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(vectors), n_clusters * TRAIN_SAMPLES_PER_LIST)
+    sample = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+    centroids = sample[rng.choice(len(sample), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        empty = ~sums.any(axis=1)
+        sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+        centroids = normalize_rows(sums)
+    return centroids
+
+
+class IVFIndex:
+    """Inverted-file index over unit vectors, keyed by (document_id, position).
+
+    Vectors are bucketed by their nearest centroid; a search scans only the
+    `nprobe` buckets closest to the query, trading recall for latency. Until
+    there are `min_train` vectors (or with `min_train=None`) everything lives
+    in one bucket and search is exact.
+    """
+
+    def __init__(self, dim, min_train=4096, retrain_factor=4.0):
+        self.dim = dim
+        self.min_train = min_train
+        self.retrain_factor = retrain_factor
+        self.centroids = np.zeros((1, dim), dtype=np.float32)
+        self.trained_size = 0
+        self._empty_lists(1)
+
+    @classmethod
+    def from_documents(cls, dim, documents, min_train=4096):
+        """Bulk-build from (document_id, embeddings) pairs with a single concatenation."""
+        index = cls(dim, min_train)
+        documents = [(doc_id, normalize_rows(emb)) for doc_id, emb in documents if len(emb)]
+        if documents:
+            index._append(
+                np.vstack([vectors for _, vectors in documents]),
+                np.concatenate([np.full(len(v), doc_id, dtype=np.int64) for doc_id, v in documents]),
+                np.concatenate([np.arange(len(v), dtype=np.int64) for _, v in documents]),
+            )
+            if index._should_train():
+                index.train()
+        return index
+
+    def _empty_lists(self, n_lists):
+        self.vectors = [np.zeros((0, self.dim), dtype=np.float32) for _ in range(n_lists)]
+        self.document_ids = [np.zeros(0, dtype=np.int64) for _ in range(n_lists)]
+        self.positions = [np.zeros(0, dtype=np.int64) for _ in range(n_lists)]
+
+    def __len__(self):
+        return sum(len(ids) for ids in self.document_ids)
+
+    @property
+    def is_trained(self):
+        return self.trained_size > 0
+
+    @property
+    def n_lists(self):
+        return len(self.vectors)
+
+    def documents(self):
+        if len(self) == 0:
+            return set()
+        return set(np.unique(np.concatenate(self.document_ids)).tolist())
+
+    def _assign(self, vectors):
+        if not self.is_trained:
+            return np.zeros(len(vectors), dtype=np.int64)
+        return np.argmax(vectors @ self.centroids.T, axis=1)
+
+    def _append(self, vectors, document_ids, positions):
+        lists = self._assign(vectors)
+        for list_id in np.unique(lists):
+            members = lists == list_id
+            self.vectors[list_id] = np.vstack([self.vectors[list_id], vectors[members]])
+            self.document_ids[list_id] = np.concatenate([self.document_ids[list_id], document_ids[members]])
+            self.positions[list_id] = np.concatenate([self.positions[list_id], positions[members]])
+
+    def add(self, document_id, embeddings):
+        """Insert one document's chunk vectors (row i = chunk position i)."""
+        vectors = normalize_rows(embeddings)
+        if len(vectors) == 0:
+            return
+        n = len(vectors)
+        self._append(vectors, np.full(n, document_id, dtype=np.int64), np.arange(n, dtype=np.int64))
+        if self._should_train():
+            self.train()
+
+    def remove(self, document_ids):
+        """Drop every vector of the given documents; returns how many were removed."""
+        document_ids = np.asarray(list(document_ids), dtype=np.int64)
+        removed = 0
+        for list_id in range(self.n_lists):
+            keep = ~np.isin(self.document_ids[list_id], document_ids)
+            removed += int((~keep).sum())
+            self.vectors[list_id] = self.vectors[list_id][keep]
+            self.document_ids[list_id] = self.document_ids[list_id][keep]
+            self.positions[list_id] = self.positions[list_id][keep]
+        return removed
+
+    def _should_train(self):
+        if self.min_train is None or len(self) < self.min_train:
+            return False
+        return not self.is_trained or len(self) > self.trained_size * self.retrain_factor
+
+    def train(self):
+        """(Re)cluster every stored vector; about sqrt(n) buckets."""
+        vectors = np.vstack(self.vectors)
+        document_ids = np.concatenate(self.document_ids)
+        positions = np.concatenate(self.positions)
+        n_lists = max(1, int(np.sqrt(len(vectors))))
+        self.centroids = spherical_kmeans(vectors, n_lists)
+        self.trained_size = len(vectors)
+        self._empty_lists(n_lists)
+        self._append(vectors, document_ids, positions)
+
+    def search(self, query, top_k=5, nprobe=8):
+        """Return (scores, document_ids, positions) of the best top_k vectors."""
+        query = normalize_rows(query)[0]
+        probe = min(nprobe, self.n_lists)
+        if probe < self.n_lists:
+            lists = np.argpartition(-(self.centroids @ query), probe - 1)[:probe]
+        else:
+            lists = range(self.n_lists)
+        lists = [l for l in lists if len(self.document_ids[l])]
+        if not lists:
+            empty = np.zeros(0, dtype=np.int64)
+            return np.zeros(0, dtype=np.float32), empty, empty
+        scores = np.concatenate([self.vectors[l] @ query for l in lists])
+        document_ids = np.concatenate([self.document_ids[l] for l in lists])
+        positions = np.concatenate([self.positions[l] for l in lists])
+        k = min(top_k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k] if k < len(scores) else np.arange(len(scores))
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return scores[best], document_ids[best], positions[best]
+
+    def save(self, path):
+        """Write to `path` (.npz) atomically."""
+        sizes = np.array([len(ids) for ids in self.document_ids], dtype=np.int64)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                dim=self.dim,
+                min_train=-1 if self.min_train is None else self.min_train,
+                retrain_factor=self.retrain_factor,
+                trained_size=self.trained_size,
+                centroids=self.centroids,
+                sizes=sizes,
+                vectors=np.vstack(self.vectors),
+                document_ids=np.concatenate(self.document_ids),
+                positions=np.concatenate(self.positions),
+            )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            min_train = int(data["min_train"])
+            index = cls(int(data["dim"]), None if min_train < 0 else min_train, float(data["retrain_factor"]))
+            index.trained_size = int(data["trained_size"])
+            index.centroids = data["centroids"]
+            offsets = np.concatenate([[0], np.cumsum(data["sizes"])])
+            vectors, document_ids, positions = data["vectors"], data["document_ids"], data["positions"]
+            bounds = list(zip(offsets[:-1], offsets[1:]))
+            index.vectors = [vectors[a:b] for a, b in bounds]
+            index.document_ids = [document_ids[a:b] for a, b in bounds]
+            index.positions = [positions[a:b] for a, b in bounds]
+        return index
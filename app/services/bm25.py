@@ -0,0 +1,121 @@
+import json
+import re
+import zlib
+from collections import Counter
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+")
+K1 = 1.5
+B = 0.75
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """Inverted index over chunks: term -> (chunk rows, term frequencies).
+
+    Built once at ingestion and stored with the document. Per-document
+    indexes concatenate into a conversation-wide one, and IDF is computed
+    at query time so it always reflects the combined corpus.
+    """
+
+    def __init__(self, postings, lengths):
+        self.postings = postings
+        self.lengths = np.asarray(lengths, dtype=np.float32)
+
+    @classmethod
+    def empty(cls):
+        return cls({}, [])
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        postings = {}
+        lengths = []
+        for row, chunk in enumerate(chunks):
+            counts = Counter(tokenize(chunk))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, ([], []))
+                postings[term][0].append(row)
+                postings[term][1].append(tf)
+        return cls(
+            {term: (np.array(rows, dtype=np.int64), np.array(tfs, dtype=np.float32))
+             for term, (rows, tfs) in postings.items()},
+            lengths
+        )
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def to_bytes(self):
+        payload = {
+            "lengths": self.lengths.astype(int).tolist(),
+            "postings": {term: [rows.tolist(), tfs.astype(int).tolist()]
+                         for term, (rows, tfs) in self.postings.items()},
+        }
+        return zlib.compress(json.dumps(payload, separators=(",", ":")).encode())
+
+    @classmethod
+    def from_bytes(cls, data):
+        payload = json.loads(zlib.decompress(data))
+        return cls(
+            {term: (np.array(rows, dtype=np.int64), np.array(tfs, dtype=np.float32))
+             for term, (rows, tfs) in payload["postings"].items()},
+            payload["lengths"]
+        )
+
+    def concat(self, other):
+        """Index whose rows are this index's followed by other's."""
+        offset = len(self)
+        postings = dict(self.postings)
+        for term, (rows, tfs) in other.postings.items():
+            if term in postings:
+                old_rows, old_tfs = postings[term]
+                postings[term] = (np.concatenate([old_rows, rows + offset]), np.concatenate([old_tfs, tfs]))
+            else:
+                postings[term] = (rows + offset, tfs)
+        return BM25Index(postings, np.concatenate([self.lengths, other.lengths]))
+
+    def take(self, keep):
+        """Index over only the rows where the boolean mask `keep` is set, renumbered."""
+        new_row = np.cumsum(keep) - 1
+        postings = {}
+        for term, (rows, tfs) in self.postings.items():
+            kept = keep[rows]
+            if kept.any():
+                postings[term] = (new_row[rows[kept]], tfs[kept])
+        return BM25Index(postings, self.lengths[keep])
+
+    def scores(self, query):
+        scores = np.zeros(len(self), dtype=np.float32)
+        if len(self) == 0:
+            return scores
+        n = len(self)
+        avg_length = max(float(self.lengths.mean()), 1.0)
+        norms = K1 * (1 - B + B * self.lengths / avg_length)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            rows, tfs = posting
+            idf = np.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+            scores[rows] += idf * tfs * (K1 + 1) / (tfs + norms[rows])
+        return scores
+
+    def search(self, query, top_k=3):
+        """(scores, rows) of the best matching chunks; rows with no term match are left out."""
+        scores = self.scores(query)
+        matched = np.flatnonzero(scores > 0)
+        order = matched[np.argsort(-scores[matched], kind="stable")][:top_k]
+        return scores[order], order
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """Fuse ranked row lists into one ranking: score(row) = sum of 1 / (k + rank)."""
+    fused = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: (-item[1], item[0]))
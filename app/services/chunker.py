@@ -0,0 +1,171 @@
+import os
+import re
+from dataclasses import asdict, dataclass
+from app.services.tokens import count_tokens, token_spans
+
+CHUNKER_VERSION = "sentence-v1"
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+MAX_PARAGRAPH_CHARS = 64 * 1024  # longer paragraphs reach the chunker in parts
+
+
+@dataclass(frozen=True)
+class ChunkParams:
+    max_tokens: int = 512
+    overlap_tokens: int = 64
+    version: str = CHUNKER_VERSION
+
+    def __post_init__(self):
+        if self.max_tokens < 1 or not 0 <= self.overlap_tokens < self.max_tokens:
+            raise ValueError("need max_tokens >= 1 and 0 <= overlap_tokens < max_tokens")
+
+    def to_dict(self):
+        return asdict(self)
+
+
+DEFAULT_PARAMS = ChunkParams(
+    max_tokens=int(os.getenv("CHUNK_MAX_TOKENS", 512)),
+    overlap_tokens=int(os.getenv("CHUNK_OVERLAP_TOKENS", 64)),
+)
+
+
+def _cut(buffer, start, max_chars):
+    """(end, next start) for cutting an open paragraph at most max_chars after `start`.
+
+    Cuts after the last sentence, else the last word, in the second half of
+    the window, so every cut moves on by at least max_chars // 2.
+    """
+    low, stop = start + max_chars // 2, start + max_chars
+    last = None
+    for last in SENTENCE_END.finditer(buffer, low, stop):
+        pass
+    if last is not None:
+        return last.start(), last.end()
+    space = max(buffer.rfind(" ", low, stop), buffer.rfind("\n", low, stop))
+    if space != -1:
+        return space, space + 1
+    return stop, stop
+
+
+def iter_paragraphs(pieces, max_chars=MAX_PARAGRAPH_CHARS):
+    """Paragraphs of a text given as one string or an iterable of pieces (e.g. pages).
+
+    Yields (text, starts_paragraph). A paragraph still open after more than
+    max_chars is yielded in parts, cut after a sentence where possible, and
+    only the first part starts the paragraph. Each piece is scanned once and
+    at most about max_chars of text is buffered.
+    """
+    if isinstance(pieces, str):
+        pieces = (pieces,)
+    buffer, starts = "", True
+    for piece in pieces:
+        # A break spanning two pieces begins in the buffer's trailing whitespace
+        scan = len(buffer.rstrip())
+        buffer += piece
+        start = 0
+        for match in PARAGRAPH_BREAK.finditer(buffer, scan):
+            paragraph = buffer[start:match.start()].strip()
+            if paragraph:
+                yield paragraph, starts
+            starts = True
+            start = match.end()
+        while len(buffer) - start > max_chars:
+            end, next_start = _cut(buffer, start, max_chars)
+            part = buffer[start:end].strip()
+            if part:
+                yield part, starts
+                starts = False
+            start = next_start
+        buffer = buffer[start:]
+    if buffer.strip():
+        yield buffer.strip(), starts
+
+
+def iter_sentences(paragraph):
+    start = 0
+    for match in SENTENCE_END.finditer(paragraph):
+        yield paragraph[start:match.start()]
+        start = match.end()
+    if start < len(paragraph):
+        yield paragraph[start:]
+
+
+def _windows(text, params):
+    """Split one over-long sentence into max_tokens windows that overlap."""
+    spans = token_spans(text)
+    step = params.max_tokens - params.overlap_tokens
+    for first in range(0, len(spans), step):
+        last = min(first + params.max_tokens, len(spans)) - 1
+        yield text[spans[first][0]:spans[last][1]], last - first + 1
+        if last == len(spans) - 1:
+            break
+
+
+def _last_tokens(text, n):
+    """The last n tokens of text (as a substring) and how many there are."""
+    spans = token_spans(text)[-n:] if n else []
+    return (text[spans[0][0]:], len(spans)) if spans else ("", 0)
+
+
+def _join(units):
+    parts = []
+    for text, _, new_paragraph in units:
+        if parts:
+            parts.append("\n\n" if new_paragraph else " ")
+        parts.append(text)
+    return "".join(parts)
+
+
+def _tail(units, budget):
+    """Trailing whole units that fit in `budget` tokens, carried into the next chunk."""
+    kept, total = [], 0
+    for unit in reversed(units):
+        if total + unit[1] > budget:
+            break
+        kept.append(unit)
+        total += unit[1]
+    return kept[::-1], total
+
+
+def iter_chunks(pieces, params=DEFAULT_PARAMS):
+    """Yield chunks of at most params.max_tokens tokens.
+
+    Chunks break at sentence ends (and keep paragraph breaks), and each one
+    repeats up to params.overlap_tokens tokens of whole sentences from the
+    end of the previous chunk. A sentence longer than max_tokens is split
+    into overlapping token windows.
+    """
+    units, total = [], 0  # (text, tokens, starts_paragraph)
+    fresh = 0  # tokens in `units` not yet emitted as part of a chunk
+
+    for paragraph, new_paragraph in iter_paragraphs(pieces):
+        for sentence in iter_sentences(paragraph):
+            tokens = count_tokens(sentence)
+            if tokens == 0:
+                continue
+            if tokens > params.max_tokens:
+                if fresh:
+                    yield _join(units)
+                for window, _ in _windows(sentence, params):
+                    yield window
+                carry, total = _last_tokens(window, params.overlap_tokens)
+                units, fresh = ([(carry, total, False)] if total else []), 0
+                new_paragraph = False
+                continue
+            if total + tokens > params.max_tokens:
+                budget = min(params.overlap_tokens, params.max_tokens - tokens)
+                if fresh:
+                    yield _join(units)
+                    units, total = _tail(units, budget)
+                    fresh = 0
+                else:
+                    # Only a window's overlap is held; keep as much of it as still fits
+                    carry, total = _last_tokens(units[0][0], budget)
+                    units = [(carry, total, False)] if total else []
+            units.append((sentence, tokens, new_paragraph))
+            total += tokens
+            fresh += tokens
+            new_paragraph = False
+
+    if fresh:
+        yield _join(units)
@@ -0,0 +1,101 @@
+"""Token-budgeted prompt assembly.
+
+Prompt parts are ordered from least to most volatile: instructions, the
+conversation summary, history from a fixed anchor (the first message the
+summary does not cover), and last the per-turn retrieved context and
+question. Between two summaries each prompt extends the previous one, so
+provider-side prefix caching can reuse it.
+"""
+import os
+from dataclasses import dataclass, field, replace
+from typing import List, Optional
+from app.services.tokens import count_tokens, head_tokens, tail_tokens
+from app.services.vector_index import ChunkSource
+
+PROMPT_OVERHEAD_TOKENS = 64  # instructions and per-message role markers
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@dataclass(frozen=True)
+class ContextBudget:
+    max_tokens: int = 8000
+    summary_tokens: int = 1000
+    document_tokens: int = 3000
+
+    def __post_init__(self):
+        if min(self.max_tokens, self.summary_tokens, self.document_tokens) < 1:
+            raise ValueError("token budgets must be >= 1")
+        if self.summary_tokens + self.document_tokens + PROMPT_OVERHEAD_TOKENS >= self.max_tokens:
+            raise ValueError("summary_tokens + document_tokens must leave room for the question")
+
+
+DEFAULT_BUDGET = ContextBudget(
+    max_tokens=int(os.getenv("CONTEXT_MAX_TOKENS", 8000)),
+    summary_tokens=int(os.getenv("CONTEXT_SUMMARY_TOKENS", 1000)),
+    document_tokens=int(os.getenv("CONTEXT_DOCUMENT_TOKENS", 3000)),
+)
+
+
+@dataclass
+class PackedContext:
+    summary: Optional[str]
+    messages: List[dict]
+    sources: List[ChunkSource] = field(default_factory=list)
+    tokens: int = 0
+    dropped_messages: int = 0
+    dropped_sources: int = 0
+
+
+def _message_tokens(message):
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def pack_context(summary, messages, sources=(), budget=DEFAULT_BUDGET):
+    """Fit summary, history and retrieved sources into budget.max_tokens.
+
+    messages are oldest first and end with the current question, which is
+    always kept (cut short only if it alone exceeds the budget). Then:
+    the summary, keeping its most recent part, up to summary_tokens;
+    sources in rank order up to document_tokens (the first one is cut to
+    fit rather than dropped); and as much history, newest first, as the
+    remainder allows. Dropped history is always the oldest.
+    """
+    remaining = budget.max_tokens - PROMPT_OVERHEAD_TOKENS
+    question = messages[-1]
+    if _message_tokens(question) > remaining:
+        question = {**question, "content": head_tokens(question["content"], remaining - MESSAGE_OVERHEAD_TOKENS)}
+    remaining -= _message_tokens(question)
+
+    if summary:
+        summary = tail_tokens(summary, min(budget.summary_tokens, remaining))
+        remaining -= count_tokens(summary)
+
+    kept_sources, document_room = [], min(budget.document_tokens, remaining)
+    for source in sources:
+        cost = count_tokens(source.text) + MESSAGE_OVERHEAD_TOKENS
+        if cost > document_room:
+            if not kept_sources and document_room > MESSAGE_OVERHEAD_TOKENS:
+                kept_sources.append(replace(source, text=head_tokens(source.text, document_room - MESSAGE_OVERHEAD_TOKENS)))
+                document_room = 0
+            break
+        kept_sources.append(source)
+        document_room -= cost
+    remaining -= sum(count_tokens(s.text) + MESSAGE_OVERHEAD_TOKENS for s in kept_sources)
+
+    history = []
+    for message in reversed(messages[:-1]):
+        cost = _message_tokens(message)
+        if cost > remaining:
+            break
+        history.append(message)
+        remaining -= cost
+    history.reverse()
+
+    return PackedContext(
+        summary=summary or None,
+        messages=history + [question],
+        sources=kept_sources,
+        tokens=budget.max_tokens - remaining,
+        dropped_messages=len(messages) - 1 - len(history),
+        dropped_sources=len(sources) - len(kept_sources),
+    )
@@ -0,0 +1,58 @@
+from sqlmodel import delete, select
+from app.models import Conversation, Document, DocumentChunk, IngestionJob, Message, User
+from app.services.index_cache import index_cache
+from app.services.knowledge_base import knowledge_base
+
+
+def delete_conversations(db, conv_ids):
+    """Remove conversations and everything hanging off them with one
+    set-based DELETE per table. Does not commit; returns the ids removed.
+    """
+    conv_ids = list(db.exec(select(Conversation.id).where(Conversation.id.in_(conv_ids))).all())
+    if not conv_ids:
+        return []
+
+    doc_ids = select(Document.id).where(Document.conversation_id.in_(conv_ids))
+    db.exec(delete(DocumentChunk).where(DocumentChunk.document_id.in_(doc_ids)))
+    db.exec(delete(Document).where(Document.conversation_id.in_(conv_ids)))
+    db.exec(delete(Message).where(Message.conversation_id.in_(conv_ids)))
+    db.exec(delete(IngestionJob).where(IngestionJob.conversation_id.in_(conv_ids)))
+    db.exec(delete(Conversation).where(Conversation.id.in_(conv_ids)))
+    return conv_ids
+
+
+def conversation_documents(db, conv_ids):
+    """{user_id: [document ids]} for the given conversations; read it before deleting them."""
+    rows = db.exec(
+        select(Conversation.user_id, Document.id)
+        .join(Document, Document.conversation_id == Conversation.id)
+        .where(Conversation.id.in_(conv_ids))
+    ).all()
+    documents = {}
+    for user_id, document_id in rows:
+        documents.setdefault(user_id, []).append(document_id)
+    return documents
+
+
+def delete_document(db, document_id):
+    """Remove a document and its chunks. Does not commit."""
+    db.exec(delete(DocumentChunk).where(DocumentChunk.document_id == document_id))
+    db.exec(delete(Document).where(Document.id == document_id))
+
+
+def delete_user_data(db, user_id):
+    """Remove a user and all of their conversations. Does not commit."""
+    conv_ids = select(Conversation.id).where(Conversation.user_id == user_id)
+    deleted = delete_conversations(db, conv_ids)
+    db.exec(delete(User).where(User.id == user_id))
+    return deleted
+
+
+def invalidate_conversations(conv_ids, documents=None):
+    """Drop cached indexes, and the `documents` from conversation_documents
+    from their owners' knowledge bases, once the delete has been committed.
+    """
+    for conv_id in conv_ids:
+        index_cache.invalidate_conversation(conv_id)
+    for user_id, document_ids in (documents or {}).items():
+        knowledge_base.remove_documents(user_id, document_ids)
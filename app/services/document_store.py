@@ -0,0 +1,131 @@
+import json
+import logging
+import numpy as np
+from sqlalchemy import inspect, text
+from sqlmodel import select
+from app.models import Document, DocumentChunk
+from app.services.bm25 import BM25Index
+
+EMBEDDING_DTYPE = np.float32
+
+logger = logging.getLogger(__name__)
+
+
+def encode_embeddings(embeddings):
+    """Pack a list of vectors into a float32 row-major blob."""
+    if len(embeddings) == 0:
+        return b"", 0
+    matrix = np.asarray(embeddings, dtype=EMBEDDING_DTYPE)
+    if matrix.ndim != 2:
+        matrix = matrix.reshape(len(embeddings), -1)
+    return matrix.tobytes(), matrix.shape[1]
+
+
+def load_embeddings(doc):
+    """Zero-copy (read-only) view of a document's embedding matrix."""
+    if not doc.embedding_matrix:
+        return np.zeros((0, doc.embedding_dim), dtype=EMBEDDING_DTYPE)
+    matrix = np.frombuffer(doc.embedding_matrix, dtype=EMBEDDING_DTYPE)
+    return matrix.reshape(doc.chunk_count, doc.embedding_dim)
+
+
+def store_document_content(db, doc, chunks, embeddings):
+    """Attach chunks, embeddings and a BM25 index to a (possibly unsaved) document.
+
+    Returns the BM25Index so callers can reuse it without decoding.
+    """
+    blob, dim = encode_embeddings(embeddings)
+    lexical = BM25Index.from_chunks(chunks)
+    doc.embedding_matrix = blob
+    doc.embedding_dim = dim
+    doc.chunk_count = len(chunks)
+    doc.lexical_index = lexical.to_bytes()
+    db.add(doc)
+    db.flush()
+    db.add_all([
+        DocumentChunk(document_id=doc.id, position=i, text=chunk)
+        for i, chunk in enumerate(chunks)
+    ])
+    return lexical
+
+
+def load_chunks(db, document_id):
+    rows = db.exec(
+        select(DocumentChunk.text)
+        .where(DocumentChunk.document_id == document_id)
+        .order_by(DocumentChunk.position)
+    ).all()
+    return list(rows)
+
+
+def load_chunk(db, document_id, position):
+    chunk = db.get(DocumentChunk, (document_id, position))
+    return chunk.text if chunk else None
+
+
+def load_conversation_documents(db, conversation_id):
+    """(document_id, title, chunks, embeddings, lexical) for every document of a conversation.
+
+    Two queries regardless of how many documents there are.
+    """
+    docs = db.exec(
+        select(Document)
+        .where(Document.conversation_id == conversation_id)
+        .order_by(Document.id)
+    ).all()
+    if not docs:
+        return []
+    chunks = {doc.id: [] for doc in docs}
+    rows = db.exec(
+        select(DocumentChunk.document_id, DocumentChunk.text)
+        .where(DocumentChunk.document_id.in_(list(chunks)))
+        .order_by(DocumentChunk.document_id, DocumentChunk.position)
+    ).all()
+    for document_id, chunk in rows:
+        chunks[document_id].append(chunk)
+    return [(doc.id, doc.title, chunks[doc.id], load_embeddings(doc), load_lexical_index(doc))
+            for doc in docs]
+
+
+def load_lexical_index(doc):
+    """The stored BM25 index, or None for documents stored before it existed."""
+    return BM25Index.from_bytes(doc.lexical_index) if doc.lexical_index else None
+
+
+def migrate_document_storage(engine):
+    """Move legacy JSON chunks/embeddings into the binary layout.
+
+    Converts every row that still carries JSON, one document per
+    transaction. Expects the binary columns to exist already. Works in
+    plain SQL on the columns of that layout, not through the Document
+    model, which maps columns later migrations add; the BM25 index of a
+    converted document is built when it is first loaded.
+    """
+    if not inspect(engine).has_table("document"):
+        return 0
+
+    with engine.connect() as conn:
+        legacy_ids = conn.execute(text(
+            "SELECT id FROM document WHERE embedding_matrix IS NULL AND embeddings != ''"
+        )).scalars().all()
+    for doc_id in legacy_ids:
+        with engine.begin() as conn:
+            chunks, embeddings = conn.execute(
+                text("SELECT chunks, embeddings FROM document WHERE id = :id"), {"id": doc_id}
+            ).one()
+            chunks = json.loads(chunks)
+            blob, dim = encode_embeddings(json.loads(embeddings))
+            conn.execute(
+                text("UPDATE document SET embedding_matrix = :matrix, embedding_dim = :dim, "
+                     "chunk_count = :count, chunks = '', embeddings = '' WHERE id = :id"),
+                {"matrix": blob, "dim": dim, "count": len(chunks), "id": doc_id}
+            )
+            if chunks:
+                conn.execute(
+                    text("INSERT INTO documentchunk (document_id, position, text) "
+                         "VALUES (:document_id, :position, :text)"),
+                    [{"document_id": doc_id, "position": i, "text": chunk} for i, chunk in enumerate(chunks)]
+                )
+    if legacy_ids:
+        logger.info("Migrated %d documents to binary embedding storage", len(legacy_ids))
+    return len(legacy_ids)
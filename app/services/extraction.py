@@ -0,0 +1,119 @@
+"""Streaming text extraction from spooled uploads.
+
+Extractors yield a document piece by piece (PDF pages, DOCX paragraphs,
+blocks of a text file) so the chunker can consume them without the whole
+text ever being joined into one string. Large PDFs are split into page
+ranges that a process pool extracts in parallel; pages are still yielded
+in order.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import PyPDF2
+from docx import Document as DocxDocument
+
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", min(4, os.cpu_count() or 1)))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 16))
+PDF_PAGES_PER_TASK = 8
+TEXT_READ_CHARS = 1 << 20
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class ExtractionError(Exception):
+    pass
+
+
+def _extract_pdf_pages(path, start, stop):
+    """Text of pages [start, stop); runs in a worker process."""
+    reader = PyPDF2.PdfReader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def get_pdf_pool():
+    """Process pool for PDF extraction, started on first use.
+
+    Uses spawn so workers never inherit the server's threads or sockets.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def shutdown_pdf_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(cancel_futures=True)
+            _pool = None
+
+
+def count_pages(filename, path):
+    """Number of PDF pages; other formats count as a single page."""
+    if os.path.splitext(filename)[1].lower() != ".pdf":
+        return 1
+    try:
+        return len(PyPDF2.PdfReader(path).pages)
+    except Exception as e:
+        raise ExtractionError(f"Error reading PDF: {str(e)}")
+
+
+def iter_pdf_pages(path):
+    reader = PyPDF2.PdfReader(path)
+    n_pages = len(reader.pages)
+    if PDF_WORKERS <= 1 or n_pages < PDF_PARALLEL_MIN_PAGES:
+        for page in reader.pages:
+            yield (page.extract_text() or "") + "\n"
+        return
+
+    pool = get_pdf_pool()
+    futures = [
+        pool.submit(_extract_pdf_pages, path, start, min(start + PDF_PAGES_PER_TASK, n_pages))
+        for start in range(0, n_pages, PDF_PAGES_PER_TASK)
+    ]
+    try:
+        for future in futures:
+            for page in future.result():
+                yield page + "\n"
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def iter_docx_paragraphs(path):
+    for para in DocxDocument(path).paragraphs:
+        yield para.text + "\n"
+
+
+def iter_text_blocks(path):
+    # The text layer decodes incrementally, so multi-byte characters split
+    # across reads come out whole
+    with open(path, encoding="utf-8") as f:
+        while block := f.read(TEXT_READ_CHARS):
+            yield block
+
+
+EXTRACTORS = {
+    ".pdf": ("PDF", iter_pdf_pages),
+    ".docx": ("DOCX", iter_docx_paragraphs),
+    ".txt": ("TXT", iter_text_blocks),
+}
+
+
+def iter_pages(filename, path):
+    """Yield the text of the file at `path` in document order."""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in EXTRACTORS:
+        raise ExtractionError("Unsupported file type. Use PDF, DOCX, or TXT")
+    label, extractor = EXTRACTORS[extension]
+    try:
+        yield from extractor(path)
+    except Exception as e:
+        raise ExtractionError(f"Error reading {label}: {str(e)}")
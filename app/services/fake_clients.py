@@ -0,0 +1,136 @@
+import asyncio
+import hashlib
+import threading
+import time
+import numpy as np
+from types import SimpleNamespace
+
+
+def hash_embedding(text, dim=768):
+    """Deterministic unit vector derived from the text's SHA-256."""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class FakeEmbeddingModels:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def embed_content(self, model, contents, config=None):
+        owner = self.owner
+        if isinstance(contents, str):
+            contents = [contents]
+        with owner.lock:
+            owner.requests += 1
+            owner.items += len(contents)
+            attempt = owner.requests
+        if owner.latency or owner.per_item_latency:
+            time.sleep(owner.latency + owner.per_item_latency * len(contents))
+        if attempt <= owner.fail_first:
+            raise RuntimeError("fake embedding failure")
+        return SimpleNamespace(embeddings=[
+            SimpleNamespace(values=hash_embedding(text, owner.dim)) for text in contents
+        ])
+
+
+class FakeEmbeddingClient:
+    """Offline stand-in for genai.Client exposing models.embed_content.
+
+    `latency` is paid per request and `per_item_latency` per content, so
+    batching and concurrency can be benchmarked without the network.
+    """
+
+    def __init__(self, dim=768, latency=0.0, per_item_latency=0.0, fail_first=0):
+        self.dim = dim
+        self.latency = latency
+        self.per_item_latency = per_item_latency
+        self.fail_first = fail_first
+        self.requests = 0
+        self.items = 0
+        self.lock = threading.Lock()
+        self.models = FakeEmbeddingModels(self)
+
+
+def _last_text(contents):
+    if isinstance(contents, str):
+        return contents
+    last = contents[-1] if contents else {}
+    return last.get("parts", [{}])[-1].get("text", "")
+
+
+class FakeGenerationModels:
+    def __init__(self, owner):
+        self.owner = owner
+
+    def _enter(self):
+        with self.owner.lock:
+            self.owner.requests += 1
+            self.owner.in_flight += 1
+            self.owner.max_in_flight = max(self.owner.max_in_flight, self.owner.in_flight)
+
+    def _exit(self, contents):
+        with self.owner.lock:
+            self.owner.in_flight -= 1
+        if self.owner.reply is not None:
+            return SimpleNamespace(text=self.owner.reply)
+        return SimpleNamespace(text=f"Echo: {_last_text(contents)[-200:]}")
+
+    def generate_content(self, model, contents, config=None):
+        self._enter()
+        if self.owner.latency:
+            time.sleep(self.owner.latency)
+        return self._exit(contents)
+
+
+class FakeAsyncGenerationModels(FakeGenerationModels):
+    async def generate_content(self, model, contents, config=None):
+        self._enter()
+        if self.owner.latency:
+            await asyncio.sleep(self.owner.latency)
+        return self._exit(contents)
+
+    async def generate_content_stream(self, model, contents, config=None):
+        response = await self.generate_content(model, contents, config)
+        words = response.text.split(" ")
+
+        async def chunks():
+            for i, word in enumerate(words):
+                yield SimpleNamespace(text=word if i == 0 else " " + word)
+        return chunks()
+
+
+class FakeLLMClient:
+    """Offline stand-in for genai.Client generation with a fixed latency.
+
+    Answers echo the last prompt text (or return the canned `reply`),
+    through both the blocking `models` interface and the `aio.models`
+    coroutine interface.
+    """
+
+    def __init__(self, latency=0.0, reply=None):
+        self.latency = latency
+        self.reply = reply
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self.models = FakeGenerationModels(self)
+        self.aio = SimpleNamespace(models=FakeAsyncGenerationModels(self))
+
+
+class LocalClient:
+    """Deterministic, network-free genai.Client: hash embeddings and echo generation.
+
+    Backs LLM_PROVIDER=local, so the whole request path can be load tested
+    offline with the latencies of a real provider dialled in.
+    """
+
+    def __init__(self, llm_latency=0.0, embed_latency=0.0, dim=768, reply=None):
+        self.embedder = FakeEmbeddingClient(dim=dim, latency=embed_latency)
+        self.llm = FakeLLMClient(latency=llm_latency, reply=reply)
+        self.models = SimpleNamespace(
+            embed_content=self.embedder.models.embed_content,
+            generate_content=self.llm.models.generate_content,
+        )
+        self.aio = self.llm.aio
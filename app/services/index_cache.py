@@ -0,0 +1,122 @@
+import os
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class ConversationIndexCache:
+    """Process-wide LRU of merged conversation indexes with a memory budget.
+
+    Uploads and deletions patch a cached index in place of dropping it, so
+    adding the tenth document does not reload the first nine. Each change
+    also bumps the conversation's generation, so a load that read the
+    database before the change is returned but not cached.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._generations = {}  # conversation id -> count of adds, removes and invalidations
+        self._epoch = 0  # bumped by clear(), which forgets the generations
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, conversation_id):
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(conversation_id)
+            self.hits += 1
+            return entry
+
+    def put(self, conversation_id, index):
+        with self._lock:
+            self._store(conversation_id, index)
+        return index
+
+    def get_or_load(self, conversation_id, loader):
+        """Return the cached index, building it with loader() -> ConversationIndex on a miss."""
+        entry = self.get(conversation_id)
+        if entry is not None:
+            return entry
+        with self._lock:
+            generation = self._generation(conversation_id)
+        index = loader()
+        with self._lock:
+            if self._generation(conversation_id) == generation:
+                self._store(conversation_id, index)
+        return index
+
+    def add_document(self, conversation_id, document_id, title, chunks, embeddings, lexical=None):
+        """Merge a newly stored document into the cached index, if there is one."""
+        with self._lock:
+            self._bump(conversation_id)
+            entry = self._entries.get(conversation_id)
+            if entry is not None:
+                self._store(conversation_id, entry.with_document(document_id, title, chunks, embeddings, lexical))
+
+    def remove_document(self, conversation_id, document_id):
+        with self._lock:
+            self._bump(conversation_id)
+            entry = self._entries.get(conversation_id)
+            if entry is not None:
+                self._store(conversation_id, entry.without_document(document_id))
+
+    def invalidate_conversation(self, conversation_id):
+        with self._lock:
+            self._bump(conversation_id)
+            self._remove(conversation_id)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self._generations.clear()
+            self._epoch += 1
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _store(self, conversation_id, index):
+        self._remove(conversation_id)
+        nbytes = index.nbytes
+        if nbytes > self.max_bytes:
+            return
+        self._entries[conversation_id] = index
+        self._sizes[conversation_id] = nbytes
+        self.current_bytes += nbytes
+        while self.current_bytes > self.max_bytes:
+            evicted, _ = self._entries.popitem(last=False)
+            self.current_bytes -= self._sizes.pop(evicted)
+            self.evictions += 1
+
+    def _generation(self, conversation_id):
+        return self._epoch, self._generations.get(conversation_id, 0)
+
+    def _bump(self, conversation_id):
+        self._generations[conversation_id] = self._generations.get(conversation_id, 0) + 1
+
+    def _remove(self, conversation_id):
+        if self._entries.pop(conversation_id, None) is not None:
+            self.current_bytes -= self._sizes.pop(conversation_id)
+
+
+index_cache = ConversationIndexCache(int(os.getenv("INDEX_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)))
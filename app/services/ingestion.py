@@ -0,0 +1,238 @@
+import glob
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import Session, update
+from app.models import Conversation, Document, IngestionJob
+from app.services.chunker import DEFAULT_PARAMS as CHUNK_PARAMS
+from app.services.document_store import store_document_content
+from app.services.extraction import count_pages, iter_pages
+from app.services.index_cache import index_cache
+from app.services.knowledge_base import knowledge_base
+from app.services.metrics import span
+from app.services.rag_service import chunk_text, get_embeddings
+
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".txt")
+ACTIVE_STATUSES = ("pending", "running")
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 50 * 1024 * 1024))
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None
+SPOOL_PREFIX = "botgpt-upload-"
+UPLOAD_READ_SIZE = 1024 * 1024
+PREVIEW_CHARS = 1000  # stored on Document.text
+PROGRESS_INTERVAL = 0.5
+
+executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("INGEST_WORKERS", 2)),
+    thread_name_prefix="ingest"
+)
+_futures = {}
+_futures_lock = threading.Lock()
+logger = logging.getLogger(__name__)
+
+
+class IngestionError(Exception):
+    pass
+
+
+class UploadTooLarge(IngestionError):
+    pass
+
+
+async def spool_upload(upload, max_bytes=None):
+    """Copy an UploadFile to a temp file in fixed-size reads; returns its path.
+
+    The upload is never held in memory as a whole. Raises UploadTooLarge
+    (and removes the partial file) once more than `max_bytes` arrive.
+    """
+    max_bytes = MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    if upload.size is not None and upload.size > max_bytes:
+        raise UploadTooLarge(f"File exceeds the {max_bytes} byte upload limit")
+    suffix = os.path.splitext(upload.filename)[1].lower()
+    spool = tempfile.NamedTemporaryFile(prefix=SPOOL_PREFIX, suffix=suffix, dir=UPLOAD_SPOOL_DIR, delete=False)
+    size = 0
+    try:
+        with spool:
+            while block := await upload.read(UPLOAD_READ_SIZE):
+                size += len(block)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"File exceeds the {max_bytes} byte upload limit")
+                await run_in_threadpool(spool.write, block)
+    except BaseException:
+        discard_upload(spool.name)
+        raise
+    return spool.name
+
+
+def discard_upload(path):
+    """Delete a spooled upload; a missing file is fine."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class _PageProgress:
+    """Wraps a page stream: keeps a text preview and reports pages_extracted.
+
+    Job updates are throttled to one commit per PROGRESS_INTERVAL seconds.
+    """
+
+    def __init__(self, pages, report, preview_chars=PREVIEW_CHARS):
+        self.pages = pages
+        self.report = report
+        self.preview_chars = preview_chars
+        self.preview = ""
+        self.count = 0
+        self.has_text = False
+
+    def __iter__(self):
+        last_report = time.monotonic()
+        for page in self.pages:
+            self.count += 1
+            if len(self.preview) < self.preview_chars:
+                self.preview = (self.preview + page)[:self.preview_chars]
+            self.has_text = self.has_text or bool(page.strip())
+            if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                self.report(self.count)
+                last_report = time.monotonic()
+            yield page
+        self.report(self.count)
+
+
+def _update_job(db, job, **fields):
+    for name, value in fields.items():
+        setattr(job, name, value)
+    job.updated_at = datetime.utcnow()
+    db.add(job)
+    db.commit()
+
+
+def _fail_job(db, job_id, error):
+    """Mark a job failed, unless it was deleted along with its conversation meanwhile."""
+    try:
+        db.rollback()
+        job = db.get(IngestionJob, job_id)
+        if job is not None:
+            _update_job(db, job, status="failed", error=error)
+    except Exception:
+        db.rollback()
+        logger.exception("Could not record the failure of ingestion job %d", job_id)
+
+
+def run_ingestion(engine, job_id, filename, path):
+    """Extract, chunk, embed and store the spooled upload at `path`, then delete it."""
+    with Session(engine) as db:
+        job = db.get(IngestionJob, job_id)
+        try:
+            _update_job(db, job, status="running", pages_total=count_pages(filename, path))
+            
+            # Pages flow straight into the chunker; the full text is never joined
+            pages = _PageProgress(
+                iter_pages(filename, path),
+                lambda done: _update_job(db, job, pages_extracted=done)
+            )
+            with span("ingest.extract_chunk"):
+                chunks = chunk_text(pages, CHUNK_PARAMS)
+            if not pages.has_text:
+                raise IngestionError("Document is empty or could not extract text")
+            logger.info("Extracted %d pages into %d chunks", pages.count, len(chunks))
+            _update_job(db, job, chunks_total=len(chunks))
+            
+            def report(done, total):
+                _update_job(db, job, chunks_embedded=done)
+            
+            with span("ingest.embed"):
+                embeddings = get_embeddings(chunks, progress=report)
+            if len(embeddings) != len(chunks):
+                raise IngestionError("Failed to generate embeddings")
+            
+            doc = Document(
+                conversation_id=job.conversation_id,
+                title=job.title,
+                text=pages.preview,  # Store first 1000 chars only to save space
+                chunk_max_tokens=CHUNK_PARAMS.max_tokens,
+                chunk_overlap_tokens=CHUNK_PARAMS.overlap_tokens,
+                chunker=CHUNK_PARAMS.version
+            )
+            with span("ingest.store"):
+                lexical = store_document_content(db, doc, chunks, embeddings)
+                db.commit()
+            index_cache.add_document(job.conversation_id, doc.id, doc.title, chunks, embeddings, lexical)
+            conv = db.get(Conversation, job.conversation_id)
+            knowledge_base.add_document(conv.user_id, doc.id, embeddings)
+            
+            _update_job(db, job, status="completed", document_id=doc.id, chunks_embedded=len(chunks))
+            logger.info("Ingestion job %d completed: document %d", job_id, doc.id)
+        except Exception as e:
+            logger.warning("Ingestion job %d failed: %s", job_id, e)
+            _fail_job(db, job_id, str(e))
+        finally:
+            discard_upload(path)
+
+
+def submit_ingestion(engine, job_id, filename, path):
+    """Queue ingestion of a spooled upload; the worker owns (and deletes) `path`."""
+    future = executor.submit(run_ingestion, engine, job_id, filename, path)
+    with _futures_lock:
+        _futures[job_id] = future
+    future.add_done_callback(lambda _: _forget(job_id))
+    return future
+
+
+def _forget(job_id):
+    with _futures_lock:
+        _futures.pop(job_id, None)
+
+
+def recover_interrupted_jobs(engine, spool_dir=None):
+    """Fail the jobs a previous process left pending or running, and delete its spooled uploads.
+
+    Jobs run in this process's executor, so at startup none of them can
+    still be in progress. Assumes one server process per database.
+    """
+    with Session(engine) as db:
+        result = db.exec(
+            update(IngestionJob)
+            .where(IngestionJob.status.in_(ACTIVE_STATUSES))
+            .values(status="failed", error="Interrupted by a server restart", updated_at=datetime.utcnow())
+        )
+        db.commit()
+    spool_dir = spool_dir or UPLOAD_SPOOL_DIR or tempfile.gettempdir()
+    leftovers = glob.glob(os.path.join(spool_dir, SPOOL_PREFIX + "*"))
+    for path in leftovers:
+        discard_upload(path)
+    if result.rowcount or leftovers:
+        logger.warning("Recovered %d interrupted ingestion jobs and %d spooled uploads",
+                       result.rowcount, len(leftovers))
+    return result.rowcount
+
+
+def wait_for_job(job_id, timeout=None):
+    """Block until a submitted job finishes (no-op if it already has)."""
+    with _futures_lock:
+        future = _futures.get(job_id)
+    if future is not None:
+        future.result(timeout=timeout)
+
+
+def job_to_dict(job):
+    return {
+        "job_id": job.id,
+        "conversation_id": job.conversation_id,
+        "filename": job.filename,
+        "title": job.title,
+        "status": job.status,
+        "pages_total": job.pages_total,
+        "pages_extracted": job.pages_extracted,
+        "chunks_total": job.chunks_total,
+        "chunks_embedded": job.chunks_embedded,
+        "document_id": job.document_id,
+        "error": job.error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+    }
@@ -0,0 +1,156 @@
+import os
+import threading
+from collections import defaultdict
+from sqlmodel import select
+from app.models import Conversation, Document, DocumentChunk
+from app.services.ann_index import IVFIndex
+from app.services.document_store import load_embeddings
+
+DEFAULT_DIR = "./ann_indexes"
+DEFAULT_NPROBE = 16
+DEFAULT_MIN_TRAIN = 4096
+
+
+def _min_train():
+    """ANN_ENABLED=0 keeps every user index flat, i.e. exact search."""
+    if os.getenv("ANN_ENABLED", "1") == "0":
+        return None
+    return int(os.getenv("ANN_MIN_TRAIN", DEFAULT_MIN_TRAIN))
+
+
+class KnowledgeBase:
+    """One IVF index per user over every document they have uploaded.
+
+    Indexes are built from stored embeddings on first search, persisted as
+    `<directory>/user_<id>.npz`, and patched on upload and delete. Searches
+    also drop documents that have since disappeared from the database.
+    """
+
+    def __init__(self, directory=DEFAULT_DIR, min_train=DEFAULT_MIN_TRAIN):
+        self.directory = directory
+        self.min_train = min_train
+        self._indexes = {}
+        self._locks = defaultdict(threading.Lock)
+        self._locks_guard = threading.Lock()
+
+    def _lock(self, user_id):
+        with self._locks_guard:
+            return self._locks[user_id]
+
+    def path(self, user_id):
+        return os.path.join(self.directory, f"user_{user_id}.npz")
+
+    def _save(self, user_id, index):
+        os.makedirs(self.directory, exist_ok=True)
+        index.save(self.path(user_id))
+
+    def _cached(self, user_id):
+        """In-memory or on-disk index, or None if it has never been built."""
+        index = self._indexes.get(user_id)
+        if index is None and os.path.exists(self.path(user_id)):
+            index = self._indexes[user_id] = IVFIndex.load(self.path(user_id))
+        return index
+
+    def _build(self, db, user_id):
+        docs = db.exec(
+            select(Document)
+            .join(Conversation, Conversation.id == Document.conversation_id)
+            .where(Conversation.user_id == user_id)
+            .where(Document.chunk_count > 0)
+            .order_by(Document.id)
+        ).all()
+        if not docs:
+            return None
+        index = IVFIndex.from_documents(
+            docs[0].embedding_dim, [(doc.id, load_embeddings(doc)) for doc in docs], self.min_train
+        )
+        self._save(user_id, index)
+        return index
+
+    def get(self, db, user_id):
+        with self._lock(user_id):
+            index = self._cached(user_id)
+            if index is None:
+                index = self._build(db, user_id)
+                if index is not None:
+                    self._indexes[user_id] = index
+            return index
+
+    def add_document(self, user_id, document_id, embeddings):
+        """Insert into an existing index; unbuilt ones pick the document up on first search."""
+        with self._lock(user_id):
+            index = self._cached(user_id)
+            if index is None or document_id in index.documents():
+                return
+            index.add(document_id, embeddings)
+            self._save(user_id, index)
+
+    def remove_documents(self, user_id, document_ids):
+        with self._lock(user_id):
+            index = self._cached(user_id)
+            if index is not None and index.remove(document_ids):
+                self._save(user_id, index)
+
+    def drop_user(self, user_id):
+        with self._lock(user_id):
+            self._indexes.pop(user_id, None)
+            if os.path.exists(self.path(user_id)):
+                os.remove(self.path(user_id))
+
+    def clear(self):
+        """Forget in-memory indexes (files stay on disk)."""
+        with self._locks_guard:
+            self._indexes.clear()
+
+    def search(self, db, user_id, query_embedding, top_k=5, nprobe=DEFAULT_NPROBE):
+        """Best chunks across all of a user's documents, with provenance."""
+        index = self.get(db, user_id)
+        if index is None:
+            return []
+        with self._lock(user_id):
+            # Over-fetch a little so stale rows can be dropped without a short page
+            scores, document_ids, positions = index.search(query_embedding, top_k * 2, nprobe)
+        if len(scores) == 0:
+            return []
+
+        wanted = set(document_ids.tolist())
+        docs = {
+            doc_id: (title, conv_id)
+            for doc_id, title, conv_id in db.exec(
+                select(Document.id, Document.title, Document.conversation_id)
+                .join(Conversation, Conversation.id == Document.conversation_id)
+                .where(Document.id.in_(wanted))
+                .where(Conversation.user_id == user_id)
+            ).all()
+        }
+        stale = wanted - set(docs)
+        if stale:
+            self.remove_documents(user_id, stale)
+
+        hits = [
+            (float(score), int(doc_id), int(position))
+            for score, doc_id, position in zip(scores, document_ids, positions)
+            if doc_id in docs
+        ][:top_k]
+        texts = dict(
+            ((doc_id, position), text)
+            for doc_id, position, text in db.exec(
+                select(DocumentChunk.document_id, DocumentChunk.position, DocumentChunk.text)
+                .where(DocumentChunk.document_id.in_({doc_id for _, doc_id, _ in hits}))
+                .where(DocumentChunk.position.in_({position for _, _, position in hits}))
+            ).all()
+        )
+        return [
+            {
+                "document_id": doc_id,
+                "conversation_id": docs[doc_id][1],
+                "title": docs[doc_id][0],
+                "chunk": position,
+                "score": round(score, 4),
+                "text": texts.get((doc_id, position), ""),
+            }
+            for score, doc_id, position in hits
+        ]
+
+
+knowledge_base = KnowledgeBase(os.getenv("ANN_INDEX_DIR", DEFAULT_DIR), _min_train())
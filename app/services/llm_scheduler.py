@@ -0,0 +1,221 @@
+"""Admission control for model calls, and collapsing of duplicate calls.
+
+LLMScheduler bounds how many generation calls run at once. A call over
+the limit waits in its user's queue, and users are served round-robin,
+so one user's burst cannot starve the others. A call is rejected up
+front, rather than queued until it times out into a fallback reply, when:
+
+- its user already has LLM_MAX_QUEUED_PER_USER calls waiting (429);
+- the queue is full, or the expected wait exceeds LLM_QUEUE_TIMEOUT_SECONDS (503).
+
+Rejections carry a Retry-After estimate. The scheduler lives on the
+event loop; only check() may be called from other threads.
+
+SingleFlight (threads) and AsyncSingleFlight (coroutines) let concurrent
+identical requests share one call.
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from contextlib import asynccontextmanager
+from app.services.metrics import registry
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))  # 0 disables admission control
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", 64))
+LLM_MAX_QUEUED_PER_USER = int(os.getenv("LLM_MAX_QUEUED_PER_USER", 4))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", 10))
+SERVICE_TIME_ALPHA = 0.2  # weight of the newest call in the service time average
+
+LLM_REJECTIONS = registry.counter(
+    "botgpt_llm_rejections_total", "Generation calls refused by admission control", ("reason",)
+)
+
+
+class Overloaded(Exception):
+    """No model capacity for this call; retry after `retry_after` seconds."""
+
+    def __init__(self, message, status_code, retry_after):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY, max_queue=LLM_MAX_QUEUE,
+                 max_queued_per_user=LLM_MAX_QUEUED_PER_USER, max_wait=LLM_QUEUE_TIMEOUT,
+                 service_time=1.0):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_queued_per_user = max_queued_per_user
+        self.max_wait = max_wait
+        self.service_time = service_time  # moving average of seconds per call
+        self.active = 0
+        self._queues = OrderedDict()  # user -> waiting futures; key order is the round-robin order
+        self._queued = 0
+        self._counts = {"admitted": 0, "queued": 0, "rejected": 0, "timed_out": 0}
+
+    @property
+    def enabled(self):
+        return self.max_concurrency > 0
+
+    def estimated_wait(self):
+        """Seconds a call arriving now would wait for a slot."""
+        if self.active < self.max_concurrency and not self._queued:
+            return 0.0
+        return (self._queued + 1) * self.service_time / self.max_concurrency
+
+    def _reject(self, reason, message, status_code, wait):
+        self._counts["rejected"] += 1
+        LLM_REJECTIONS.inc(reason=reason)
+        return Overloaded(message, status_code, max(1, math.ceil(wait)))
+
+    def check(self, user):
+        """Raise Overloaded if a call for `user` would be refused right now."""
+        if not self.enabled:
+            return
+        wait = self.estimated_wait()
+        if not wait:
+            return
+        if len(self._queues.get(user, ())) >= self.max_queued_per_user:
+            raise self._reject("user_queue", "Too many requests in progress for this user", 429, wait)
+        if self._queued >= self.max_queue:
+            raise self._reject("queue_full", "The model is at capacity, please retry shortly", 503, wait)
+        if wait > self.max_wait:
+            raise self._reject("deadline", "The model is at capacity, please retry shortly", 503, wait)
+
+    async def acquire(self, user):
+        """Take a call slot, waiting in `user`'s queue if all are busy."""
+        if not self.enabled:
+            return
+        self.check(user)
+        self._counts["admitted"] += 1
+        if self.active < self.max_concurrency and not self._queued:
+            self.active += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(user, deque()).append(waiter)
+        self._queued += 1
+        self._counts["queued"] += 1
+        try:
+            await asyncio.wait_for(waiter, self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # the slot arrived just as we gave up; pass it on
+            else:
+                self._discard(user, waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self._counts["timed_out"] += 1
+                LLM_REJECTIONS.inc(reason="timeout")
+                raise Overloaded("Timed out waiting for the model", 503,
+                                 max(1, math.ceil(self.estimated_wait()))) from None
+            raise
+
+    def _discard(self, user, waiter):
+        queue = self._queues.get(user)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        self._queued -= 1
+        if not queue:
+            del self._queues[user]
+
+    def release(self, elapsed=None):
+        """Free a slot, handing it to the next user in turn; `elapsed` updates the service time."""
+        if not self.enabled:
+            return
+        if elapsed is not None:
+            self.service_time += SERVICE_TIME_ALPHA * (elapsed - self.service_time)
+        while self._queues:
+            user, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            self._queued -= 1
+            if queue:
+                self._queues.move_to_end(user)
+            else:
+                del self._queues[user]
+            if waiter.done():
+                continue
+            try:
+                waiter.set_result(None)  # the slot moves to the waiter; active is unchanged
+                return
+            except RuntimeError:
+                continue  # its event loop is gone
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, user):
+        await self.acquire(user)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "max_concurrency": self.max_concurrency,
+            "active": self.active,
+            "waiting": self._queued,
+            "waiting_users": len(self._queues),
+            "service_time_seconds": self.service_time,
+            "estimated_wait_seconds": self.estimated_wait() if self.enabled else 0.0,
+            **self._counts,
+        }
+
+
+llm_scheduler = LLMScheduler()
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one; the others wait for its result."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.collapsed = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+            else:
+                self.collapsed += 1
+        if not leader:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines; a cancelled caller does not cancel the shared call."""
+
+    def __init__(self):
+        self._calls = {}
+        self.collapsed = 0
+
+    async def do(self, key, make_coro):
+        task = self._calls.get(key)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(make_coro())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.collapsed += 1
+        return await asyncio.shield(task)
@@ -1,33 +1,95 @@
-from google import genai
-import os
-from dotenv import load_dotenv
+import logging
+from app.services.metrics import LLM_ERRORS, LLM_FALLBACKS, span
+from app.services.providers import get_client, set_client
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+MODEL_NAME = "gemini-2.5-flash-lite"
+SUMMARY_FALLBACK = "Previous conversation context."
+CHAT_FALLBACK = "Sorry, I'm having trouble responding right now."
+RAG_FALLBACK = "Sorry, I couldn't process your question."
 
-def generate_summary(messages):
-    try:
-        message_text = "\n".join([f"{m['role']}: {m['content']}" for m in messages])
-        
-        prompt = f"""Summarize this conversation concisely in 2-3 sentences:
+def set_llm_client(new_client):
+    """Swap the generation client (e.g. for FakeLLMClient); returns the previous one."""
+    return set_client("llm", new_client)
+
+def _failed(operation, error, fallback=True):
+    logger.warning("%s call failed: %s", operation, error)
+    LLM_ERRORS.inc(operation=operation)
+    if fallback:
+        LLM_FALLBACKS.inc(operation=operation)
+
+def build_summary_prompt(messages):
+    message_text = "\n".join([f"{m['role']}: {m['content']}" for m in messages])
+
+    return f"""Summarize this conversation concisely in 2-3 sentences:
 
 {message_text}
 
 Summary:"""
-        
-        response = client.models.generate_content(
-            model="gemini-2.5-flash-lite",
-            contents=prompt
-        )
+
+RAG_INSTRUCTIONS = (
+    "Answer the question based only on the context from documents below "
+    "and cite the sources you use by their [number]."
+)
+
+def build_rag_prompt(question, context, conversation_summary=None):
+    # Fixed instructions and the summary lead so consecutive prompts share a prefix
+    prompt = f"{RAG_INSTRUCTIONS}\n\n"
+    if conversation_summary:
+        prompt += f"Previous conversation: {conversation_summary}\n\n"
+    return prompt + f"""Context from documents: {context}
+
+Question: {question}"""
+
+def build_condense_prompt(summary, max_words):
+    return f"""Rewrite this running summary of a conversation in at most {max_words} words.
+Keep names, decisions, facts and open questions; drop repetition.
+
+{summary}
+
+Condensed summary:"""
+
+def generate_summary(messages):
+    try:
+        with span("llm.summary"):
+            response = get_client("llm").models.generate_content(
+                model=MODEL_NAME,
+                contents=build_summary_prompt(messages)
+            )
         return response.text.strip()
     except Exception as e:
-        print(f"Summary Error: {e}")
-        return "Previous conversation context."
+        _failed("summary", e)
+        return SUMMARY_FALLBACK
+
+async def generate_summary_async(messages):
+    try:
+        with span("llm.summary"):
+            response = await get_client("llm").aio.models.generate_content(
+                model=MODEL_NAME,
+                contents=build_summary_prompt(messages)
+            )
+        return response.text.strip()
+    except Exception as e:
+        _failed("summary", e)
+        return SUMMARY_FALLBACK
+
+async def condense_summary_async(summary, max_words):
+    """Shorter rewrite of a summary that outgrew its budget, or None if the call fails."""
+    try:
+        with span("llm.condense"):
+            response = await get_client("llm").aio.models.generate_content(
+                model=MODEL_NAME,
+                contents=build_condense_prompt(summary, max_words)
+            )
+        return response.text.strip() or None
+    except Exception as e:
+        _failed("condense", e, fallback=False)
+        return None
 
 def build_context_with_summary(summary, recent_messages):
     context = []
-    
+
     if summary:
         context.append({
             "role": "user",
@@ -37,46 +99,93 @@ def build_context_with_summary(summary, recent_messages):
             "role": "model",
             "parts": [{"text": "I understand the context."}]
         })
-    
+
     for msg in recent_messages:
         context.append({
             "role": msg["role"],
             "parts": [{"text": msg["content"]}]
         })
-    
+
     return context
 
 def call_gemini_chat(conversation_summary, messages):
     try:
         context = build_context_with_summary(conversation_summary, messages)
-        
-        response = client.models.generate_content(
-            model="gemini-2.5-flash-lite",
-            contents=context
-        )
-        
+
+        with span("llm.chat"):
+            response = get_client("llm").models.generate_content(
+                model=MODEL_NAME,
+                contents=context
+            )
+
+        return response.text
+    except Exception as e:
+        _failed("chat", e)
+        return CHAT_FALLBACK
+
+async def call_gemini_chat_async(conversation_summary, messages):
+    try:
+        context = build_context_with_summary(conversation_summary, messages)
+
+        with span("llm.chat"):
+            response = await get_client("llm").aio.models.generate_content(
+                model=MODEL_NAME,
+                contents=context
+            )
+
         return response.text
     except Exception as e:
-        print(f"LLM Error: {e}")
-        return "Sorry, I'm having trouble responding right now."
+        _failed("chat", e)
+        return CHAT_FALLBACK
 
 def call_gemini_rag(question, context, conversation_summary=None):
     try:
-        prompt = f"""Context from documents: {context}
-
-Question: {question}
-
-Answer based only on the context above."""
-        
-        if conversation_summary:
-            prompt = f"Previous conversation: {conversation_summary}\n\n" + prompt
-        
-        response = client.models.generate_content(
-            model="gemini-2.5-flash-lite",
-            contents=prompt
-        )
-        
+        with span("llm.rag"):
+            response = get_client("llm").models.generate_content(
+                model=MODEL_NAME,
+                contents=build_rag_prompt(question, context, conversation_summary)
+            )
+
+        return response.text
+    except Exception as e:
+        _failed("rag", e)
+        return RAG_FALLBACK
+
+async def call_gemini_rag_async(question, context, conversation_summary=None):
+    try:
+        with span("llm.rag"):
+            response = await get_client("llm").aio.models.generate_content(
+                model=MODEL_NAME,
+                contents=build_rag_prompt(question, context, conversation_summary)
+            )
+
         return response.text
     except Exception as e:
-        print(f"RAG Error: {e}")
-        return "Sorry, I couldn't process your question."
\ No newline at end of file
+        _failed("rag", e)
+        return RAG_FALLBACK
+
+async def _stream_text(contents, fallback, operation):
+    """Yield response text pieces as the model produces them."""
+    produced = False
+    try:
+        with span(f"llm.{operation}.stream"):
+            stream = await get_client("llm").aio.models.generate_content_stream(
+                model=MODEL_NAME,
+                contents=contents
+            )
+            async for chunk in stream:
+                if chunk.text:
+                    produced = True
+                    yield chunk.text
+    except Exception as e:
+        _failed(operation, e, fallback=not produced)
+        if not produced:
+            yield fallback
+
+def stream_gemini_chat(conversation_summary, messages):
+    context = build_context_with_summary(conversation_summary, messages)
+    return _stream_text(context, CHAT_FALLBACK, "chat")
+
+def stream_gemini_rag(question, context, conversation_summary=None):
+    prompt = build_rag_prompt(question, context, conversation_summary)
+    return _stream_text(prompt, RAG_FALLBACK, "rag")
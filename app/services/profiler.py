@@ -0,0 +1,83 @@
+"""Opt-in sampling profiler for single requests.
+
+With PROFILING_ENABLED=1, a request carrying an `X-Profile: 1` header is
+sampled every PROFILE_INTERVAL_MS: a background thread records the call
+stack of every other thread. The stacks are written to PROFILE_DIR in
+the folded format read by flamegraph.pl and speedscope; the response's
+X-Profile-Path header names the file. Threads serving
+other requests are sampled too, so profile on a quiet instance.
+"""
+import os
+import sys
+import tempfile
+import threading
+from collections import Counter
+from datetime import datetime
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL_MS", 5)) / 1000
+PROFILE_DIR = os.getenv("PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "botgpt-profiles")
+PROFILE_MAX_DEPTH = 64
+# A thread whose innermost frame is in one of these is parked waiting for work
+IDLE_MODULES = {"threading.py", "queue.py", "selectors.py"}
+
+
+def _folded(frame):
+    names = []
+    while frame is not None and len(names) < PROFILE_MAX_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    """Aggregates folded stacks of all other threads until stop() is called."""
+
+    def __init__(self, interval=None):
+        self.interval = PROFILE_INTERVAL if interval is None else interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.is_set():
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for ident, frame in sys._current_frames().items():
+                if ident == own or os.path.basename(frame.f_code.co_filename) in IDLE_MODULES:
+                    continue
+                self.stacks[f"{names.get(ident, ident)};{_folded(frame)}"] += 1
+            self.samples += 1
+            self._stop.wait(self.interval)
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(self.folded())
+        return path
+
+
+def new_profile_path(label, directory=None):
+    """A fresh file name in PROFILE_DIR for the profile of `label`."""
+    slug = "".join(c if c.isalnum() else "-" for c in label).strip("-")[:80]
+    return os.path.join(directory or PROFILE_DIR, f"{datetime.now():%Y%m%d-%H%M%S-%f}-{slug}.folded")
+
+
+def wants_profile(headers):
+    return PROFILING_ENABLED and headers.get("x-profile") == "1"
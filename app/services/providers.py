@@ -0,0 +1,63 @@
+"""The model client shared by generation and embeddings.
+
+LLM_PROVIDER picks the backend: "gemini" (google-genai) or "local"
+(deterministic, offline; see fake_clients.LocalClient). The client is
+created on first use, not at import, and one instance serves both
+services so they share its HTTP connection pool. set_client swaps in a
+client for one role, e.g. a FakeLLMClient in tests.
+"""
+import os
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PROVIDERS = ("gemini", "local")
+ROLES = ("llm", "embedding")
+
+_client = None
+_overrides = {role: None for role in ROLES}
+_lock = threading.Lock()
+
+
+def create_client(provider=None):
+    provider = provider or os.getenv("LLM_PROVIDER", "gemini")
+    if provider == "local":
+        from app.services.fake_clients import LocalClient
+        return LocalClient(
+            llm_latency=float(os.getenv("LOCAL_LLM_LATENCY_MS", 0)) / 1000,
+            embed_latency=float(os.getenv("LOCAL_EMBED_LATENCY_MS", 0)) / 1000,
+            reply=os.getenv("LOCAL_LLM_REPLY") or None,
+        )
+    if provider == "gemini":
+        # Imported here: google-genai takes about a second to import
+        import httpx
+        from google import genai
+        from google.genai import types
+
+        connections = int(os.getenv("LLM_MAX_CONNECTIONS", 20))
+        pool = {"limits": httpx.Limits(max_connections=connections, max_keepalive_connections=connections)}
+        return genai.Client(
+            api_key=os.getenv("GEMINI_API_KEY"),
+            http_options=types.HttpOptions(client_args=pool, async_client_args=pool),
+        )
+    raise ValueError(f"Unknown LLM_PROVIDER {provider!r}; expected one of {PROVIDERS}")
+
+
+def get_client(role="llm"):
+    """The client for `role`: its override if one is set, else the shared default."""
+    global _client
+    override = _overrides[role]
+    if override is not None:
+        return override
+    with _lock:
+        if _client is None:
+            _client = create_client()
+        return _client
+
+
+def set_client(role, client):
+    """Override the client of one role (None restores the default); returns the previous override."""
+    with _lock:
+        previous, _overrides[role] = _overrides[role], client
+    return previous
@@ -1,49 +1,183 @@
-from google import genai
+import hashlib
+import logging
 import os
 import numpy as np
 from dotenv import load_dotenv
 import time
+import random
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from app.services.chunker import DEFAULT_PARAMS, iter_chunks
+from app.services.rate_limit import TokenBucket
+from app.services.embedding_cache import get_embedding_cache
+from app.services.llm_scheduler import SingleFlight
+from app.services.metrics import EMBEDDING_FAILURES, EMBEDDING_RETRIES, span
+from app.services.providers import get_client, set_client
+from app.services.vector_index import RetrievalResult
 
 load_dotenv()
 
-client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+logger = logging.getLogger(__name__)
 
-def chunk_text(text, chunk_size=500):
-    words = text.split()
-    chunks = []
-    for i in range(0, len(words), chunk_size):
-        chunk = " ".join(words[i:i + chunk_size])
-        if chunk.strip():
-            chunks.append(chunk)
-    return chunks
+EMBEDDING_MODEL = "text-embedding-004"
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", 100))
+EMBED_MAX_WORKERS = int(os.getenv("EMBED_MAX_WORKERS", 4))
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", 4))
+EMBED_BACKOFF_BASE = float(os.getenv("EMBED_BACKOFF_BASE", 0.5))
+# Questions are embedded while a user waits, so they fail fast and fall back to BM25
+EMBED_QUERY_MAX_RETRIES = int(os.getenv("EMBED_QUERY_MAX_RETRIES", 1))
+EMBED_QUERY_TIMEOUT = float(os.getenv("EMBED_QUERY_TIMEOUT_SECONDS", 2))
 
-def get_embeddings(texts):
-    try:
-        if not texts:
-            print("No texts to embed")
-            return []
-        
-        print(f"Generating embeddings for {len(texts)} chunks...")
-        
-        embeddings = []
-        for i, text in enumerate(texts):
-            try:
-                result = client.models.embed_content(
-                    model="text-embedding-004",
-                    contents=text  # ← Changed from 'content' to 'contents'
+# One token per batch request, shared by every worker thread
+embed_rate_limiter = TokenBucket(
+    rate=float(os.getenv("EMBED_REQUESTS_PER_SEC", 10)),
+    capacity=EMBED_MAX_WORKERS
+)
+# Questions get a bucket of their own, so they never queue behind upload batches
+query_rate_limiter = TokenBucket(rate=float(os.getenv("EMBED_QUERY_REQUESTS_PER_SEC", 10)))
+
+def chunk_text(text, params=DEFAULT_PARAMS):
+    """Sentence-aware, overlapping token chunks; see chunker.iter_chunks."""
+    return list(iter_chunks(text, params))
+
+RETRIEVAL_MODES = ("hybrid", "vector", "lexical")
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+if RETRIEVAL_MODE not in RETRIEVAL_MODES:
+    raise ValueError(f"Unknown RETRIEVAL_MODE {RETRIEVAL_MODE!r}; expected one of {RETRIEVAL_MODES}")
+HYBRID_CANDIDATES = 20  # per ranking, before fusion
+
+class EmbeddingError(Exception):
+    pass
+
+# Concurrent requests for the same batch (e.g. one question asked by many users) share a call
+embed_flights = SingleFlight()
+
+def set_embedding_client(new_client):
+    """Swap the embedding client (e.g. for FakeEmbeddingClient); returns the previous one."""
+    return set_client("embedding", new_client)
+
+def _embed_batch(batch, batch_no):
+    key = hashlib.sha256("\0".join([EMBEDDING_MODEL, *batch]).encode()).hexdigest()
+    return embed_flights.do(key, lambda: _request_batch(batch, batch_no))
+
+def _request_batch(batch, batch_no):
+    last_error = None
+    for attempt in range(EMBED_MAX_RETRIES + 1):
+        embed_rate_limiter.acquire()
+        try:
+            with span("embedding.request"):
+                result = get_client("embedding").models.embed_content(
+                    model=EMBEDDING_MODEL,
+                    contents=batch
                 )
-                embeddings.append(result.embeddings[0].values)
-                print(f"✓ Generated embedding {i+1}/{len(texts)}")
-                time.sleep(0.1)
-            except Exception as e:
-                print(f"✗ Error embedding chunk {i}: {e}")
-                embeddings.append([0.0] * 768)
-        
-        print(f"Total embeddings generated: {len(embeddings)}")
-        return embeddings
-    except Exception as e:
-        print(f"Embedding Error: {e}")
-        return [[0.0] * 768 for _ in texts]
+            vectors = [e.values for e in result.embeddings]
+            if len(vectors) != len(batch):
+                raise EmbeddingError(f"expected {len(batch)} embeddings, got {len(vectors)}")
+            return vectors
+        except Exception as e:
+            last_error = e
+            if attempt < EMBED_MAX_RETRIES:
+                delay = EMBED_BACKOFF_BASE * (2 ** attempt) * (1 + random.random())
+                logger.warning("Embedding batch %d failed (attempt %d): %s; retrying in %.2fs",
+                               batch_no, attempt + 1, e, delay)
+                EMBEDDING_RETRIES.inc()
+                time.sleep(delay)
+    EMBEDDING_FAILURES.inc()
+    raise EmbeddingError(f"Embedding batch {batch_no} failed after {EMBED_MAX_RETRIES + 1} attempts: {last_error}")
+
+def _request_query(text):
+    last_error = None
+    for attempt in range(EMBED_QUERY_MAX_RETRIES + 1):
+        query_rate_limiter.acquire()
+        try:
+            with span("embedding.query"):
+                result = get_client("embedding").models.embed_content(
+                    model=EMBEDDING_MODEL,
+                    contents=[text],
+                    config={"http_options": {"timeout": int(EMBED_QUERY_TIMEOUT * 1000)}}
+                )
+            return result.embeddings[0].values
+        except Exception as e:
+            last_error = e
+            if attempt < EMBED_QUERY_MAX_RETRIES:
+                logger.warning("Question embedding failed (attempt %d): %s; retrying", attempt + 1, e)
+                EMBEDDING_RETRIES.inc()
+    EMBEDDING_FAILURES.inc()
+    raise EmbeddingError(f"Question embedding failed after {EMBED_QUERY_MAX_RETRIES + 1} attempts: {last_error}")
+
+def embed_query(text):
+    """Embed one question, failing fast.
+    
+    Unlike get_embeddings, which is built for ingestion, a failure is retried
+    at most EMBED_QUERY_MAX_RETRIES times without backoff, each attempt is
+    bounded by EMBED_QUERY_TIMEOUT_SECONDS, and requests are paced by
+    query_rate_limiter instead of the upload limiter. Raises EmbeddingError.
+    """
+    cache = get_embedding_cache()
+    if cache is not None:
+        cached = cache.get_many(EMBEDDING_MODEL, [text])
+        if cached:
+            return cached[0]
+    key = hashlib.sha256("\0".join(["query", EMBEDDING_MODEL, text]).encode()).hexdigest()
+    vector = embed_flights.do(key, lambda: _request_query(text))
+    if cache is not None:
+        cache.put_many(EMBEDDING_MODEL, [text], [vector])
+    return vector
+
+def _embed_uncached(texts, on_batch_done=None):
+    batches = [texts[i:i + EMBED_BATCH_SIZE] for i in range(0, len(texts), EMBED_BATCH_SIZE)]
+    logger.debug("Generating embeddings for %d chunks in %d batches", len(texts), len(batches))
+    
+    results = [None] * len(batches)
+    if len(batches) == 1:
+        results[0] = _embed_batch(batches[0], 0)
+        if on_batch_done:
+            on_batch_done(len(batches[0]))
+    else:
+        workers = min(EMBED_MAX_WORKERS, len(batches))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(_embed_batch, batch, i): i for i, batch in enumerate(batches)}
+            for future in as_completed(futures):
+                i = futures[future]
+                results[i] = future.result()
+                if on_batch_done:
+                    on_batch_done(len(batches[i]))
+    
+    return [vector for batch in results for vector in batch]
+
+def get_embeddings(texts, progress=None):
+    """Embed texts in order; progress(done, total) is called as batches finish."""
+    if not texts:
+        logger.debug("No texts to embed")
+        return []
+    
+    cache = get_embedding_cache()
+    embeddings = [None] * len(texts)
+    if cache is not None:
+        for i, vector in cache.get_many(EMBEDDING_MODEL, texts).items():
+            embeddings[i] = vector
+    
+    # Identical chunks within one document are embedded once
+    missing = list(dict.fromkeys(t for t, e in zip(texts, embeddings) if e is None))
+    done = len(texts) - len(missing)
+    if progress:
+        progress(done, len(texts))
+    
+    def on_batch_done(count):
+        nonlocal done
+        done += count
+        progress(done, len(texts))
+    
+    if missing:
+        vectors = _embed_uncached(missing, on_batch_done if progress else None)
+        fresh = dict(zip(missing, vectors))
+        if cache is not None:
+            cache.put_many(EMBEDDING_MODEL, missing, vectors)
+        embeddings = [e if e is not None else fresh[t] for t, e in zip(texts, embeddings)]
+        if progress and done != len(texts):
+            progress(len(texts), len(texts))
+    
+    logger.debug("Total embeddings: %d (%d from cache)", len(embeddings), len(texts) - len(missing))
+    return embeddings
 
 def cosine_similarity(a, b):
     a = np.array(a)
@@ -53,24 +187,52 @@ def cosine_similarity(a, b):
         return 0.0
     return np.dot(a, b) / norm_product
 
-def retrieve_relevant_chunks(question, chunks, chunk_embeddings, top_k=3):
+def format_sources(sources):
+    """Number each chunk so the model (and the reader) can cite it as [n]."""
+    return "\n\n".join(
+        f"[{n}] {source.title} (chunk {source.position + 1}):\n{source.text}"
+        for n, source in enumerate(sources, start=1)
+    )
+
+def search_documents(question, conversation_index, top_k=3, mode=None, question_embedding=None):
+    """Retrieve the top_k chunks across every document of a conversation.
+    
+    mode is "hybrid" (vector + BM25 fused by reciprocal rank), "vector", or
+    "lexical" (BM25 only, no embedding request). If the embedder fails,
+    BM25 results are used instead. Pass question_embedding when the caller
+    has already embedded the question.
+    """
+    mode = mode or RETRIEVAL_MODE
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode {mode!r}; expected one of {RETRIEVAL_MODES}")
+    if len(conversation_index) == 0:
+        return RetrievalResult(text="No document content available.")
+    
+    logger.debug("Retrieving relevant chunks (%s) for: %r", mode, question[:50])
     try:
-        if not chunks or not chunk_embeddings:
-            return "No document content available."
-        
-        print(f"Retrieving relevant chunks for: '{question[:50]}...'")
-        question_embedding = get_embeddings([question])[0]
-        
-        scores = []
-        for i, chunk_emb in enumerate(chunk_embeddings):
-            score = cosine_similarity(question_embedding, chunk_emb)
-            scores.append((score, i))
-        
-        scores.sort(reverse=True)
-        print(f"Top 3 chunk scores: {[f'{s:.3f}' for s, _ in scores[:3]]}")
-        
-        top_chunks = [chunks[idx] for _, idx in scores[:top_k]]
-        return "\n\n".join(top_chunks)
+        if mode == "lexical":
+            sources = conversation_index.lexical_search(question, top_k)
+        else:
+            if question_embedding is None:
+                question_embedding = embed_query(question)
+            if mode == "vector":
+                sources = conversation_index.search(question_embedding, top_k)
+            else:
+                sources = conversation_index.hybrid_search(
+                    question_embedding, question, top_k, max(HYBRID_CANDIDATES, top_k)
+                )
     except Exception as e:
-        print(f"Retrieval Error: {e}")
-        return "\n\n".join(chunks[:3]) if chunks else "No content available."
\ No newline at end of file
+        logger.warning("Retrieval error: %s; falling back to keyword search", e)
+        sources = conversation_index.lexical_search(question, top_k)
+    
+    if not sources:
+        # No keyword overlap at all: hand over the opening chunks
+        sources = [conversation_index.source(row, 0.0)
+                   for row in range(min(top_k, len(conversation_index)))]
+    logger.debug("Top %d chunk scores: %s", len(sources), [f"{s.score:.3f}" for s in sources])
+    return RetrievalResult(
+        text=format_sources(sources),
+        scores=[source.score for source in sources],
+        indices=[source.position for source in sources],
+        sources=sources
+    )
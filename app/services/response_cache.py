@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Tuple
+import numpy as np
+from app.services.vector_index import normalize_rows
+
+DEFAULT_THRESHOLD = 0.95
+DEFAULT_TTL_SECONDS = 3600
+DEFAULT_MAX_ENTRIES = 2000
+
+
+@dataclass
+class CachedAnswer:
+    scope: Tuple  # (conversation id or None, document fingerprints...)
+    vector: np.ndarray
+    response: str
+    citations: List[dict]  # "document" holds a content fingerprint, not an id
+    created_at: float
+
+
+class ResponseCache:
+    """RAG answers reused for semantically near-identical questions.
+
+    Entries are scoped by the content fingerprints of the documents the
+    answer was generated from (see ConversationIndex.fingerprints), so any
+    conversation over the same documents shares them. Callers pass the
+    conversation id when the prompt carried that conversation's summary;
+    such answers stay private to it. Adding, removing or changing a
+    document moves a conversation to a new scope. A lookup hits when the
+    cosine similarity between the question and a cached question of that
+    scope reaches `threshold`.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, ttl=DEFAULT_TTL_SECONDS,
+                 max_entries=DEFAULT_MAX_ENTRIES, clock=time.monotonic):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()  # entry id -> CachedAnswer, least recently used first
+        self._scopes = {}  # scope -> [entry id]
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    @staticmethod
+    def scope(conv_id, conversation_index):
+        """conv_id is None for answers generated without a conversation summary."""
+        return (conv_id, *sorted(set(conversation_index.fingerprints().values())))
+
+    def lookup(self, conv_id, conversation_index, question_embedding):
+        """(response, citations) of the closest cached question, or None."""
+        scope = self.scope(conv_id, conversation_index)
+        query = normalize_rows(question_embedding)[0]
+        with self._lock:
+            self._expire(scope)
+            ids = self._scopes.get(scope, [])
+            best = None
+            if ids:
+                similarities = np.vstack([self._entries[i].vector for i in ids]) @ query
+                top = int(np.argmax(similarities))
+                if similarities[top] >= self.threshold:
+                    best = ids[top]
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best)
+            entry = self._entries[best]
+        return entry.response, _resolve_citations(entry.citations, conversation_index)
+
+    def store(self, conv_id, conversation_index, question_embedding, response, citations):
+        if not self.enabled:
+            return
+        fingerprints = conversation_index.fingerprints()
+        entry = CachedAnswer(
+            scope=self.scope(conv_id, conversation_index),
+            vector=normalize_rows(question_embedding)[0],
+            response=response,
+            citations=[
+                {**{k: v for k, v in c.items() if k != "document_id"}, "document": fingerprints[c["document_id"]]}
+                for c in citations
+            ],
+            created_at=self.clock(),
+        )
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            self._scopes.setdefault(entry.scope, []).append(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._scopes.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "scopes": len(self._scopes),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def _expire(self, scope):
+        cutoff = self.clock() - self.ttl
+        for entry_id in [i for i in self._scopes.get(scope, []) if self._entries[i].created_at < cutoff]:
+            self._remove(entry_id)
+            self.expirations += 1
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        ids = self._scopes[entry.scope]
+        ids.remove(entry_id)
+        if not ids:
+            del self._scopes[entry.scope]
+
+
+def _resolve_citations(citations, conversation_index):
+    """Point fingerprint-keyed citations at the conversation's current copy of each document."""
+    documents = {}
+    for document_id, fingerprint in conversation_index.fingerprints().items():
+        documents.setdefault(fingerprint, document_id)
+    resolved = []
+    for citation in citations:
+        document_id = documents[citation["document"]]
+        resolved.append({
+            **{k: v for k, v in citation.items() if k != "document"},
+            "document_id": document_id,
+            "title": conversation_index.titles[document_id],
+        })
+    return resolved
+
+
+response_cache = ResponseCache(
+    threshold=float(os.getenv("RESPONSE_CACHE_THRESHOLD", DEFAULT_THRESHOLD)),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", DEFAULT_TTL_SECONDS)),
+    max_entries=int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", DEFAULT_MAX_ENTRIES)),
+)
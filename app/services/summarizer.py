@@ -0,0 +1,214 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from contextlib import asynccontextmanager
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import Session, select
+from app.models import Conversation, Message
+from app.services.context_builder import DEFAULT_BUDGET
+from app.services.llm_scheduler import AsyncSingleFlight, Overloaded, llm_scheduler
+from app.services.llm_service import build_summary_prompt, condense_summary_async, generate_summary_async
+from app.services.metrics import span
+from app.services.tokens import count_tokens
+
+SUMMARY_INTERVAL = 15
+# A summary longer than its prompt budget is rewritten to about half of it
+SUMMARY_MAX_TOKENS = DEFAULT_BUDGET.summary_tokens
+
+# Background summaries queue for model slots as one user, so they never crowd out replies
+SUMMARY_LANE = "summarizer"
+
+_locks = {}  # conv_id -> [asyncio.Lock, tasks holding or waiting for it]
+_flights = AsyncSingleFlight()
+logger = logging.getLogger(__name__)
+
+
+class SummaryStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.scheduled = 0
+        self.completed = 0
+        self.skipped = 0
+        self.condensed = 0
+        self.in_progress = 0
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        self.last_duration = 0.0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self.last_lag = 0.0
+
+    def record_scheduled(self):
+        with self._lock:
+            self.scheduled += 1
+
+    def record_condensed(self):
+        with self._lock:
+            self.condensed += 1
+
+    def record_done(self, duration, lag, skipped=False):
+        with self._lock:
+            if skipped:
+                self.skipped += 1
+                return
+            self.completed += 1
+            self.total_duration += duration
+            self.max_duration = max(self.max_duration, duration)
+            self.last_duration = duration
+            self.total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+            self.last_lag = lag
+
+    def snapshot(self):
+        with self._lock:
+            done = self.completed or 1
+            return {
+                "scheduled": self.scheduled,
+                "completed": self.completed,
+                "skipped": self.skipped,
+                "condensed": self.condensed,
+                "in_progress": self.in_progress,
+                "duration_avg_seconds": self.total_duration / done,
+                "duration_max_seconds": self.max_duration,
+                "duration_last_seconds": self.last_duration,
+                "lag_avg_seconds": self.total_lag / done,
+                "lag_max_seconds": self.max_lag,
+                "lag_last_seconds": self.last_lag,
+            }
+
+
+stats = SummaryStats()
+
+
+@asynccontextmanager
+async def _conversation_lock(conv_id):
+    """Per-conversation lock, dropped once no task holds or awaits it."""
+    entry = _locks.get(conv_id)
+    if entry is None:
+        entry = _locks[conv_id] = [asyncio.Lock(), 0]
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del _locks[conv_id]
+
+
+def needs_summary(message_count):
+    return message_count > 0 and message_count % SUMMARY_INTERVAL == 0
+
+
+def _pending_blocks(engine, conv_id, through_count):
+    """Message blocks between the last summarized message and through_count."""
+    with Session(engine) as db:
+        conv = db.get(Conversation, conv_id)
+        if not conv or conv.summarized_count >= through_count:
+            return None, []
+        start = conv.summarized_count
+        # Read back from the newest message, so the cost does not grow with the history
+        rows = db.exec(
+            select(Message.role, Message.content)
+            .where(Message.conversation_id == conv_id)
+            .order_by(Message.timestamp.desc(), Message.id.desc())
+            .limit(max(conv.message_count - start, 0))
+        ).all()
+        messages = [{"role": role, "content": content} for role, content in reversed(rows)]
+        messages = messages[:through_count - start]
+        blocks = [messages[i:i + SUMMARY_INTERVAL] for i in range(0, len(messages), SUMMARY_INTERVAL)]
+        return start, blocks
+
+
+async def _summarize_block(block):
+    """Summary of one message block; identical blocks being summarized share the call."""
+    async def generate():
+        async with llm_scheduler.slot(SUMMARY_LANE):
+            return await generate_summary_async(block)
+    key = hashlib.sha256(build_summary_prompt(block).encode()).hexdigest()
+    return await _flights.do(key, generate)
+
+
+def _store_summary(engine, conv_id, new_summary, summarized_count):
+    with Session(engine) as db:
+        conv = db.get(Conversation, conv_id)
+        if not conv:
+            return
+        if conv.summary:
+            conv.summary = f"{conv.summary}\n\n{new_summary}"
+        else:
+            conv.summary = new_summary
+        conv.summarized_count = summarized_count
+        db.add(conv)
+        db.commit()
+        return conv.summary
+
+
+def _replace_summary(engine, conv_id, old_summary, new_summary):
+    """Swap in a condensed summary unless the summary changed meanwhile."""
+    with Session(engine) as db:
+        conv = db.get(Conversation, conv_id)
+        if not conv or conv.summary != old_summary:
+            return False
+        conv.summary = new_summary
+        db.add(conv)
+        db.commit()
+        return True
+
+
+async def condense_if_needed(engine, conv_id, summary):
+    if not summary or count_tokens(summary) <= SUMMARY_MAX_TOKENS:
+        return False
+    async with llm_scheduler.slot(SUMMARY_LANE):
+        condensed = await condense_summary_async(summary, max_words=SUMMARY_MAX_TOKENS // 3)
+    if not condensed or count_tokens(condensed) >= count_tokens(summary):
+        return False
+    replaced = await run_in_threadpool(_replace_summary, engine, conv_id, summary, condensed)
+    if replaced:
+        stats.record_condensed()
+    return replaced
+
+
+async def summarize_conversation(engine, conv_id, through_count, requested_at=None):
+    """Fold every unsummarized message up to through_count into the summary.
+
+    Each block's summary is appended; once the total outgrows
+    SUMMARY_MAX_TOKENS it is condensed by another model call.
+
+    Runs as a background task after the reply was sent. A per-conversation
+    lock keeps concurrent triggers from racing; a trigger that finds the
+    work already done is a no-op.
+    """
+    requested_at = requested_at or time.monotonic()
+    async with _conversation_lock(conv_id):
+        started = time.monotonic()
+        stats.in_progress += 1
+        try:
+            start, blocks = await run_in_threadpool(_pending_blocks, engine, conv_id, through_count)
+            if not blocks:
+                stats.record_done(0.0, 0.0, skipped=True)
+                return
+            covered = start
+            with span("summarize"):
+                for block in blocks:
+                    new_summary = await _summarize_block(block)
+                    covered += len(block)
+                    summary = await run_in_threadpool(_store_summary, engine, conv_id, new_summary, covered)
+                await condense_if_needed(engine, conv_id, summary)
+            finished = time.monotonic()
+            stats.record_done(finished - started, finished - requested_at)
+            logger.info("Summarized conversation %d through message %d", conv_id, covered)
+        except Overloaded as e:
+            # Unsummarized messages are picked up by the next trigger
+            logger.warning("Summary of conversation %d deferred: %s", conv_id, e)
+        except Exception:
+            logger.exception("Summary task error for conversation %d", conv_id)
+        finally:
+            stats.in_progress -= 1
+
+
+def schedule_summary(background_tasks, engine, conv_id, message_count):
+    stats.record_scheduled()
+    background_tasks.add_task(summarize_conversation, engine, conv_id, message_count, time.monotonic())
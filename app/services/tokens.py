@@ -0,0 +1,30 @@
+import re
+
+# Word pieces and individual punctuation marks. Tracks subword tokenizers
+# closely enough for budgeting without shipping a model vocabulary.
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text):
+    return len(TOKEN_PATTERN.findall(text))
+
+
+def token_spans(text):
+    """(start, end) character offsets of every token."""
+    return [match.span() for match in TOKEN_PATTERN.finditer(text)]
+
+
+def head_tokens(text, n):
+    """text cut after its first n tokens."""
+    spans = token_spans(text)
+    if len(spans) <= n:
+        return text
+    return text[:spans[n - 1][1]] if n > 0 else ""
+
+
+def tail_tokens(text, n):
+    """text cut before its last n tokens."""
+    spans = token_spans(text)
+    if len(spans) <= n:
+        return text
+    return text[spans[-n][0]:] if n > 0 else ""
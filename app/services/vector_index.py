@@ -0,0 +1,212 @@
+import hashlib
+import sys
+import numpy as np
+from dataclasses import dataclass, field
+from typing import List
+from app.services.bm25 import BM25Index, reciprocal_rank_fusion
+
+
+@dataclass
+class ChunkSource:
+    document_id: int
+    title: str
+    position: int
+    score: float
+    text: str
+
+    def citation(self, number):
+        return {
+            "number": number,
+            "document_id": self.document_id,
+            "title": self.title,
+            "chunk": self.position,
+            "score": round(self.score, 4),
+            "snippet": self.text[:200],
+        }
+
+
+@dataclass
+class RetrievalResult:
+    text: str
+    scores: List[float] = field(default_factory=list)
+    indices: List[int] = field(default_factory=list)
+    sources: List[ChunkSource] = field(default_factory=list)
+
+    def citations(self):
+        return [source.citation(n) for n, source in enumerate(self.sources, start=1)]
+
+
+def normalize_rows(matrix):
+    """Scale every row to unit length; all-zero rows stay zero."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class VectorIndex:
+    """Embeddings of one document kept as a single normalized float32 matrix.
+
+    Scoring a query is one matrix-vector product, and the top-k rows are
+    selected with argpartition instead of sorting every score.
+    """
+
+    def __init__(self, matrix):
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+
+    @classmethod
+    def from_embeddings(cls, embeddings):
+        if len(embeddings) == 0:
+            return cls(np.zeros((0, 0), dtype=np.float32))
+        return cls(normalize_rows(embeddings))
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def nbytes(self):
+        return self.matrix.nbytes
+
+    def scores(self, query):
+        query = np.asarray(query, dtype=np.float32).ravel()
+        norm = np.linalg.norm(query)
+        if norm == 0 or len(self) == 0:
+            return np.zeros(len(self), dtype=np.float32)
+        return self.matrix @ (query / norm)
+
+    def search(self, query, top_k=3):
+        """Return (scores, indices) of the top_k rows, best first."""
+        scores = self.scores(query)
+        k = min(top_k, len(scores))
+        if k <= 0:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+        if k < len(scores):
+            candidates = np.sort(np.argpartition(-scores, k - 1)[:k])
+        else:
+            candidates = np.arange(len(scores))
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return scores[order], order
+
+
+def _document_parts(document):
+    """(document_id, title, chunks, embeddings[, lexical]) with the BM25 index filled in."""
+    document_id, title, chunks, embeddings = document[:4]
+    lexical = document[4] if len(document) > 4 else None
+    return document_id, title, chunks, embeddings, lexical or BM25Index.from_chunks(chunks)
+
+
+class ConversationIndex:
+    """All documents of a conversation merged into one VectorIndex and one BM25Index.
+
+    Row i of the matrix is chunk `positions[i]` of document `document_ids[i]`.
+    Instances are never mutated: with_document / without_document return a
+    new index, so searches running on the old one stay consistent.
+    """
+
+    def __init__(self, index, chunks, document_ids, positions, titles, lexical=None):
+        self.index = index
+        self.chunks = chunks
+        self.document_ids = np.asarray(document_ids, dtype=np.int64)
+        self.positions = np.asarray(positions, dtype=np.int64)
+        self.titles = titles
+        self.lexical = lexical if lexical is not None else BM25Index.from_chunks(chunks)
+        self._fingerprints = None
+
+    @classmethod
+    def empty(cls):
+        return cls(VectorIndex(np.zeros((0, 0), dtype=np.float32)), [], [], [], {}, BM25Index.empty())
+
+    @classmethod
+    def from_documents(cls, documents):
+        """Build from (document_id, title, chunks, embeddings[, lexical]) tuples in one concatenation."""
+        documents = [_document_parts(d) for d in documents if len(d[2]) > 0]
+        if not documents:
+            return cls.empty()
+        matrix = np.vstack([normalize_rows(d[3]) for d in documents])
+        lexical = BM25Index.empty()
+        for d in documents:
+            lexical = lexical.concat(d[4])
+        return cls(
+            VectorIndex(matrix),
+            [chunk for _, _, chunks, _, _ in documents for chunk in chunks],
+            np.concatenate([np.full(len(chunks), doc_id) for doc_id, _, chunks, _, _ in documents]),
+            np.concatenate([np.arange(len(chunks)) for _, _, chunks, _, _ in documents]),
+            {doc_id: title for doc_id, title, _, _, _ in documents},
+            lexical,
+        )
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def __contains__(self, document_id):
+        return document_id in self.titles
+
+    @property
+    def nbytes(self):
+        postings = sum(rows.nbytes + tfs.nbytes for rows, tfs in self.lexical.postings.values())
+        return (self.index.nbytes + self.document_ids.nbytes + self.positions.nbytes + postings
+                + sum(sys.getsizeof(chunk) for chunk in self.chunks))
+
+    def with_document(self, document_id, title, chunks, embeddings, lexical=None):
+        """Append one document's rows; the existing rows are not re-normalized."""
+        if document_id in self or len(chunks) == 0:
+            return self
+        rows = normalize_rows(embeddings)
+        matrix = rows if len(self) == 0 else np.vstack([self.index.matrix, rows])
+        return ConversationIndex(
+            VectorIndex(matrix),
+            self.chunks + list(chunks),
+            np.concatenate([self.document_ids, np.full(len(chunks), document_id)]),
+            np.concatenate([self.positions, np.arange(len(chunks))]),
+            {**self.titles, document_id: title},
+            self.lexical.concat(lexical or BM25Index.from_chunks(chunks)),
+        )
+
+    def without_document(self, document_id):
+        if document_id not in self:
+            return self
+        keep = self.document_ids != document_id
+        titles = {k: v for k, v in self.titles.items() if k != document_id}
+        if not keep.any():
+            return ConversationIndex.empty()
+        return ConversationIndex(
+            VectorIndex(self.index.matrix[keep]),
+            [chunk for chunk, kept in zip(self.chunks, keep) if kept],
+            self.document_ids[keep],
+            self.positions[keep],
+            titles,
+            self.lexical.take(keep),
+        )
+
+    def fingerprints(self):
+        """{document_id: SHA-256 of its chunks}; identical uploads share a fingerprint."""
+        if self._fingerprints is None:
+            digests = {}
+            for document_id, chunk in zip(self.document_ids.tolist(), self.chunks):
+                digests.setdefault(document_id, hashlib.sha256()).update(chunk.encode("utf-8") + b"\0")
+            self._fingerprints = {document_id: digest.hexdigest() for document_id, digest in digests.items()}
+        return self._fingerprints
+
+    def source(self, row, score):
+        document_id = int(self.document_ids[row])
+        return ChunkSource(document_id, self.titles[document_id], int(self.positions[row]),
+                           float(score), self.chunks[row])
+
+    def search(self, query, top_k=3):
+        """Return the top_k ChunkSources across every document, best first."""
+        scores, rows = self.index.search(query, top_k)
+        return [self.source(row, score) for score, row in zip(scores, rows)]
+
+    def lexical_search(self, question, top_k=3):
+        """BM25 only: no embedding needed."""
+        scores, rows = self.lexical.search(question, top_k)
+        return [self.source(row, score) for score, row in zip(scores, rows)]
+
+    def hybrid_search(self, query, question, top_k=3, candidates=20):
+        """Reciprocal rank fusion of the vector and BM25 rankings; score is the fused score."""
+        _, vector_rows = self.index.search(query, candidates)
+        _, lexical_rows = self.lexical.search(question, candidates)
+        fused = reciprocal_rank_fusion([vector_rows.tolist(), lexical_rows.tolist()])
+        return [self.source(row, score) for row, score in fused[:top_k]]
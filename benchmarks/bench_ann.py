@@ -0,0 +1,62 @@
+"""Recall@k and latency of the IVF knowledge-base index against exact search.
+
+Synthetic clustered embeddings (documents are topical, so real chunk
+vectors cluster too):
+    python -m benchmarks.bench_ann --vectors 200000 --dim 256 --queries 100
+"""
+import argparse
+import time
+import numpy as np
+from app.services.ann_index import IVFIndex
+from app.services.vector_index import VectorIndex, normalize_rows
+
+
+def clustered(rng, n, dim, topics):
+    centers = rng.standard_normal((topics, dim)).astype(np.float32)
+    labels = rng.integers(0, topics, n)
+    return normalize_rows(centers[labels] + 0.6 * rng.standard_normal((n, dim)).astype(np.float32))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vectors", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--topics", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--doc-size", type=int, default=200, help="chunks per document")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = clustered(rng, args.vectors, args.dim, args.topics)
+    queries = clustered(rng, args.queries, args.dim, args.topics)
+
+    exact = VectorIndex(vectors)
+    start = time.perf_counter()
+    truth = [set(exact.search(q, args.k)[1].tolist()) for q in queries]
+    exact_ms = (time.perf_counter() - start) / args.queries * 1e3
+
+    start = time.perf_counter()
+    documents = [(doc_id, vectors[offset:offset + args.doc_size])
+                 for doc_id, offset in enumerate(range(0, args.vectors, args.doc_size))]
+    index = IVFIndex.from_documents(args.dim, documents, min_train=1)
+    build_s = time.perf_counter() - start
+    print(f"{args.vectors} vectors, dim {args.dim}: {index.n_lists} lists, built in {build_s:.1f}s")
+    print(f"exact: {exact_ms:8.2f} ms/query  recall@{args.k} 1.000")
+
+    for nprobe in (1, 2, 4, 8, 16, 32, 64):
+        if nprobe > index.n_lists:
+            break
+        found = []
+        start = time.perf_counter()
+        for q in queries:
+            _, doc_ids, positions = index.search(q, args.k, nprobe)
+            found.append(set((doc_ids * args.doc_size + positions).tolist()))
+        ivf_ms = (time.perf_counter() - start) / args.queries * 1e3
+        recall = np.mean([len(f & t) / len(t) for f, t in zip(found, truth)])
+        print(f"nprobe={nprobe:<3} {ivf_ms:5.2f} ms/query  recall@{args.k} {recall:.3f}  "
+              f"({exact_ms / ivf_ms:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
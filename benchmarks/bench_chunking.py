@@ -0,0 +1,64 @@
+"""Throughput and peak memory of the old 500-word splitter vs the streaming chunker.
+
+    python -m benchmarks.bench_chunking --megabytes 8
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from app.services.chunker import DEFAULT_PARAMS, iter_chunks
+
+
+def legacy_chunk_text(text, chunk_size=500):
+    """The previous implementation."""
+    words = text.split()
+    chunks = []
+    for i in range(0, len(words), chunk_size):
+        chunk = " ".join(words[i:i + chunk_size])
+        if chunk.strip():
+            chunks.append(chunk)
+    return chunks
+
+
+def make_text(megabytes, seed=0):
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(5000)]
+    paragraphs, size = [], 0
+    while size < megabytes * 1024 * 1024:
+        sentences = [" ".join(rng.choices(vocabulary, k=rng.randint(6, 30))).capitalize() + "."
+                     for _ in range(rng.randint(2, 8))]
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        size += len(paragraph) + 2
+    return "\n\n".join(paragraphs)
+
+
+def measure(label, fn, text):
+    start = time.perf_counter()
+    count = fn(text)
+    elapsed = time.perf_counter() - start
+    # Separate run: tracemalloc slows allocation-heavy code down several times
+    tracemalloc.start()
+    fn(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    megabytes = len(text) / 1024 / 1024
+    print(f"{label:<22} {count:6d} chunks  {megabytes / elapsed:6.2f} MB/s  "
+          f"peak {peak / 1024 / 1024:7.1f} MB over the input")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--megabytes", type=float, default=8)
+    args = parser.parse_args()
+
+    text = make_text(args.megabytes)
+    print(f"input {len(text) / 1024 / 1024:.1f} MB, chunker {DEFAULT_PARAMS}")
+    measure("legacy (list)", lambda t: len(legacy_chunk_text(t)), text)
+    measure("streaming (list)", lambda t: len(list(iter_chunks(t))), text)
+    # Consumed one at a time, e.g. embedded and written out in batches
+    measure("streaming (consumed)", lambda t: sum(1 for _ in iter_chunks(t)), text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Load test of add_message against a stubbed LLM.
+
+Compares how many LLM calls can be in flight when each one holds a
+threadpool worker (the old sync handlers) with the async handler path:
+    python -m benchmarks.bench_concurrency --requests 300 --latency 1.0
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import httpx
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import Session, SQLModel, create_engine
+from app.database import get_session
+from app.main import app
+from app.models import Conversation, Message, User
+from app.services.fake_clients import FakeLLMClient
+from app.services.llm_service import call_gemini_chat, set_llm_client
+
+
+def seed(engine, conversations):
+    with Session(engine) as db:
+        user = User(name="Load", email="load@bench.local")
+        db.add(user)
+        db.commit()
+        ids = []
+        for i in range(conversations):
+            conv = Conversation(user_id=user.id, title=f"load {i}", mode="chat")
+            db.add(conv)
+            db.commit()
+            db.add(Message(conversation_id=conv.id, role="user", content="hello"))
+            ids.append(conv.id)
+        db.commit()
+        return ids
+
+
+async def sync_path(fake, n):
+    """Every call occupies a threadpool worker for the full LLM latency."""
+    messages = [{"role": "user", "content": "hello"}]
+    start = time.perf_counter()
+    await asyncio.gather(*(run_in_threadpool(call_gemini_chat, None, messages) for _ in range(n)))
+    return time.perf_counter() - start
+
+
+async def async_path(conv_ids, n):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(
+            client.post(f"/api/conversations/{conv_ids[i % len(conv_ids)]}/messages",
+                        json={"content": f"question {i}"})
+            for i in range(n)
+        ))
+        elapsed = time.perf_counter() - start
+    failures = sum(r.status_code != 200 for r in responses)
+    return elapsed, failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=1.0, help="stubbed LLM latency in seconds")
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{db_path}", connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    conv_ids = seed(engine, conversations=args.requests)
+
+    def bench_session():
+        with Session(engine) as session:
+            yield session
+
+    app.dependency_overrides[get_session] = bench_session
+    fake = FakeLLMClient(latency=args.latency)
+    previous = set_llm_client(fake)
+    try:
+        elapsed = asyncio.run(sync_path(fake, args.requests))
+        print(f"sync LLM calls:   {elapsed:6.2f}s  {args.requests / elapsed:7.1f} req/s  "
+              f"max in flight {fake.max_in_flight}")
+
+        fake.max_in_flight = 0
+        elapsed, failures = asyncio.run(async_path(conv_ids, args.requests))
+        print(f"async add_message: {elapsed:5.2f}s  {args.requests / elapsed:7.1f} req/s  "
+              f"max in flight {fake.max_in_flight}  failures {failures}")
+    finally:
+        set_llm_client(previous)
+        app.dependency_overrides.clear()
+
+
+if __name__ == "__main__":
+    main()
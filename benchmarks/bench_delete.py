@@ -0,0 +1,99 @@
+"""Statements issued and wall time to delete one large conversation.
+
+Compares the old row-by-row delete_conversation with the set-based
+delete_conversations:
+    python -m benchmarks.bench_delete --messages 5000 --documents 5 --chunks 200
+"""
+import argparse
+import os
+import tempfile
+import time
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, create_engine, select
+from app.models import Conversation, Document, DocumentChunk, IngestionJob, Message, User
+from app.services.deletion import delete_conversations
+
+
+def seed(engine, messages, documents, chunks):
+    with Session(engine) as db:
+        user = User(name="Delete", email=f"delete-{time.time_ns()}@bench.local")
+        db.add(user)
+        db.commit()
+        conv = Conversation(user_id=user.id, title="big", mode="rag")
+        db.add(conv)
+        db.commit()
+        db.add_all([
+            Message(conversation_id=conv.id, role="user", content=f"message {i}")
+            for i in range(messages)
+        ])
+        for d in range(documents):
+            doc = Document(conversation_id=conv.id, title=f"doc {d}", text="", chunk_count=chunks)
+            db.add(doc)
+            db.flush()
+            db.add_all([
+                DocumentChunk(document_id=doc.id, position=i, text=f"chunk {i}")
+                for i in range(chunks)
+            ])
+            db.add(IngestionJob(conversation_id=conv.id, filename=f"doc{d}.txt",
+                                title=f"doc {d}", status="completed", document_id=doc.id))
+        db.commit()
+        return conv.id
+
+
+def row_by_row_delete(db, conv_id):
+    """The previous implementation."""
+    conv = db.get(Conversation, conv_id)
+    db.exec(select(Message).where(Message.conversation_id == conv_id)).all()
+    for msg in db.exec(select(Message).where(Message.conversation_id == conv_id)):
+        db.delete(msg)
+    db.exec(select(Document).where(Document.conversation_id == conv_id)).all()
+    for doc in db.exec(select(Document).where(Document.conversation_id == conv_id)):
+        for chunk in db.exec(select(DocumentChunk).where(DocumentChunk.document_id == doc.id)):
+            db.delete(chunk)
+        db.delete(doc)
+    for job in db.exec(select(IngestionJob).where(IngestionJob.conversation_id == conv_id)):
+        db.delete(job)
+    db.delete(conv)
+
+
+def measure(engine, conv_id, delete):
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(len(parameters) if executemany else 1)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        start = time.perf_counter()
+        with Session(engine) as db:
+            delete(db, conv_id)
+            db.commit()
+        elapsed = time.perf_counter() - start
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    return len(statements), sum(statements), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--documents", type=int, default=5)
+    parser.add_argument("--chunks", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        SQLModel.metadata.create_all(engine)
+        runs = [
+            ("row-by-row:", row_by_row_delete),
+            ("set-based:", lambda db, conv_id: delete_conversations(db, [conv_id])),
+        ]
+        for label, delete in runs:
+            conv_id = seed(engine, args.messages, args.documents, args.chunks)
+            calls, rows, elapsed = measure(engine, conv_id, delete)
+            print(f"{label:<12} {calls:6d} execute calls  {rows:6d} statements  {elapsed * 1000:8.1f} ms")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
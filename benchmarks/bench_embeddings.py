@@ -0,0 +1,58 @@
+"""Offline throughput of the old one-at-a-time embedding loop vs batched get_embeddings.
+
+Uses FakeEmbeddingClient so no network or API key is needed:
+    python -m benchmarks.bench_embeddings --chunks 300 --latency 0.05
+"""
+import argparse
+import time
+from app.services import rag_service
+from app.services.embedding_cache import EmbeddingCache, set_embedding_cache
+from app.services.fake_clients import FakeEmbeddingClient
+from app.services.rag_service import get_embeddings, set_embedding_client
+
+
+def sequential_embeddings(client, texts, sleep=0.1):
+    """The previous implementation: one request per chunk plus a fixed sleep."""
+    embeddings = []
+    for text in texts:
+        result = client.models.embed_content(model=rag_service.EMBEDDING_MODEL, contents=text)
+        embeddings.append(result.embeddings[0].values)
+        time.sleep(sleep)
+    return embeddings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per request")
+    parser.add_argument("--per-item", type=float, default=0.001, help="seconds per content")
+    parser.add_argument("--skip-sequential", action="store_true")
+    args = parser.parse_args()
+
+    texts = [f"chunk number {i} " * 50 for i in range(args.chunks)]
+
+    if not args.skip_sequential:
+        fake = FakeEmbeddingClient(latency=args.latency, per_item_latency=args.per_item)
+        start = time.perf_counter()
+        sequential_embeddings(fake, texts)
+        elapsed = time.perf_counter() - start
+        print(f"sequential: {elapsed:7.2f}s  {fake.requests:4d} requests  {args.chunks / elapsed:8.1f} chunks/s")
+
+    fake = FakeEmbeddingClient(latency=args.latency, per_item_latency=args.per_item)
+    previous = set_embedding_client(fake)
+    set_embedding_cache(EmbeddingCache(":memory:"))
+    try:
+        for label in ("batched:", "cached:"):
+            requests_before = fake.requests
+            start = time.perf_counter()
+            get_embeddings(texts)
+            elapsed = time.perf_counter() - start
+            print(f"{label:<11} {elapsed:7.2f}s  {fake.requests - requests_before:4d} requests  "
+                  f"{args.chunks / elapsed:8.1f} chunks/s "
+                  f"(batch={rag_service.EMBED_BATCH_SIZE}, workers={rag_service.EMBED_MAX_WORKERS})")
+    finally:
+        set_embedding_client(previous)
+
+
+if __name__ == "__main__":
+    main()
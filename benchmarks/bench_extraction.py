@@ -0,0 +1,92 @@
+"""PDF ingestion front half: the old in-memory string concatenation vs
+streamed pages extracted serially and by the process pool.
+
+    python -m benchmarks.bench_extraction --pages 400 --workers 4
+"""
+import argparse
+import io
+import os
+import random
+import tempfile
+import time
+import PyPDF2
+from app.services import extraction
+from app.services.chunker import iter_chunks
+from app.services.extraction import iter_pages, shutdown_pdf_pool
+
+
+def make_pdf(n_pages, lines_per_page=40, seed=0):
+    """Synthetic PDF with `lines_per_page` lines of Helvetica text per page."""
+    rng = random.Random(seed)
+    vocabulary = [f"term{i}" for i in range(5000)]
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for _ in range(n_pages):
+        lines = " ".join(
+            f"({' '.join(rng.choices(vocabulary, k=10)).capitalize()}.) Tj 0 -14 Td"
+            for _ in range(lines_per_page)
+        )
+        stream = f"BT /F1 10 Tf 72 760 Td {lines} ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    out, offsets = "%PDF-1.4\n", []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    return out.encode("latin-1")
+
+
+def legacy_extract(path):
+    """The previous implementation: whole upload in memory, text built by +=."""
+    with open(path, "rb") as f:
+        reader = PyPDF2.PdfReader(io.BytesIO(f.read()))
+    text = ""
+    for page in reader.pages:
+        text += page.extract_text() + "\n"
+    return sum(1 for _ in iter_chunks(text))
+
+
+def streamed(path):
+    return sum(1 for _ in iter_chunks(iter_pages("bench.pdf", path)))
+
+
+def measure(label, fn, path, n_pages):
+    start = time.perf_counter()
+    chunks = fn(path)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<30} {chunks:6d} chunks  {elapsed:7.2f}s  {n_pages / elapsed:7.1f} pages/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=400)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    with os.fdopen(fd, "wb") as f:
+        f.write(make_pdf(args.pages))
+    print(f"input {args.pages} pages, {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+    try:
+        measure("legacy (+= in memory)", legacy_extract, path, args.pages)
+        extraction.PDF_WORKERS = 1
+        measure("streamed, serial", streamed, path, args.pages)
+        extraction.PDF_WORKERS = args.workers
+        extraction.PDF_PARALLEL_MIN_PAGES = 1
+        # The first run pays for spawning the workers
+        measure(f"streamed, {args.workers} processes (cold)", streamed, path, args.pages)
+        measure(f"streamed, {args.workers} processes", streamed, path, args.pages)
+    finally:
+        shutdown_pdf_pool()
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
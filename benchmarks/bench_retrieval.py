@@ -0,0 +1,117 @@
+"""Compare the per-chunk cosine_similarity loop with VectorIndex search,
+a merged ConversationIndex over many documents with searching each one,
+and end-to-end latency of the lexical / vector / hybrid retrieval modes.
+
+Run from the project root:
+    python -m benchmarks.bench_retrieval
+"""
+import time
+import numpy as np
+from app.services.embedding_cache import set_embedding_cache
+from app.services.fake_clients import FakeEmbeddingClient
+from app.services.rag_service import cosine_similarity, search_documents, set_embedding_client
+from app.services.vector_index import ConversationIndex, VectorIndex
+
+DIM = 768
+TOP_K = 3
+REPEATS = 20
+
+
+def loop_top_k(question_embedding, chunk_embeddings, top_k=TOP_K):
+    scores = []
+    for i, chunk_emb in enumerate(chunk_embeddings):
+        scores.append((cosine_similarity(question_embedding, chunk_emb), i))
+    scores.sort(reverse=True)
+    return [idx for _, idx in scores[:top_k]]
+
+
+def best_of(fn, repeats=REPEATS):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    rng = np.random.default_rng(0)
+    print(f"{'chunks':>8} {'loop ms':>10} {'build ms':>10} {'search ms':>10} {'speedup':>9}")
+    for n_chunks in (100, 1000, 5000, 20000):
+        embeddings = rng.standard_normal((n_chunks, DIM)).astype(np.float32).tolist()
+        question = rng.standard_normal(DIM).astype(np.float32).tolist()
+
+        index = VectorIndex.from_embeddings(embeddings)
+        expected = loop_top_k(question, embeddings)
+        _, found = index.search(question, TOP_K)
+        assert list(found) == expected, "index and loop disagree"
+
+        repeats = max(1, REPEATS // (n_chunks // 1000 + 1))
+        loop_s = best_of(lambda: loop_top_k(question, embeddings), repeats)
+        build_s = best_of(lambda: VectorIndex.from_embeddings(embeddings), repeats)
+        search_s = best_of(lambda: index.search(question, TOP_K))
+        print(
+            f"{n_chunks:>8} {loop_s * 1e3:>10.2f} {build_s * 1e3:>10.2f} "
+            f"{search_s * 1e3:>10.3f} {loop_s / search_s:>8.0f}x"
+        )
+    multi_document(rng)
+    retrieval_modes(rng)
+
+
+def per_document_top_k(question, indexes, top_k=TOP_K):
+    hits = []
+    for doc_id, index in enumerate(indexes):
+        scores, rows = index.search(question, top_k)
+        hits.extend(zip(scores, [doc_id] * len(rows), rows))
+    return sorted(hits, reverse=True)[:top_k]
+
+
+def multi_document(rng):
+    print(f"\n{'docs':>6} {'chunks':>8} {'per-doc ms':>11} {'merged ms':>10} {'full build ms':>14} {'add one ms':>11}")
+    for n_docs, per_doc in ((10, 100), (30, 200), (50, 400)):
+        documents = [
+            (doc_id, f"doc {doc_id}", [f"chunk {i}" for i in range(per_doc)],
+             rng.standard_normal((per_doc, DIM)).astype(np.float32))
+            for doc_id in range(n_docs)
+        ]
+        question = rng.standard_normal(DIM).astype(np.float32)
+        indexes = [VectorIndex.from_embeddings(embeddings) for _, _, _, embeddings in documents]
+        merged = ConversationIndex.from_documents(documents)
+        partial = ConversationIndex.from_documents(documents[:-1])
+
+        expected = [(doc_id, int(row)) for _, doc_id, row in per_document_top_k(question, indexes)]
+        found = [(s.document_id, s.position) for s in merged.search(question, TOP_K)]
+        assert found == expected, "merged and per-document search disagree"
+
+        per_doc_s = best_of(lambda: per_document_top_k(question, indexes))
+        merged_s = best_of(lambda: merged.search(question, TOP_K))
+        build_s = best_of(lambda: ConversationIndex.from_documents(documents), 3)
+        add_s = best_of(lambda: partial.with_document(*documents[-1]), 3)
+        print(
+            f"{n_docs:>6} {n_docs * per_doc:>8} {per_doc_s * 1e3:>11.2f} {merged_s * 1e3:>10.3f} "
+            f"{build_s * 1e3:>14.1f} {add_s * 1e3:>11.1f}"
+        )
+
+
+def retrieval_modes(rng, n_chunks=5000, embed_latency=0.15):
+    """Per-question latency with an embedder that takes `embed_latency` seconds."""
+    words = [f"term{i}" for i in range(2000)]
+    chunks = [" ".join(rng.choice(words, 120)) for _ in range(n_chunks)]
+    fake = FakeEmbeddingClient(dim=DIM, latency=embed_latency)
+    embeddings = rng.standard_normal((n_chunks, DIM)).astype(np.float32)
+    merged = ConversationIndex.from_documents([(1, "doc", chunks, embeddings)])
+    previous_client = set_embedding_client(fake)
+    previous_cache = set_embedding_cache(None)
+    try:
+        print(f"\n{'mode':>8} {'ms/question':>12}  ({n_chunks} chunks, embedder {embed_latency * 1e3:.0f} ms)")
+        for mode in ("lexical", "vector", "hybrid"):
+            question = " ".join(rng.choice(words, 4))
+            elapsed = best_of(lambda: search_documents(question, merged, mode=mode), 3)
+            print(f"{mode:>8} {elapsed * 1e3:>12.1f}")
+    finally:
+        set_embedding_client(previous_client)
+        set_embedding_cache(previous_cache)
+
+
+if __name__ == "__main__":
+    main()
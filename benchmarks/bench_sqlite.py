@@ -0,0 +1,103 @@
+"""Concurrent message writers and readers against a bare vs a tuned SQLite engine.
+
+The bare engine is what database.py used to build (rollback journal,
+full fsync, pysqlite's default lock timeout); the tuned one comes from create_app_engine:
+    python -m benchmarks.bench_sqlite --writers 8 --readers 8 --operations 200
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, SQLModel, create_engine, select, update
+from app.database import create_app_engine
+from app.migrations import run_migrations
+from app.models import Conversation, Message, User
+
+
+def seed(engine, conversations):
+    with Session(engine) as db:
+        user = User(name="Sqlite", email="sqlite@bench.local")
+        db.add(user)
+        db.commit()
+        convs = [Conversation(user_id=user.id, title=f"c{i}", mode="chat") for i in range(conversations)]
+        db.add_all(convs)
+        db.commit()
+        return [c.id for c in convs]
+
+
+def write(engine, conv_id, i):
+    with Session(engine) as db:
+        db.add(Message(conversation_id=conv_id, role="user", content=f"message {i}"))
+        db.exec(
+            update(Conversation)
+            .where(Conversation.id == conv_id)
+            .values(message_count=Conversation.message_count + 1)
+        )
+        db.commit()
+
+
+def read(engine, conv_id, i):
+    with Session(engine) as db:
+        db.exec(
+            select(Message)
+            .where(Message.conversation_id == conv_id)
+            .order_by(Message.timestamp.desc())
+            .limit(10)
+        ).all()
+
+
+def run(engine, conv_ids, writers, readers, operations):
+    errors = []
+    lock = threading.Lock()
+
+    def worker(fn, offset):
+        for i in range(operations):
+            try:
+                fn(engine, conv_ids[(offset + i) % len(conv_ids)], i)
+            except OperationalError as e:
+                with lock:
+                    errors.append(str(e.orig))
+
+    threads = [threading.Thread(target=worker, args=(write, n)) for n in range(writers)]
+    threads += [threading.Thread(target=worker, args=(read, n)) for n in range(readers)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return elapsed, errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--operations", type=int, default=200, help="per thread")
+    parser.add_argument("--conversations", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engines = {
+            "bare:": create_engine(
+                f"sqlite:///{os.path.join(tmp, 'bare.db')}",
+                connect_args={"check_same_thread": False}
+            ),
+            "tuned:": create_app_engine(f"sqlite:///{os.path.join(tmp, 'tuned.db')}"),
+        }
+        total = (args.writers + args.readers) * args.operations
+        for label, engine in engines.items():
+            SQLModel.metadata.create_all(engine)
+            run_migrations(engine)
+            conv_ids = seed(engine, args.conversations)
+            elapsed, errors = run(engine, conv_ids, args.writers, args.readers, args.operations)
+            locked = sum("locked" in e for e in errors)
+            print(f"{label:<7} {elapsed:7.2f}s  {(total - len(errors)) / elapsed:8.1f} ops/s  "
+                  f"{len(errors):5d} errors ({locked} 'database is locked')")
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+"""End-to-end load test and micro-benchmarks, with stored results.
+
+Seeds a fresh SQLite database (see benchmarks/seed.py), drives the
+FastAPI app in-process with concurrent clients against the local model
+backend, and reports p50/p95/p99 latency and throughput per endpoint,
+followed by micro-benchmarks of chunking, retrieval and decoding.
+
+Each run is written to benchmarks/results/<timestamp>.json and compared
+with benchmarks/results/baseline.json when present:
+    python -m benchmarks.bench_suite                     # full size
+    python -m benchmarks.bench_suite --scale small       # quick check
+    python -m benchmarks.bench_suite --save-baseline     # accept this run
+    python -m benchmarks.bench_suite --fail-on-regression
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+import httpx
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import Session, SQLModel
+from app.database import create_app_engine, get_session
+from app.main import app
+from app.services import providers
+from app.services.bm25 import BM25Index
+from app.services.document_store import load_conversation_documents, load_embeddings
+from app.services.embedding_cache import EmbeddingCache, set_embedding_cache
+from app.services.fake_clients import LocalClient
+from app.services.index_cache import index_cache
+from app.services.ingestion import wait_for_job
+from app.services.knowledge_base import knowledge_base
+from app.services.rag_service import chunk_text, cosine_similarity, embed_rate_limiter, search_documents
+from app.services.vector_index import ConversationIndex
+from app.models import Document
+from benchmarks.seed import paragraph, seed, sentence
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+BASELINE = os.path.join(RESULTS_DIR, "baseline.json")
+
+SCALES = {
+    "small": dict(users=4, conversations_per_user=5, messages_per_conversation=30,
+                  long_conversation_messages=2000, documents=2, chunks_per_document=300),
+    "full": dict(users=50, conversations_per_user=20, messages_per_conversation=30,
+                 long_conversation_messages=10_000, documents=3, chunks_per_document=3000),
+}
+
+
+def summarize(latencies, elapsed, errors=0, rejected=0):
+    ms = np.asarray(latencies or [0.0]) * 1000
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "rejected": rejected,
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+async def drive(client, request, total, concurrency):
+    """Run `total` calls of request(client, i) from `concurrency` concurrent workers.
+
+    Calls refused by admission control (429/503) are counted as rejected
+    and left out of the latencies, so rps is the goodput.
+    """
+    indexes = iter(range(total))
+    latencies, errors, rejected = [], 0, 0
+
+    async def worker():
+        nonlocal errors, rejected
+        for i in indexes:
+            start = time.perf_counter()
+            response = await request(client, i)
+            if response.status_code in (429, 503):
+                rejected += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            errors += response.status_code >= 400
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - start, errors, rejected)
+
+
+def scenarios(seeded, rng_seed=0):
+    rng = random.Random(rng_seed)
+    questions = [sentence(rng, (6, 12)) for _ in range(200)]
+    upload = "\n\n".join(paragraph(rng) for _ in range(60)).encode()
+
+    async def chat(client, i):
+        conv_id = seeded.chat_ids[1 + i % (len(seeded.chat_ids) - 1)]
+        return await client.post(f"/api/conversations/{conv_id}/messages", json={"content": questions[i % 200]})
+
+    async def long_chat(client, i):
+        return await client.post(f"/api/conversations/{seeded.long_chat_id}/messages",
+                                 json={"content": questions[i % 200]})
+
+    async def rag(client, i):
+        # Unique questions with the cache off: every request retrieves and generates
+        return await client.post(f"/api/conversations/{seeded.rag_id}/messages",
+                                 json={"content": f"{questions[i % 200]} #{i}", "use_cache": False})
+
+    async def history_page(client, i):
+        return await client.get(f"/api/conversations/{seeded.long_chat_id}?limit=50")
+
+    async def list_conversations(client, i):
+        user_id = seeded.user_ids[i % len(seeded.user_ids)]
+        return await client.get(f"/api/conversations?user_id={user_id}&limit=20")
+
+    async def knowledge_search(client, i):
+        return await client.get(f"/api/users/{seeded.rag_user_id}/search",
+                                params={"q": questions[i % 200], "top_k": 5})
+
+    async def upload_until_ingested(client, i):
+        response = await client.post(
+            f"/api/conversations/{seeded.chat_ids[-1]}/documents",
+            files={"file": (f"upload-{i}.txt", upload, "text/plain")}
+        )
+        if response.status_code == 200:
+            await run_in_threadpool(wait_for_job, response.json()["job_id"], 120)
+        return response
+
+    return [
+        ("POST messages (chat)", chat),
+        ("POST messages (chat, 10k history)", long_chat),
+        ("POST messages (rag)", rag),
+        ("GET conversation page", history_page),
+        ("GET conversations", list_conversations),
+        ("GET user search", knowledge_search),
+        ("POST documents (until ingested)", upload_until_ingested),
+    ]
+
+
+async def run_load(seeded, requests, concurrency):
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        for name, request in scenarios(seeded):
+            # Uploads are much heavier than the other endpoints
+            total = max(requests // 10, concurrency) if name.startswith("POST documents") else requests
+            await request(client, 0)  # warm caches and indexes
+            results[name] = await drive(client, request, total, concurrency)
+            print_row(name, results[name])
+    return results
+
+
+def time_calls(fn, repeats):
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeats):
+        call_start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - call_start)
+    return summarize(latencies, time.perf_counter() - start)
+
+
+def run_micro(engine, seeded, repeats):
+    rng = random.Random(1)
+    text = "\n\n".join(paragraph(rng) for _ in range(2000))
+    with Session(engine) as db:
+        documents = load_conversation_documents(db, seeded.rag_id)
+        doc = db.get(Document, seeded.document_ids[0])
+        legacy_json = json.dumps(load_embeddings(doc).tolist())
+        binary = (doc.embedding_matrix, doc.chunk_count, doc.embedding_dim)
+        lexical_blob = doc.lexical_index
+    conv_index = ConversationIndex.from_documents(documents)
+    embeddings = [e for _, _, _, emb, _ in documents for e in emb][:1000]
+    query = np.random.default_rng(2).standard_normal(embeddings[0].shape[0]).astype(np.float32)
+    question = sentence(rng, (6, 12))
+
+    benches = [
+        (f"chunk_text ({len(text) // 1024} KB)", lambda: chunk_text(text)),
+        ("cosine_similarity loop (1000 chunks)", lambda: [cosine_similarity(query, e) for e in embeddings]),
+        (f"ConversationIndex.build ({len(conv_index)} chunks)", lambda: ConversationIndex.from_documents(documents)),
+        (f"vector search ({len(conv_index)} chunks)", lambda: conv_index.search(query, 3)),
+        (f"hybrid search ({len(conv_index)} chunks)", lambda: conv_index.hybrid_search(query, question, 3)),
+        ("search_documents (lexical)", lambda: search_documents(question, conv_index, mode="lexical")),
+        ("decode embeddings (legacy JSON)", lambda: json.loads(legacy_json)),
+        ("decode embeddings (binary)", lambda: np.frombuffer(binary[0], dtype=np.float32).reshape(binary[1], binary[2])),
+        ("decode BM25 index", lambda: BM25Index.from_bytes(lexical_blob)),
+    ]
+    results = {}
+    for name, fn in benches:
+        fn()
+        results[name] = time_calls(fn, repeats)
+        print_row(name, results[name])
+    return results
+
+
+def print_row(name, stats):
+    print(f"{name:<44} {stats['rps']:9.1f}/s  p50 {stats['p50_ms']:9.2f}ms  p95 {stats['p95_ms']:9.2f}ms  "
+          f"p99 {stats['p99_ms']:9.2f}ms  errors {stats['errors']}  rejected {stats.get('rejected', 0)}")
+
+
+def compare(results, baseline, tolerance):
+    """Print p50/p95 changes against the baseline; returns the names that regressed."""
+    regressed = []
+    print(f"\nAgainst baseline {baseline['meta'].get('commit', '?')} ({baseline['meta'].get('timestamp', '?')}):")
+    for section in ("load", "micro"):
+        for name, stats in results[section].items():
+            old = baseline.get(section, {}).get(name)
+            if not old:
+                continue
+            p50, p95 = stats["p50_ms"] / max(old["p50_ms"], 1e-9), stats["p95_ms"] / max(old["p95_ms"], 1e-9)
+            flag = p95 > 1 + tolerance or p50 > 1 + tolerance
+            if flag:
+                regressed.append(name)
+            print(f"  {'REGRESSION' if flag else 'ok':<10} {name:<44} p50 x{p50:5.2f}  p95 x{p95:5.2f}")
+    return regressed
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", choices=sorted(SCALES), default="full")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--llm-latency-ms", type=float, default=200)
+    parser.add_argument("--embed-latency-ms", type=float, default=20)
+    parser.add_argument("--repeats", type=int, default=50, help="calls per micro-benchmark")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="slowdown flagged as a regression")
+    parser.add_argument("--verbose", action="store_true", help="show the app's own log output")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="bench-suite-")
+    engine = create_app_engine(f"sqlite:///{os.path.join(workdir, 'bench.db')}")
+    SQLModel.metadata.create_all(engine)
+    start = time.perf_counter()
+    seeded = seed(engine, **SCALES[args.scale])
+    print(f"seeded {seeded.messages} messages, {seeded.chunks} chunks in {time.perf_counter() - start:.1f}s")
+
+    def bench_session():
+        with Session(engine) as session:
+            yield session
+
+    local = LocalClient(llm_latency=args.llm_latency_ms / 1000, embed_latency=args.embed_latency_ms / 1000)
+    previous = {role: providers.set_client(role, local) for role in providers.ROLES}
+    previous_cache = set_embedding_cache(EmbeddingCache(":memory:"))
+    knowledge_base.directory = os.path.join(workdir, "ann")
+    app.dependency_overrides[get_session] = bench_session
+    print(f"\nload: {args.requests} requests per endpoint, {args.concurrency} concurrent clients, "
+          f"LLM {args.llm_latency_ms:.0f}ms, embeddings {args.embed_latency_ms:.0f}ms "
+          f"(rate limited to {embed_rate_limiter.rate:g}/s by EMBED_REQUESTS_PER_SEC)")
+    if not args.verbose:
+        for name in ("app", "httpx"):
+            logging.getLogger(name).setLevel(logging.ERROR)
+    try:
+        load = asyncio.run(run_load(seeded, args.requests, args.concurrency))
+        print("\nmicro:")
+        micro = run_micro(engine, seeded, args.repeats)
+    finally:
+        app.dependency_overrides.clear()
+        for role, client in previous.items():
+            providers.set_client(role, client)
+        set_embedding_cache(previous_cache)
+        index_cache.clear()
+        knowledge_base.clear()
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": sys.version.split()[0],
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+        },
+        "load": load,
+        "micro": micro,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}.json")
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nresults written to {path}")
+
+    regressed = []
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as f:
+            baseline = json.load(f)
+        if baseline["meta"]["args"].get("scale") != args.scale:
+            print(f"baseline was recorded at scale {baseline['meta']['args'].get('scale')!r}; not comparing")
+        else:
+            regressed = compare(results, baseline, args.tolerance)
+    if args.save_baseline:
+        with open(BASELINE, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"saved as baseline: {BASELINE}")
+    if regressed and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
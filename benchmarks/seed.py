@@ -0,0 +1,103 @@
+"""Seed a database with realistic volumes for the benchmark suite.
+
+Rows are written with executemany inserts, so a 10k-message conversation
+and documents with thousands of chunks take seconds, not minutes.
+"""
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import List
+import numpy as np
+from sqlalchemy import insert
+from sqlmodel import Session
+from app.models import Conversation, Document, Message, User
+from app.services.chunker import DEFAULT_PARAMS
+from app.services.document_store import store_document_content
+
+VOCABULARY = [f"term{i}" for i in range(5000)]
+
+
+@dataclass
+class Seeded:
+    user_ids: List[int] = field(default_factory=list)
+    chat_ids: List[int] = field(default_factory=list)
+    long_chat_id: int = 0
+    rag_id: int = 0
+    rag_user_id: int = 0
+    document_ids: List[int] = field(default_factory=list)
+    messages: int = 0
+    chunks: int = 0
+
+
+def sentence(rng, words=(6, 24)):
+    return " ".join(rng.choices(VOCABULARY, k=rng.randint(*words))).capitalize() + "."
+
+
+def paragraph(rng, sentences=(3, 8)):
+    return " ".join(sentence(rng) for _ in range(rng.randint(*sentences)))
+
+
+def _insert_messages(db, conv_id, count, rng, start):
+    rows = [
+        {
+            "conversation_id": conv_id,
+            "role": "user" if i % 2 == 0 else "model",
+            "content": sentence(rng, (4, 40)),
+            "timestamp": start + timedelta(seconds=i),
+        }
+        for i in range(count)
+    ]
+    for offset in range(0, count, 5000):
+        db.execute(insert(Message), rows[offset:offset + 5000])
+
+
+def seed(engine, users=20, conversations_per_user=10, messages_per_conversation=30,
+         long_conversation_messages=10_000, documents=3, chunks_per_document=2000, dim=768, seed=0):
+    """Users with chat histories, one very long chat and one RAG conversation
+    whose documents hold `chunks_per_document` chunks each."""
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    start = datetime.utcnow() - timedelta(days=30)
+    seeded = Seeded()
+
+    with Session(engine) as db:
+        for u in range(users):
+            user = User(name=f"Bench {u}", email=f"bench{u}@bench.local")
+            db.add(user)
+            db.flush()
+            seeded.user_ids.append(user.id)
+            for c in range(conversations_per_user):
+                count = long_conversation_messages if (u, c) == (0, 0) else messages_per_conversation
+                summarized = count - count % 15
+                conv = Conversation(
+                    user_id=user.id, title=f"bench {u}-{c}", mode="chat",
+                    summary=paragraph(rng) if summarized else None,
+                    summarized_count=summarized, message_count=count,
+                    last_updated=start + timedelta(minutes=u * conversations_per_user + c),
+                )
+                db.add(conv)
+                db.flush()
+                _insert_messages(db, conv.id, count, rng, start)
+                seeded.chat_ids.append(conv.id)
+                seeded.messages += count
+        seeded.long_chat_id = seeded.chat_ids[0]
+
+        seeded.rag_user_id = seeded.user_ids[0]
+        rag = Conversation(user_id=seeded.rag_user_id, title="bench handbook", mode="rag")
+        db.add(rag)
+        db.flush()
+        seeded.rag_id = rag.id
+        for d in range(documents):
+            chunks = [paragraph(rng) for _ in range(chunks_per_document)]
+            embeddings = np_rng.standard_normal((chunks_per_document, dim)).astype(np.float32)
+            doc = Document(
+                conversation_id=rag.id, title=f"handbook-{d}.pdf", text=chunks[0][:1000],
+                chunk_max_tokens=DEFAULT_PARAMS.max_tokens,
+                chunk_overlap_tokens=DEFAULT_PARAMS.overlap_tokens,
+                chunker=DEFAULT_PARAMS.version,
+            )
+            store_document_content(db, doc, chunks, embeddings)
+            seeded.document_ids.append(doc.id)
+            seeded.chunks += chunks_per_document
+        db.commit()
+    return seeded
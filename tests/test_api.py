@@ -1,10 +1,24 @@
 import pytest
 from fastapi.testclient import TestClient
-from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel import Session, SQLModel, create_engine, select
 from sqlmodel.pool import StaticPool
 from app.main import app
 from app.database import get_session
+from app.models import Conversation, DocumentChunk, IngestionJob, Message
+from app.services.index_cache import index_cache
+from app.services.knowledge_base import knowledge_base
+from app.services.llm_scheduler import llm_scheduler
+from app.services.response_cache import response_cache
+from app.services.fake_clients import FakeEmbeddingClient, FakeLLMClient
+from app.services.llm_service import set_llm_client
+from app.services import rag_service
+from app.services.rag_service import set_embedding_client
+from app.services.embedding_cache import EmbeddingCache, set_embedding_cache
+from app.services import ingestion
+from app.routes import conversations as conversation_routes
+from app.services.ingestion import wait_for_job
 import os
+import json
 
 # Create in-memory test database
 @pytest.fixture(name="session")
@@ -19,14 +33,32 @@ def session_fixture():
         yield session
 
 @pytest.fixture(name="client")
-def client_fixture(session: Session):
+def client_fixture(session: Session, tmp_path, monkeypatch):
     def get_session_override():
         return session
 
     app.dependency_overrides[get_session] = get_session_override
+    previous_embedder = set_embedding_client(FakeEmbeddingClient())
+    previous_llm = set_llm_client(FakeLLMClient())
+    previous_cache = set_embedding_cache(EmbeddingCache(":memory:"))
+    monkeypatch.setattr(knowledge_base, "directory", str(tmp_path / "ann"))
     client = TestClient(app)
     yield client
     app.dependency_overrides.clear()
+    set_embedding_client(previous_embedder)
+    set_llm_client(previous_llm)
+    set_embedding_cache(previous_cache)
+    index_cache.clear()
+    knowledge_base.clear()
+    response_cache.clear()
+
+
+def upload_and_wait(client: TestClient, conv_id: int, files: dict, data: dict = None):
+    response = client.post(f"/api/conversations/{conv_id}/documents", files=files, data=data)
+    assert response.status_code == 200
+    job_id = response.json()["job_id"]
+    wait_for_job(job_id, timeout=30)
+    return client.get(f"/api/ingestion-jobs/{job_id}").json()
 
 
 # Test 1: Root Endpoint
@@ -273,8 +305,18 @@ def test_document_upload(client: TestClient):
     )
     assert response.status_code == 200
     result = response.json()
-    assert result["status"] == "uploaded"
-    assert result["chunks_count"] > 0
+    assert result["status"] == "processing"
+    assert result["title"] == "Test Document"
+    
+    # Wait for the background ingestion job
+    wait_for_job(result["job_id"], timeout=30)
+    job = client.get(f"/api/ingestion-jobs/{result['job_id']}").json()
+    assert job["status"] == "completed"
+    assert job["chunks_total"] > 0
+    assert job["chunks_embedded"] == job["chunks_total"]
+    
+    docs = client.get(f"/api/conversations/{conv_id}/documents").json()
+    assert docs[0]["id"] == job["document_id"]
 
 
 # Test 14: History Compression
@@ -313,4 +355,620 @@ def test_invalid_conversation_id(client: TestClient):
         "/api/conversations/99999/messages",
         json={"content": "Test"}
     )
-    assert response.status_code == 404
\ No newline at end of file
+    assert response.status_code == 404
+
+
+# Test 16: Document Index Cache
+def test_rag_index_cache(client: TestClient):
+    """Test that repeated RAG questions reuse the decoded document index"""
+    user_response = client.post("/api/users?name=Cache User&email=cache@test.com")
+    user_id = user_response.json()["user_id"]
+    
+    conv_response = client.post(
+        "/api/conversations",
+        json={"user_id": user_id, "first_message": "Cache test", "mode": "rag"}
+    )
+    conv_id = conv_response.json()["conversation_id"]
+    
+    files = {"file": ("cache.txt", b"Cached document text about indexes.", "text/plain")}
+    upload_and_wait(client, conv_id, files)
+    
+    before = client.get("/api/stats/index-cache").json()
+    for _ in range(3):
+        response = client.post(
+            f"/api/conversations/{conv_id}/messages",
+            json={"content": "What is cached?"}
+        )
+        assert response.status_code == 200
+    after = client.get("/api/stats/index-cache").json()
+    
+    assert after["misses"] - before["misses"] == 1
+    assert after["hits"] - before["hits"] == 2
+    
+    # Deleting the conversation drops its cached index
+    client.delete(f"/api/conversations/{conv_id}")
+    assert client.get("/api/stats/index-cache").json()["entries"] == 0
+
+
+# Test 17: Re-upload Uses Embedding Cache
+def test_reupload_hits_embedding_cache(client: TestClient):
+    """Test that uploading a known document skips re-embedding"""
+    user_response = client.post("/api/users?name=Reupload User&email=reupload@test.com")
+    user_id = user_response.json()["user_id"]
+    
+    conv_ids = []
+    for i in range(2):
+        conv_response = client.post(
+            "/api/conversations",
+            json={"user_id": user_id, "first_message": f"Handbook {i}", "mode": "rag"}
+        )
+        conv_ids.append(conv_response.json()["conversation_id"])
+    
+    handbook = " ".join(f"word{i}" for i in range(1200)).encode()
+    for conv_id in conv_ids:
+        files = {"file": ("handbook.txt", handbook, "text/plain")}
+        assert upload_and_wait(client, conv_id, files)["status"] == "completed"
+    
+    stats = client.get("/api/stats/embedding-cache").json()
+    assert stats["enabled"] is True
+    assert stats["misses"] == 3
+    assert stats["hits"] == 3
+
+
+# Test 18: RAG Message While Document Is Ingesting
+def test_rag_message_while_ingesting(client: TestClient, session: Session):
+    """Test that RAG questions get 409 not_ready during ingestion and are not stored"""
+    user_response = client.post("/api/users?name=Pending User&email=pending@test.com")
+    user_id = user_response.json()["user_id"]
+    
+    conv_response = client.post(
+        "/api/conversations",
+        json={"user_id": user_id, "first_message": "Pending doc", "mode": "rag"}
+    )
+    conv_id = conv_response.json()["conversation_id"]
+    
+    session.add(IngestionJob(conversation_id=conv_id, filename="big.pdf", title="big.pdf", status="running"))
+    session.commit()
+    
+    response = client.post(
+        f"/api/conversations/{conv_id}/messages",
+        json={"content": "Is it ready?"}
+    )
+    assert response.status_code == 409
+    assert response.headers["retry-after"]
+    data = response.json()["detail"]
+    assert data["status"] == "not_ready"
+    assert "still being processed" in data["error"]
+    
+    # Retrying while the document is ingested stores nothing
+    client.post(f"/api/conversations/{conv_id}/messages/stream", json={"content": "Is it ready?"})
+    history = client.get(f"/api/conversations/{conv_id}").json()
+    assert [m["content"] for m in history["messages"] if m["role"] == "user"] == ["Pending doc"]
+    assert session.get(Conversation, conv_id).message_count == 2
+
+
+# Test 19: Failed Ingestion Reports Error
+def test_failed_ingestion_job(client: TestClient):
+    """Test that an unreadable document marks the job as failed"""
+    user_response = client.post("/api/users?name=Broken User&email=broken@test.com")
+    user_id = user_response.json()["user_id"]
+    
+    conv_response = client.post(
+        "/api/conversations",
+        json={"user_id": user_id, "first_message": "Broken doc", "mode": "rag"}
+    )
+    conv_id = conv_response.json()["conversation_id"]
+    
+    files = {"file": ("empty.txt", b"   ", "text/plain")}
+    job = upload_and_wait(client, conv_id, files)
+    assert job["status"] == "failed"
+    assert "empty" in job["error"]
+
+
+# Test 20: Streaming Message Response
+def test_stream_message(client: TestClient):
+    """Test that the streaming endpoint sends tokens and persists the reply"""
+    user_response = client.post("/api/users?name=Stream User&email=stream@test.com")
+    user_id = user_response.json()["user_id"]
+    
+    conv_response = client.post(
+        "/api/conversations",
+        json={"user_id": user_id, "first_message": "Hello", "mode": "chat"}
+    )
+    conv_id = conv_response.json()["conversation_id"]
+    
+    with client.stream(
+        "POST",
+        f"/api/conversations/{conv_id}/messages/stream",
+        json={"content": "Stream this answer please"}
+    ) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+        body = "".join(response.iter_text())
+    
+    events = [block.split("\n") for block in body.strip().split("\n\n")]
+    names = [lines[0].removeprefix("event: ") for lines in events]
+    assert names.count("token") > 1
+    assert names[-1] == "done"
+    
+    tokens = "".join(json.loads(lines[1].removeprefix("data: "))["text"] for lines in events[:-1])
+    final = json.loads(events[-1][1].removeprefix("data: "))["response"]
+    assert tokens == final
+    
+    messages = client.get(f"/api/conversations/{conv_id}").json()["messages"]
+    assert messages[-1]["role"] == "model"
+    assert messages[-1]["content"] == final
+
+
+# Test 21: Deferred Summarization
+def test_summary_runs_after_reply(client: TestClient, session: Session):
+    """Test that the 15th message schedules a background summary exactly once"""
+    user_response = client.post("/api/users?name=Summary User&email=summary@test.com")
+    user_id = user_response.json()["user_id"]
+    
+    conv_response = client.post(
+        "/api/conversations",
+        json={"user_id": user_id, "first_message": "Start", "mode": "chat"}
+    )
+    conv_id = conv_response.json()["conversation_id"]
+    before = client.get("/api/stats/summarization").json()
+    
+    # 2 messages exist; 7 turns add 14 more, crossing the 15 message mark once
+    for i in range(7):
+        client.post(f"/api/conversations/{conv_id}/messages", json={"content": f"Turn {i}"})
+    
+    conv = session.get(Conversation, conv_id)
+    session.refresh(conv)
+    assert conv.summary
+    assert conv.summarized_count == 15
+    
+    after = client.get("/api/stats/summarization").json()
+    assert after["completed"] - before["completed"] == 1
+    assert after["duration_last_seconds"] >= 0
+
+
+# Test 22: Denormalized Message Count
+def test_message_count_tracks_history(client: TestClient, session: Session):
+    """Test that message_count stays in sync without reloading the history"""
+    user_response = client.post("/api/users?name=Count User&email=count@test.com")
+    user_id = user_response.json()["user_id"]
+    
+    conv_response = client.post(
+        "/api/conversations",
+        json={"user_id": user_id, "first_message": "Start", "mode": "chat"}
+    )
+    conv_id = conv_response.json()["conversation_id"]
+    
+    for i in range(3):
+        client.post(f"/api/conversations/{conv_id}/messages", json={"content": f"Count {i}"})
+    
+    conv = session.get(Conversation, conv_id)
+    session.refresh(conv)
+    messages = client.get(f"/api/conversations/{conv_id}").json()["messages"]
+    assert conv.message_count == len(messages) == 8
+
+
+# Test 23: Cursor Pagination
+def test_conversation_pagination(client: TestClient):
+    """Test paging back through messages and conversations with cursors"""
+    user_response = client.post("/api/users?name=Page User&email=page@test.com")
+    user_id = user_response.json()["user_id"]
+    
+    conv_ids = []
+    for i in range(3):
+        conv_response = client.post(
+            "/api/conversations",
+            json={"user_id": user_id, "first_message": f"Page {i}", "mode": "chat"}
+        )
+        conv_ids.append(conv_response.json()["conversation_id"])
+    conv_id = conv_ids[0]
+    for i in range(4):
+        client.post(f"/api/conversations/{conv_id}/messages", json={"content": f"Msg {i}"})
+    
+    # 10 messages, paged 4 at a time from newest to oldest
+    pages = []
+    cursor = None
+    while True:
+        params = {"limit": 4}
+        if cursor:
+            params["before"] = cursor
+        response = client.get(f"/api/conversations/{conv_id}", params=params)
+        data = response.json()
+        pages.append(data["messages"])
+        cursor = data["next_cursor"]
+        assert response.headers.get("x-next-cursor") == cursor
+        if not cursor:
+            break
+    assert [len(page) for page in pages] == [4, 4, 2]
+    ids = [m["id"] for page in reversed(pages) for m in page]
+    full = client.get(f"/api/conversations/{conv_id}").json()
+    assert ids == [m["id"] for m in full["messages"]]
+    assert full["next_cursor"] is None
+    
+    first = client.get("/api/conversations", params={"user_id": user_id, "limit": 2})
+    assert len(first.json()) == 2
+    second = client.get(
+        "/api/conversations",
+        params={"user_id": user_id, "limit": 2, "cursor": first.headers["x-next-cursor"]}
+    )
+    assert "x-next-cursor" not in second.headers
+    listed = [c["id"] for c in first.json() + second.json()]
+    assert sorted(listed) == sorted(conv_ids)
+    
+    bad = client.get(f"/api/conversations/{conv_id}", params={"before": "not-a-cursor"})
+    assert bad.status_code == 400
+
+
+# Test 24: Bulk Delete
+def test_bulk_delete(client: TestClient, session: Session):
+    """Test deleting several conversations at once and a whole user's data"""
+    user_response = client.post("/api/users?name=Bulk User&email=bulk@test.com")
+    user_id = user_response.json()["user_id"]
+    other_response = client.post("/api/users?name=Other User&email=other@test.com")
+    other_id = other_response.json()["user_id"]
+    
+    conv_ids = []
+    for i in range(3):
+        conv_response = client.post(
+            "/api/conversations",
+            json={"user_id": user_id, "first_message": f"Bulk {i}", "mode": "rag"}
+        )
+        conv_ids.append(conv_response.json()["conversation_id"])
+    upload_and_wait(client, conv_ids[0], {"file": ("bulk.txt", b"Bulk deleted content.", "text/plain")})
+    other_conv = client.post(
+        "/api/conversations",
+        json={"user_id": other_id, "first_message": "Keep me", "mode": "chat"}
+    ).json()["conversation_id"]
+    
+    # Only conversations owned by user_id are touched
+    response = client.post(
+        "/api/conversations/bulk-delete",
+        json={"conversation_ids": conv_ids[:2] + [other_conv], "user_id": user_id}
+    )
+    assert response.status_code == 200
+    assert response.json()["deleted"] == 2
+    assert client.get(f"/api/conversations/{conv_ids[0]}").status_code == 404
+    assert client.get(f"/api/conversations/{other_conv}").status_code == 200
+    assert session.exec(select(DocumentChunk)).all() == []
+    assert session.exec(select(Message).where(Message.conversation_id == conv_ids[0])).all() == []
+    
+    response = client.delete(f"/api/users/{user_id}")
+    assert response.json()["conversations_deleted"] == 1
+    assert client.get(f"/api/users/{user_id}").status_code == 404
+    assert client.get(f"/api/conversations/{conv_ids[2]}").status_code == 404
+    assert client.delete(f"/api/users/{user_id}").status_code == 404
+
+
+# Test 25: Multi-Document Retrieval With Citations
+def test_rag_across_documents(client: TestClient):
+    """Test that questions search every document and cite their sources"""
+    user_response = client.post("/api/users?name=Multi User&email=multi@test.com")
+    user_id = user_response.json()["user_id"]
+    
+    conv_response = client.post(
+        "/api/conversations",
+        json={"user_id": user_id, "first_message": "Two docs", "mode": "rag"}
+    )
+    conv_id = conv_response.json()["conversation_id"]
+    
+    apples = upload_and_wait(client, conv_id, {"file": ("apples.txt", b"Apples are red.", "text/plain")})
+    bananas = upload_and_wait(client, conv_id, {"file": ("bananas.txt", b"Bananas are yellow.", "text/plain")})
+    
+    # Prime the cache, then check later uploads/deletes patch it instead of reloading
+    client.post(f"/api/conversations/{conv_id}/messages", json={"content": "Anything?"})
+    before = client.get("/api/stats/index-cache").json()
+    
+    data = client.post(
+        f"/api/conversations/{conv_id}/messages",
+        json={"content": "Bananas are yellow."}
+    ).json()
+    citations = data["citations"]
+    assert [c["title"] for c in citations] == ["bananas.txt", "apples.txt"]
+    assert citations[0]["document_id"] == bananas["document_id"]
+    assert citations[0]["number"] == 1
+    assert citations[0]["chunk"] == 0
+    assert "[2] apples.txt" in data["response"]
+    
+    response = client.delete(f"/api/conversations/{conv_id}/documents/{bananas['document_id']}")
+    assert response.status_code == 200
+    data = client.post(
+        f"/api/conversations/{conv_id}/messages",
+        json={"content": "Bananas are yellow."}
+    ).json()
+    assert [c["document_id"] for c in data["citations"]] == [apples["document_id"]]
+    
+    after = client.get("/api/stats/index-cache").json()
+    assert after["misses"] == before["misses"]
+    assert client.delete(f"/api/conversations/{conv_id}/documents/{bananas['document_id']}").status_code == 404
+
+
+# Test 26: User-Wide Knowledge Base Search
+def test_user_knowledge_base_search(client: TestClient, session: Session):
+    """Test searching all of a user's documents and keeping the index in sync"""
+    user_response = client.post("/api/users?name=Library User&email=library@test.com")
+    user_id = user_response.json()["user_id"]
+    
+    docs = {}
+    for topic in ("Volcanoes erupt lava.", "Glaciers carve valleys."):
+        conv_id = client.post(
+            "/api/conversations",
+            json={"user_id": user_id, "first_message": topic, "mode": "rag"}
+        ).json()["conversation_id"]
+        job = upload_and_wait(client, conv_id, {"file": ("notes.txt", topic.encode(), "text/plain")})
+        docs[topic] = (conv_id, job["document_id"])
+    
+    results = client.get(f"/api/users/{user_id}/search", params={"q": "Glaciers carve valleys."}).json()["results"]
+    assert len(results) == 2
+    assert results[0]["document_id"] == docs["Glaciers carve valleys."][1]
+    assert results[0]["conversation_id"] == docs["Glaciers carve valleys."][0]
+    assert results[0]["text"] == "Glaciers carve valleys."
+    
+    # A later upload is inserted into the persisted index
+    conv_id = docs["Volcanoes erupt lava."][0]
+    job = upload_and_wait(client, conv_id, {"file": ("more.txt", b"Deserts are dry.", "text/plain")})
+    results = client.get(f"/api/users/{user_id}/search", params={"q": "Deserts are dry.", "top_k": 1}).json()["results"]
+    assert [r["document_id"] for r in results] == [job["document_id"]]
+    
+    # Deleted documents and conversations drop out of the results
+    client.delete(f"/api/conversations/{conv_id}/documents/{job['document_id']}")
+    client.delete(f"/api/conversations/{docs['Glaciers carve valleys.'][0]}")
+    results = client.get(f"/api/users/{user_id}/search", params={"q": "Deserts are dry."}).json()["results"]
+    assert [r["document_id"] for r in results] == [docs["Volcanoes erupt lava."][1]]
+    assert knowledge_base.get(session, user_id).documents() == {docs["Volcanoes erupt lava."][1]}
+    client.post("/api/conversations/bulk-delete", json={"conversation_ids": [conv_id], "user_id": user_id})
+    assert knowledge_base.get(session, user_id).documents() == set()
+    
+    assert client.get("/api/users/999999/search", params={"q": "x"}).status_code == 404
+
+
+# Test 27: Lexical Fast Path And Embedding Outage
+def test_rag_lexical_retrieval(client: TestClient):
+    """Test BM25-only retrieval, unknown modes and the keyword fallback when embeddings fail"""
+    user_response = client.post("/api/users?name=Lexical User&email=lexical@test.com")
+    user_id = user_response.json()["user_id"]
+    
+    conv_id = client.post(
+        "/api/conversations",
+        json={"user_id": user_id, "first_message": "Keywords", "mode": "rag"}
+    ).json()["conversation_id"]
+    upload_and_wait(client, conv_id, {"file": ("intro.txt", b"Welcome to the handbook.", "text/plain")})
+    leave = upload_and_wait(client, conv_id, {"file": ("leave.txt", b"Parental leave lasts twenty weeks.", "text/plain")})
+    
+    embedder = FakeEmbeddingClient()
+    set_embedding_client(embedder)
+    data = client.post(
+        f"/api/conversations/{conv_id}/messages",
+        json={"content": "How long is parental leave?", "retrieval": "lexical"}
+    ).json()
+    assert embedder.requests == 0
+    assert [c["document_id"] for c in data["citations"]] == [leave["document_id"]]
+    
+    # Unknown modes are refused rather than treated as hybrid
+    response = client.post(
+        f"/api/conversations/{conv_id}/messages",
+        json={"content": "How long is parental leave?", "retrieval": "fuzzy"}
+    )
+    assert response.status_code == 422
+    
+    # Every embedding request fails: hybrid retrieval degrades to BM25 after one quick retry
+    failing = FakeEmbeddingClient(fail_first=100)
+    set_embedding_client(failing)
+    data = client.post(
+        f"/api/conversations/{conv_id}/messages",
+        json={"content": "What about parental leave weeks?"}
+    ).json()
+    assert data["citations"][0]["document_id"] == leave["document_id"]
+    assert failing.requests == rag_service.EMBED_QUERY_MAX_RETRIES + 1
+
+
+# Test 28: Upload Size Limit And Page Progress
+def test_upload_limit_and_spooling(client: TestClient, session: Session, tmp_path, monkeypatch):
+    """Test that oversized uploads get 413 and spooled files are removed after ingestion"""
+    user_response = client.post("/api/users?name=Spool User&email=spool@test.com")
+    user_id = user_response.json()["user_id"]
+    
+    conv_id = client.post(
+        "/api/conversations",
+        json={"user_id": user_id, "first_message": "Big files", "mode": "rag"}
+    ).json()["conversation_id"]
+    spool_dir = tmp_path / "spool"
+    spool_dir.mkdir()
+    monkeypatch.setattr(ingestion, "UPLOAD_SPOOL_DIR", str(spool_dir))
+    monkeypatch.setattr(ingestion, "MAX_UPLOAD_BYTES", 64)
+    
+    response = client.post(
+        f"/api/conversations/{conv_id}/documents",
+        files={"file": ("big.txt", b"x" * 65, "text/plain")}
+    )
+    assert response.status_code == 413
+    assert session.exec(select(IngestionJob)).all() == []
+    
+    job = upload_and_wait(client, conv_id, {"file": ("small.txt", b"Fits under the limit.", "text/plain")})
+    assert job["status"] == "completed"
+    assert job["pages_total"] == job["pages_extracted"] == 1
+    assert list(spool_dir.iterdir()) == []
+
+
+# Test 29: Semantic Response Cache
+def test_response_cache_sharing(client: TestClient, session: Session):
+    """Test that repeated questions hit the cache across conversations unless a summary is in the prompt"""
+    user_response = client.post("/api/users?name=Cache User&email=cache@test.com")
+    user_id = user_response.json()["user_id"]
+    
+    handbook = {"file": ("handbook.txt", b"Parental leave lasts twenty weeks. Laptops are replaced yearly.", "text/plain")}
+    conv_ids, doc_ids = [], []
+    for title in ("First", "Second"):
+        conv_id = client.post(
+            "/api/conversations",
+            json={"user_id": user_id, "first_message": title, "mode": "rag"}
+        ).json()["conversation_id"]
+        conv_ids.append(conv_id)
+        doc_ids.append(upload_and_wait(client, conv_id, handbook)["document_id"])
+    
+    llm = FakeLLMClient()
+    set_llm_client(llm)
+    before = client.get("/api/stats/response-cache").json()
+    question = {"content": "How long is parental leave?"}
+    first = client.post(f"/api/conversations/{conv_ids[0]}/messages", json=question).json()
+    repeat = client.post(f"/api/conversations/{conv_ids[0]}/messages", json=question).json()
+    
+    assert llm.requests == 1
+    assert (first["cached"], repeat["cached"]) == (False, True)
+    assert repeat["response"] == first["response"]
+    assert repeat["citations"][0]["document_id"] == doc_ids[0]
+    
+    # Same document in another conversation: without a summary the answer is shared
+    other = client.post(f"/api/conversations/{conv_ids[1]}/messages", json=question).json()
+    assert other["cached"] is True
+    assert other["citations"][0]["document_id"] == doc_ids[1]
+    assert llm.requests == 1
+    
+    # Once a conversation has a summary, its prompts are private to it
+    conv = session.get(Conversation, conv_ids[1])
+    conv.summary = "The user is planning a family."
+    session.add(conv)
+    session.commit()
+    private = client.post(f"/api/conversations/{conv_ids[1]}/messages", json=question).json()
+    assert private["cached"] is False
+    assert llm.requests == 2
+    
+    fresh = client.post(
+        f"/api/conversations/{conv_ids[0]}/messages", json={**question, "use_cache": False}
+    ).json()
+    assert fresh["cached"] is False
+    assert llm.requests == 3
+    
+    stats = client.get("/api/stats/response-cache").json()
+    assert stats["hits"] - before["hits"] == 2
+    assert stats["misses"] - before["misses"] == 2
+
+
+# Test 30: Request Timings and Metrics Endpoint
+def test_metrics_endpoint_and_server_timing(client: TestClient):
+    """Test that message stages are timed and LLM failures are counted on /metrics"""
+    user_response = client.post("/api/users?name=Metrics User&email=metrics@test.com")
+    user_id = user_response.json()["user_id"]
+    conv_id = client.post(
+        "/api/conversations",
+        json={"user_id": user_id, "first_message": "Hello", "mode": "chat"}
+    ).json()["conversation_id"]
+    
+    response = client.post(f"/api/conversations/{conv_id}/messages", json={"content": "Timed"})
+    timing = response.headers["server-timing"]
+    for stage in ("db.record_message", "context.pack", "llm.chat", "db.save_reply"):
+        assert f"{stage};dur=" in timing
+    
+    set_llm_client(object())  # every generation call now raises
+    reply = client.post(f"/api/conversations/{conv_id}/messages", json={"content": "Broken"}).json()
+    assert reply["response"] == "Sorry, I'm having trouble responding right now."
+    
+    metrics = client.get("/metrics")
+    assert metrics.status_code == 200
+    assert metrics.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = metrics.text
+    assert 'botgpt_stage_duration_seconds_count{stage="llm.chat"}' in body
+    assert 'route="/api/conversations/{conv_id}/messages",status="200"' in body
+    assert 'botgpt_llm_errors_total{operation="chat"}' in body
+    assert 'botgpt_llm_fallbacks_total{operation="chat"}' in body
+
+
+# Test 31: Admission Control for Model Calls
+def test_overloaded_model_rejects_before_storing(client: TestClient, monkeypatch):
+    """Test that turns without model capacity get 429/503 with Retry-After and nothing is stored"""
+    user_response = client.post("/api/users?name=Busy User&email=busy@test.com")
+    user_id = user_response.json()["user_id"]
+    conv_id = client.post(
+        "/api/conversations",
+        json={"user_id": user_id, "first_message": "Hello", "mode": "chat"}
+    ).json()["conversation_id"]
+    
+    # Every slot is taken by calls that take far longer than the queue timeout
+    monkeypatch.setattr(llm_scheduler, "max_concurrency", 1)
+    monkeypatch.setattr(llm_scheduler, "active", 1)
+    monkeypatch.setattr(llm_scheduler, "service_time", 60.0)
+    response = client.post(f"/api/conversations/{conv_id}/messages", json={"content": "Anyone there?"})
+    assert response.status_code == 503
+    assert int(response.headers["retry-after"]) >= 60
+    
+    monkeypatch.setattr(llm_scheduler, "max_queued_per_user", 0)
+    response = client.post(f"/api/conversations/{conv_id}/messages", json={"content": "Still there?"})
+    assert response.status_code == 429
+    response = client.post(f"/api/conversations/{conv_id}/messages/stream", json={"content": "Streaming?"})
+    assert response.status_code == 429
+    response = client.post(
+        "/api/conversations",
+        json={"user_id": user_id, "first_message": "New chat?", "mode": "chat"}
+    )
+    assert response.status_code == 429
+    
+    history = client.get(f"/api/conversations/{conv_id}").json()["messages"]
+    assert [m["content"] for m in history if m["role"] == "user"] == ["Hello"]
+    assert len(client.get(f"/api/conversations?user_id={user_id}").json()) == 1
+    
+    monkeypatch.setattr(llm_scheduler, "active", 0)
+    response = client.post(f"/api/conversations/{conv_id}/messages", json={"content": "Now?"})
+    assert response.status_code == 200
+    assert client.get("/api/stats/llm-scheduler").json()["rejected"] >= 2
+    
+# Test 32: Recover Interrupted Ingestion
+def test_recover_interrupted_ingestion(client: TestClient, session: Session, tmp_path, monkeypatch):
+    """Test that jobs and spooled uploads left by a stopped server are failed and deleted"""
+    user_response = client.post("/api/users?name=Restart User&email=restart@test.com")
+    user_id = user_response.json()["user_id"]
+    conv_id = client.post(
+        "/api/conversations",
+        json={"user_id": user_id, "first_message": "Hi", "mode": "rag"}
+    ).json()["conversation_id"]
+    session.add(IngestionJob(conversation_id=conv_id, filename="a.txt", title="a.txt", status="pending"))
+    session.add(IngestionJob(conversation_id=conv_id, filename="b.txt", title="b.txt", status="completed"))
+    session.commit()
+    leftover = tmp_path / f"{ingestion.SPOOL_PREFIX}1234.txt"
+    leftover.write_text("half an upload")
+    unrelated = tmp_path / "notes.txt"
+    unrelated.write_text("keep me")
+    
+    assert ingestion.recover_interrupted_jobs(session.get_bind(), spool_dir=str(tmp_path)) == 1
+    jobs = client.get(f"/api/conversations/{conv_id}/ingestion-jobs").json()
+    assert sorted(job["status"] for job in jobs) == ["completed", "failed"]
+    assert not leftover.exists()
+    assert unrelated.exists()
+    
+    # A job whose conversation is deleted mid-run fails quietly instead of raising
+    job = IngestionJob(conversation_id=conv_id, filename="c.txt", title="c.txt", status="pending")
+    session.add(job)
+    session.commit()
+    job_id = job.id
+    path = tmp_path / "c.txt"
+    path.write_text("Some text worth embedding.")
+    
+    def delete_then_fail(filename, upload_path):
+        client.delete(f"/api/conversations/{conv_id}")
+        raise ingestion.IngestionError("extraction failed")
+    
+    monkeypatch.setattr(ingestion, "count_pages", delete_then_fail)
+    ingestion.run_ingestion(session.get_bind(), job_id, "c.txt", str(path))
+    assert session.exec(select(IngestionJob).where(IngestionJob.id == job_id)).first() is None
+    assert not path.exists()
+    
+# Test 33: Question Embedding Outside The Session
+def test_question_embedding_holds_no_transaction(client: TestClient, session: Session, monkeypatch):
+    """Test that the question is embedded after the session's transaction has ended"""
+    user_response = client.post("/api/users?name=Pool User&email=pool@test.com")
+    user_id = user_response.json()["user_id"]
+    conv_id = client.post(
+        "/api/conversations",
+        json={"user_id": user_id, "first_message": "Docs", "mode": "rag"}
+    ).json()["conversation_id"]
+    upload_and_wait(client, conv_id, {"file": ("notes.txt", b"Tides follow the moon.", "text/plain")})
+    
+    in_transaction = []
+    embed_query = conversation_routes.embed_query
+    
+    def recording_embed_query(question):
+        in_transaction.append(session.in_transaction())
+        return embed_query(question)
+    
+    monkeypatch.setattr(conversation_routes, "embed_query", recording_embed_query)
+    response = client.post(f"/api/conversations/{conv_id}/messages", json={"content": "What moves tides?"})
+    assert response.status_code == 200
+    assert in_transaction == [False]
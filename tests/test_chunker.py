@@ -0,0 +1,80 @@
+import pytest
+from app.services.chunker import ChunkParams, iter_chunks, iter_paragraphs
+from app.services.rag_service import chunk_text
+from app.services.tokens import count_tokens
+
+
+def make_text(paragraphs=6, sentences=10):
+    return "\n\n".join(
+        " ".join(f"Paragraph {p} sentence {s} talks about topic {p * s}." for s in range(sentences))
+        for p in range(paragraphs)
+    )
+
+
+# Test 1: Size Limit, Sentence Boundaries and Overlap
+def test_chunks_respect_limits_and_overlap():
+    """Test that chunks stay under the token limit, end on sentences and overlap"""
+    params = ChunkParams(max_tokens=60, overlap_tokens=15)
+    chunks = chunk_text(make_text(), params)
+
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 60 for chunk in chunks)
+    assert all(chunk.endswith(".") for chunk in chunks)
+    for previous, current in zip(chunks, chunks[1:]):
+        last_sentence = previous.rsplit(". ", 1)[-1].split("\n\n")[-1]
+        assert current.startswith(last_sentence)
+
+    # Every sentence survives chunking
+    joined = " ".join(chunks)
+    assert all(f"Paragraph 5 sentence {s} " in joined for s in range(10))
+
+
+# Test 2: Streaming Over Pieces
+def test_streaming_pieces_match_whole_text():
+    """Test that feeding pages gives the same chunks as the full text"""
+    text = make_text()
+    pages = [text[i:i + 97] for i in range(0, len(text), 97)]
+    params = ChunkParams(max_tokens=80, overlap_tokens=0)
+    assert list(iter_chunks(pages, params)) == list(iter_chunks(text, params))
+
+
+# Test 3: Over-long Sentence Windows
+def test_long_sentence_is_windowed():
+    """Test that text without sentence breaks is split into overlapping windows"""
+    words = " ".join(f"w{i}" for i in range(1000))
+    chunks = chunk_text(words, ChunkParams(max_tokens=300, overlap_tokens=50))
+    assert [count_tokens(c) for c in chunks] == [300, 300, 300, 250]
+    assert chunks[1].startswith("w250 ")
+
+    with pytest.raises(ValueError):
+        ChunkParams(max_tokens=10, overlap_tokens=10)
+
+
+# Test 4: Over-long Paragraph Parts
+def test_long_paragraph_is_buffered_in_parts():
+    """Test that a paragraph spanning many pages is yielded in sentence-aligned parts"""
+    paragraph = " ".join(f"Sentence {i} of a very long paragraph." for i in range(300))
+    text = "Intro.\n\n" + paragraph + "\n\nOutro."
+    pages = [text[i:i + 97] for i in range(0, len(text), 97)]
+    parts = list(iter_paragraphs(pages, max_chars=500))
+
+    assert parts[0] == ("Intro.", True) and parts[-1] == ("Outro.", True)
+    middle = parts[1:-1]
+    assert len(middle) > 1
+    assert [starts for _, starts in middle] == [True] + [False] * (len(middle) - 1)
+    assert all(len(part) <= 500 and part.endswith(".") for part, _ in middle)
+    assert " ".join(part for part, _ in middle) == paragraph
+
+
+# Test 5: Window Overlap Stays Within The Limit
+def test_overlap_after_long_sentence_respects_limit():
+    """Test that the overlap carried out of a windowed sentence never pushes a chunk past max_tokens"""
+    text = " ".join(f"w{i}" for i in range(600)) + ". " + " ".join(f"v{i}" for i in range(500)) + "."
+    chunks = chunk_text(text, ChunkParams())
+    assert all(count_tokens(chunk) <= 512 for chunk in chunks)
+    assert chunks[-1].endswith("v499.")
+
+    params = ChunkParams(max_tokens=6, overlap_tokens=4)
+    chunks = chunk_text("a b c d e f g h. i j k l m.", params)
+    assert all(count_tokens(chunk) <= 6 for chunk in chunks)
+    assert chunks[-1].endswith("i j k l m.")
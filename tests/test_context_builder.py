@@ -0,0 +1,114 @@
+import asyncio
+import pytest
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.pool import StaticPool
+from datetime import datetime
+from app.models import Conversation, Message, User
+from app.services import summarizer
+from app.services.context_builder import ContextBudget, pack_context
+from app.services.fake_clients import FakeLLMClient
+from app.services.llm_service import set_llm_client
+from app.services.tokens import count_tokens
+from app.services.vector_index import ChunkSource
+
+
+def message(n, words=20):
+    return {"role": "user" if n % 2 == 0 else "model", "content": " ".join(f"m{n}w{i}" for i in range(words))}
+
+
+# Test 1: Budget, Newest History and Summary Tail
+def test_pack_context_stays_within_budget():
+    """Test that the newest messages, the question and the end of the summary are kept"""
+    budget = ContextBudget(max_tokens=200, summary_tokens=30, document_tokens=50)
+    messages = [message(n) for n in range(12)]
+    summary = " ".join(f"s{i}" for i in range(100))
+
+    packed = pack_context(summary, messages, budget=budget)
+
+    assert packed.tokens <= budget.max_tokens
+    assert packed.messages[-1] == messages[-1]
+    assert packed.messages == messages[-len(packed.messages):]
+    assert packed.dropped_messages == len(messages) - len(packed.messages) > 0
+    assert count_tokens(packed.summary) == 30
+    assert packed.summary.endswith("s99")
+
+
+# Test 2: Retrieved Sources Share the Budget
+def test_pack_context_fits_sources_in_rank_order():
+    """Test that sources are kept best first and an oversized first source is cut"""
+    budget = ContextBudget(max_tokens=200, summary_tokens=20, document_tokens=60)
+    sources = [ChunkSource(1, "doc", i, 1.0 - i / 10, " ".join(["word"] * 25)) for i in range(4)]
+
+    packed = pack_context(None, [message(0, words=5)], sources, budget)
+    assert [s.position for s in packed.sources] == [0, 1]
+    assert packed.dropped_sources == 2
+
+    huge = [ChunkSource(1, "doc", 0, 1.0, " ".join(["word"] * 500))]
+    packed = pack_context(None, [message(0, words=5)], huge, budget)
+    assert len(packed.sources) == 1
+    assert count_tokens(packed.sources[0].text) < budget.document_tokens
+
+    with pytest.raises(ValueError):
+        ContextBudget(max_tokens=100, summary_tokens=50, document_tokens=50)
+
+
+# Test 3: Oversized Summaries Are Condensed
+def test_long_summary_is_condensed(monkeypatch):
+    """Test that a summary over its token budget is rewritten shorter"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    long_summary = " ".join(f"fact{i}." for i in range(300))
+    with Session(engine) as db:
+        db.add(User(id=1, name="Summary", email="condense@test.com"))
+        db.add(Conversation(id=1, user_id=1, title="Long", summary=long_summary))
+        db.commit()
+
+    monkeypatch.setattr(summarizer, "SUMMARY_MAX_TOKENS", 100)
+    previous = set_llm_client(FakeLLMClient())
+    try:
+        assert asyncio.run(summarizer.condense_if_needed(engine, 1, long_summary))
+        assert not asyncio.run(summarizer.condense_if_needed(engine, 1, "short"))
+    finally:
+        set_llm_client(previous)
+
+    with Session(engine) as db:
+        condensed = db.get(Conversation, 1).summary
+    assert count_tokens(condensed) < count_tokens(long_summary)
+
+
+# Test 4: Pending Summary Blocks
+def test_pending_blocks_read_from_the_tail():
+    """Test that the unsummarized blocks are found from the newest messages, in (timestamp, id) order"""
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    same_time = datetime(2025, 1, 1)
+    with Session(engine) as db:
+        db.add(User(id=1, name="Blocks", email="blocks@test.com"))
+        db.add(Conversation(id=1, user_id=1, title="Blocks", message_count=34, summarized_count=15))
+        for n in range(34):
+            db.add(Message(conversation_id=1, role="user", content=f"m{n}", timestamp=same_time))
+        db.commit()
+
+    start, blocks = summarizer._pending_blocks(engine, 1, 30)
+    assert start == 15
+    assert [[m["content"] for m in block] for block in blocks] == [[f"m{n}" for n in range(15, 30)]]
+    assert summarizer._pending_blocks(engine, 1, 15) == (None, [])
+
+
+# Test 5: Conversation Locks Are Released
+def test_conversation_locks_are_dropped():
+    """Test that a conversation's summary lock is shared while in use and removed afterwards"""
+    async def scenario():
+        order = []
+
+        async def task(name):
+            async with summarizer._conversation_lock(7):
+                order.append(name)
+                await asyncio.sleep(0)
+                assert len(summarizer._locks) == 1
+
+        await asyncio.gather(task("a"), task("b"))
+        return order
+
+    assert asyncio.run(scenario()) == ["a", "b"]
+    assert summarizer._locks == {}
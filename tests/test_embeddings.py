@@ -0,0 +1,86 @@
+import pytest
+from app.services import rag_service
+from app.services.embedding_cache import EmbeddingCache, set_embedding_cache
+from app.services.fake_clients import FakeEmbeddingClient
+from app.services.rag_service import EmbeddingError, embed_query, get_embeddings, set_embedding_client
+
+
+@pytest.fixture(name="fake_embedder")
+def fake_embedder_fixture(monkeypatch):
+    monkeypatch.setattr(rag_service, "EMBED_BATCH_SIZE", 10)
+    monkeypatch.setattr(rag_service, "EMBED_BACKOFF_BASE", 0.0)
+    fake = FakeEmbeddingClient(dim=16)
+    previous = set_embedding_client(fake)
+    previous_cache = set_embedding_cache(EmbeddingCache(":memory:"))
+    yield fake
+    set_embedding_client(previous)
+    set_embedding_cache(previous_cache)
+
+
+# Test 1: Batched Embedding Keeps Order
+def test_batched_embeddings_preserve_order(fake_embedder):
+    """Test that chunks are sent in batches and come back in input order"""
+    texts = [f"chunk {i}" for i in range(35)]
+    embeddings = get_embeddings(texts)
+
+    assert fake_embedder.requests == 4
+    assert len(embeddings) == 35
+    assert embeddings[7] == get_embeddings(["chunk 7"])[0]
+
+
+# Test 2: Retry With Backoff
+def test_embedding_retries_transient_failures(fake_embedder):
+    """Test that failed batch calls are retried instead of returning zero vectors"""
+    fake_embedder.fail_first = 2
+    embeddings = get_embeddings(["retry me"])
+    assert fake_embedder.requests == 3
+    assert any(v != 0.0 for v in embeddings[0])
+
+
+# Test 3: Persistent Failure Raises
+def test_embedding_failure_raises(fake_embedder, monkeypatch):
+    """Test that exhausting retries raises EmbeddingError"""
+    monkeypatch.setattr(rag_service, "EMBED_MAX_RETRIES", 1)
+    fake_embedder.fail_first = 100
+    with pytest.raises(EmbeddingError):
+        get_embeddings(["never works"])
+
+
+# Test 4: Content-hash Cache Skips Known Chunks
+def test_embedding_cache_skips_known_texts(fake_embedder):
+    """Test that cached and duplicate texts are not sent to the embedder again"""
+    first = get_embeddings(["alpha", "beta", "alpha"])
+    assert fake_embedder.items == 2
+
+    second = get_embeddings(["beta", "alpha", "gamma"])
+    assert fake_embedder.items == 3
+    assert second[0] == first[1]
+    assert second[1] == first[0]
+
+
+# Test 5: Size-bounded Eviction
+def test_embedding_cache_eviction():
+    """Test that the least recently used vectors are evicted past max_entries"""
+    cache = EmbeddingCache(":memory:", max_entries=2)
+    cache.put_many("m", ["a"], [[1.0]])
+    cache.put_many("m", ["b"], [[2.0]])
+    cache.get_many("m", ["a"])
+    cache.put_many("m", ["c"], [[3.0]])
+
+    assert set(cache.get_many("m", ["a", "b", "c"])) == {0, 2}
+    assert cache.stats()["evictions"] == 1
+
+
+# Test 5: Questions Fail Fast
+def test_query_embedding_fails_fast(fake_embedder, monkeypatch):
+    """Test that question embeddings skip the ingestion backoff and upload rate limit"""
+    monkeypatch.setattr(rag_service, "EMBED_BACKOFF_BASE", 10.0)
+    monkeypatch.setattr(rag_service.embed_rate_limiter, "_tokens", 0.0)
+    monkeypatch.setattr(rag_service.embed_rate_limiter, "rate", 0.001)
+    fake_embedder.fail_first = 100
+    with pytest.raises(EmbeddingError):
+        embed_query("is anyone there?")
+    assert fake_embedder.requests == rag_service.EMBED_QUERY_MAX_RETRIES + 1
+
+    fake_embedder.fail_first = 0
+    assert embed_query("cached question") == get_embeddings(["cached question"])[0]
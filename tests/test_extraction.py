@@ -0,0 +1,74 @@
+import pytest
+from app.services import extraction
+from app.services.extraction import ExtractionError, count_pages, iter_pages, shutdown_pdf_pool
+
+
+def make_pdf(pages):
+    """Minimal PDF with one line of Helvetica text per page."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None, "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    out, offsets = "%PDF-1.4\n", []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    return out.encode("latin-1")
+
+
+# Test 1: Parallel PDF Extraction Keeps Page Order
+def test_parallel_pdf_extraction_keeps_page_order(tmp_path, monkeypatch):
+    """Test that pages extracted by the process pool come back in document order"""
+    texts = [f"Page {i} mentions topic{i}." for i in range(7)]
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(make_pdf(texts))
+
+    serial = list(iter_pages("doc.pdf", str(path)))
+
+    monkeypatch.setattr(extraction, "PDF_WORKERS", 2)
+    monkeypatch.setattr(extraction, "PDF_PARALLEL_MIN_PAGES", 1)
+    monkeypatch.setattr(extraction, "PDF_PAGES_PER_TASK", 3)
+    try:
+        parallel = list(iter_pages("doc.pdf", str(path)))
+    finally:
+        shutdown_pdf_pool()
+
+    assert count_pages("doc.pdf", str(path)) == 7
+    assert [page.strip() for page in serial] == texts
+    assert parallel == serial
+
+
+# Test 2: Text Files Stream in Blocks
+def test_text_extraction_streams_blocks(tmp_path, monkeypatch):
+    """Test that a text file is read in blocks without splitting characters"""
+    text = "héllo wörld " * 50
+    path = tmp_path / "notes.txt"
+    path.write_text(text, encoding="utf-8")
+    monkeypatch.setattr(extraction, "TEXT_READ_CHARS", 7)
+
+    blocks = list(iter_pages("notes.txt", str(path)))
+
+    assert len(blocks) > 1
+    assert "".join(blocks) == text
+    assert count_pages("notes.txt", str(path)) == 1
+
+
+# Test 3: Unreadable Files
+def test_unreadable_files_raise_extraction_error(tmp_path):
+    """Test that corrupt and unsupported files raise ExtractionError"""
+    path = tmp_path / "broken.pdf"
+    path.write_bytes(b"not a pdf")
+
+    with pytest.raises(ExtractionError, match="Error reading PDF"):
+        list(iter_pages("broken.pdf", str(path)))
+    with pytest.raises(ExtractionError, match="Unsupported"):
+        list(iter_pages("image.png", str(path)))
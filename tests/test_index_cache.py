@@ -0,0 +1,85 @@
+import numpy as np
+from app.services.index_cache import ConversationIndexCache
+from app.services.vector_index import ConversationIndex
+
+
+def make_index(document_id=1, rows=4, dim=8):
+    return ConversationIndex.from_documents([
+        (document_id, f"doc {document_id}", ["chunk"] * rows, np.ones((rows, dim)))
+    ])
+
+
+# Test 1: LRU Eviction Under Memory Budget
+def test_lru_eviction_respects_budget():
+    """Test that the least recently used index is evicted first"""
+    entry_size = make_index().nbytes
+    cache = ConversationIndexCache(max_bytes=entry_size * 2)
+
+    cache.put(10, make_index())
+    cache.put(20, make_index())
+    assert cache.get(10) is not None  # 10 becomes most recent
+    cache.put(30, make_index())
+
+    assert cache.get(20) is None
+    assert cache.get(10) is not None
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["bytes"] <= stats["max_bytes"]
+
+
+# Test 2: Invalidate by Conversation
+def test_invalidate_conversation():
+    """Test that invalidation drops only that conversation's index"""
+    cache = ConversationIndexCache()
+    cache.put(10, make_index())
+    cache.put(20, make_index())
+
+    cache.invalidate_conversation(10)
+
+    assert cache.get(10) is None
+    assert cache.get(20) is not None
+    assert cache.stats()["entries"] == 1
+
+
+# Test 3: Incremental Document Add and Remove
+def test_add_and_remove_document_with_provenance():
+    """Test that documents are merged into and dropped from a cached index"""
+    eye = np.eye(4)
+    cache = ConversationIndexCache()
+    cache.put(10, ConversationIndex.from_documents([(1, "alpha", ["a0", "a1"], eye[:2])]))
+
+    cache.add_document(10, 2, "beta", ["b0", "b1"], eye[2:])
+    cache.add_document(10, 2, "beta", ["b0", "b1"], eye[2:])  # idempotent
+    merged = cache.get(10)
+    assert len(merged) == 4
+
+    best = merged.search(eye[3], top_k=1)[0]
+    assert (best.document_id, best.title, best.position, best.text) == (2, "beta", 1, "b1")
+
+    cache.remove_document(10, 1)
+    remaining = cache.get(10)
+    assert remaining.chunks == ["b0", "b1"]
+    assert [s.document_id for s in remaining.search(eye[0], top_k=5)] == [2, 2]
+    # The old snapshot is untouched
+    assert len(merged) == 4
+    assert cache.stats()["bytes"] == remaining.nbytes
+
+
+# Test 4: Loads Racing a Change Are Not Cached
+def test_stale_load_is_not_cached():
+    """Test that an index loaded before a document change is returned but not stored"""
+    eye = np.eye(4)
+    cache = ConversationIndexCache()
+
+    def loader():
+        # Ingestion commits and patches the (still empty) cache while this load runs
+        stale = ConversationIndex.from_documents([(1, "alpha", ["a0"], eye[:1])])
+        cache.add_document(10, 2, "beta", ["b0"], eye[1:2])
+        return stale
+
+    assert len(cache.get_or_load(10, loader)) == 1
+    assert cache.get(10) is None
+
+    fresh = ConversationIndex.from_documents([(1, "alpha", ["a0"], eye[:1]), (2, "beta", ["b0"], eye[1:2])])
+    assert cache.get_or_load(10, lambda: fresh) is fresh
+    assert cache.get(10) is fresh
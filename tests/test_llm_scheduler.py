@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import time
+import pytest
+from app.services.llm_scheduler import AsyncSingleFlight, LLMScheduler, Overloaded, SingleFlight
+
+
+# Test 1: Bounded Concurrency and Round-Robin Between Users
+def test_scheduler_bounds_concurrency_and_alternates_users():
+    """Test that at most max_concurrency calls run and queued users take turns"""
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=10, max_queued_per_user=5, max_wait=5)
+    order = []
+    running = 0
+    peak = 0
+    
+    async def call(user, n):
+        nonlocal running, peak
+        async with scheduler.slot(user):
+            running += 1
+            peak = max(peak, running)
+            order.append(f"{user}{n}")
+            await asyncio.sleep(0.01)
+            running -= 1
+    
+    async def burst():
+        # User a floods the queue first; b and c arrive just after
+        calls = [call("a", n) for n in range(3)] + [call("b", 0), call("c", 0)]
+        await asyncio.gather(*calls)
+    
+    asyncio.run(burst())
+    assert peak == 1
+    assert order == ["a0", "a1", "b0", "c0", "a2"]
+    assert scheduler.stats()["active"] == 0 and scheduler.stats()["waiting"] == 0
+
+
+# Test 2: Early Rejection With Retry-After
+def test_scheduler_rejects_instead_of_queueing_past_deadline():
+    """Test that full user queues get 429, long waits 503, and waiters time out"""
+    scheduler = LLMScheduler(max_concurrency=1, max_queue=10, max_queued_per_user=1, max_wait=0.2,
+                             service_time=0.1)
+    
+    async def scenario():
+        await scheduler.acquire("a")
+        waiter = asyncio.ensure_future(scheduler.acquire("a"))
+        await asyncio.sleep(0)
+        
+        with pytest.raises(Overloaded) as user_full:
+            scheduler.check("a")
+        assert (user_full.value.status_code, user_full.value.retry_after) == (429, 1)
+        
+        scheduler.service_time = 10.0  # calls got slow: the expected wait now exceeds max_wait
+        with pytest.raises(Overloaded) as too_slow:
+            await scheduler.acquire("b")
+        assert too_slow.value.status_code == 503
+        assert too_slow.value.retry_after >= 20
+        
+        with pytest.raises(Overloaded) as timed_out:
+            await waiter
+        assert timed_out.value.status_code == 503
+        scheduler.release()
+    
+    asyncio.run(scenario())
+    stats = scheduler.stats()
+    assert (stats["active"], stats["waiting"], stats["rejected"], stats["timed_out"]) == (0, 0, 2, 1)
+
+
+# Test 3: Identical In-Flight Calls Are Collapsed
+def test_single_flight_shares_one_call():
+    """Test that concurrent identical calls run once, in threads and in coroutines"""
+    flights = SingleFlight()
+    calls = []
+    
+    def slow_embed():
+        calls.append(1)
+        deadline = time.monotonic() + 5
+        while flights.collapsed < 3 and time.monotonic() < deadline:
+            time.sleep(0.001)  # stay in flight until every other thread has joined
+        return [0.1, 0.2]
+    
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do("q", slow_embed))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1 and flights.collapsed == 3
+    assert results == [[0.1, 0.2]] * 4
+    
+    async_flights = AsyncSingleFlight()
+    async_calls = []
+    
+    async def summarize():
+        async_calls.append(1)
+        await asyncio.sleep(0.01)
+        return "summary"
+    
+    async def many():
+        return await asyncio.gather(*(async_flights.do("block", summarize) for _ in range(3)))
+    
+    assert asyncio.run(many()) == ["summary"] * 3
+    assert len(async_calls) == 1
+    assert asyncio.run(async_flights.do("block", summarize)) == "summary"
+    assert len(async_calls) == 2
@@ -0,0 +1,85 @@
+import contextvars
+import re
+import threading
+import time
+import pytest
+from app.services.metrics import Registry, end_trace, server_timing, span, start_trace
+from app.services.profiler import SamplingProfiler
+
+
+# Test 1: Prometheus Text Format
+def test_registry_renders_counters_and_histograms():
+    """Test that counters and cumulative histogram buckets render in the text format"""
+    registry = Registry()
+    errors = registry.counter("test_errors_total", "Errors", ("operation",))
+    latency = registry.histogram("test_latency_seconds", "Latency", ("stage",), buckets=(0.1, 1.0))
+    errors.inc(operation="chat")
+    errors.inc(2, operation="chat")
+    for seconds in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(seconds, stage="llm")
+    
+    text = registry.render()
+    assert "# TYPE test_errors_total counter" in text
+    assert 'test_errors_total{operation="chat"} 3' in text
+    assert 'test_latency_seconds_bucket{stage="llm",le="0.1"} 2' in text
+    assert 'test_latency_seconds_bucket{stage="llm",le="1.0"} 3' in text
+    assert 'test_latency_seconds_bucket{stage="llm",le="+Inf"} 4' in text
+    assert 'test_latency_seconds_count{stage="llm"} 4' in text
+    assert latency.snapshot(stage="llm") == (4, pytest.approx(3.65))
+    
+    with pytest.raises(ValueError):
+        errors.inc(stage="chat")
+    with pytest.raises(ValueError):
+        registry.counter("test_errors_total", "Again")
+
+
+# Test 2: Spans Join the Request Trace
+def test_spans_are_collected_per_trace():
+    """Test that spans, including those of worker threads, land on the active trace only"""
+    with span("outside"):
+        pass
+    
+    spans, token = start_trace()
+    try:
+        with span("retrieval"):
+            time.sleep(0.01)
+        with span("retrieval"):
+            pass
+        def in_worker():
+            with span("llm.chat"):
+                pass
+        # run_in_threadpool copies the context the same way
+        worker = threading.Thread(target=contextvars.copy_context().run, args=(in_worker,))
+        worker.start()
+        worker.join()
+    finally:
+        end_trace(token)
+    
+    assert [stage for stage, _ in spans] == ["retrieval", "retrieval", "llm.chat"]
+    header = server_timing(spans)
+    assert re.fullmatch(r"retrieval;dur=\d+\.\d, llm\.chat;dur=\d+\.\d", header)
+    assert float(header.split("dur=")[1].split(",")[0]) >= 10
+
+
+# Test 3: Sampling Profiler
+def test_sampling_profiler_records_busy_threads(tmp_path):
+    """Test that the profiler captures a busy thread's stack in folded format"""
+    done = threading.Event()
+    
+    def busy_loop():
+        while not done.is_set():
+            sum(range(1000))
+    
+    worker = threading.Thread(target=busy_loop, name="busy")
+    worker.start()
+    profiler = SamplingProfiler(interval=0.001).start()
+    time.sleep(0.1)
+    profiler.stop()
+    done.set()
+    worker.join()
+    
+    assert profiler.samples > 0
+    assert any(stack.startswith("busy;") and "busy_loop" in stack for stack in profiler.stacks)
+    path = profiler.save(str(tmp_path / "profile.folded"))
+    line = open(path).readline()
+    assert re.fullmatch(r".+ \d+\n", line)
@@ -0,0 +1,82 @@
+from sqlalchemy import inspect, text
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.pool import StaticPool
+from app import migrations
+from app.migrations import MIGRATIONS, backfill_in_batches, current_version, run_migrations
+from app.models import Conversation
+
+
+def make_engine():
+    return create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+
+
+def create_legacy_schema(engine, conversations=7, messages_each=3):
+    """Tables as the first release created them: no counters, no extra indexes."""
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE user (id INTEGER PRIMARY KEY, name VARCHAR NOT NULL, "
+            "email VARCHAR NOT NULL, created_at DATETIME NOT NULL)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE conversation (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, "
+            "title VARCHAR NOT NULL, mode VARCHAR NOT NULL, summary VARCHAR, "
+            "created_at DATETIME NOT NULL, last_updated DATETIME NOT NULL)"
+        ))
+        conn.execute(text(
+            "CREATE TABLE message (id INTEGER PRIMARY KEY, conversation_id INTEGER NOT NULL, "
+            "role VARCHAR NOT NULL, content VARCHAR NOT NULL, timestamp DATETIME NOT NULL)"
+        ))
+        conn.execute(text("INSERT INTO user VALUES (1, 'old', 'old@test.com', '2025-01-01')"))
+        for c in range(1, conversations + 1):
+            conn.execute(text(
+                f"INSERT INTO conversation VALUES ({c}, 1, 't', 'chat', NULL, '2025-01-01', '2025-01-01')"
+            ))
+            for m in range(messages_each * c):
+                conn.execute(text(
+                    f"INSERT INTO message (conversation_id, role, content, timestamp) "
+                    f"VALUES ({c}, 'user', 'm{m}', '2025-01-01')"
+                ))
+
+
+# Test 1: Upgrade Legacy Database
+def test_upgrade_legacy_database(monkeypatch):
+    """Test that an old database gets the new columns, indexes and batched backfills"""
+    monkeypatch.setattr(migrations, "BATCH_SIZE", 2)
+    engine = make_engine()
+    create_legacy_schema(engine)
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE conversation SET summary = 'old summary' WHERE id >= 5"))
+
+    assert current_version(engine) == 0
+    applied = run_migrations(engine)
+    assert applied == [version for version, _, _ in MIGRATIONS]
+    assert current_version(engine) == applied[-1]
+
+    indexes = {ix["name"] for ix in inspect(engine).get_indexes("message")}
+    assert "ix_message_conversation_timestamp" in indexes
+    with Session(engine) as db:
+        assert [db.get(Conversation, c).message_count for c in range(1, 8)] == [3 * c for c in range(1, 8)]
+        # Summarized conversations (15, 18 and 21 messages) cover every complete block of 15
+        assert [db.get(Conversation, c).summarized_count for c in range(1, 8)] == [0, 0, 0, 0, 15, 15, 15]
+
+    # Already at head: nothing to do
+    assert run_migrations(engine) == []
+
+
+# Test 2: Target Version And Batches
+def test_partial_upgrade_and_batches():
+    """Test that upgrades stop at a target version and backfills commit per batch"""
+    engine = make_engine()
+    create_legacy_schema(engine, conversations=5)
+    assert run_migrations(engine, target=2) == [1, 2]
+    assert current_version(engine) == 2
+
+    assert backfill_in_batches(engine, "conversation", "message_count = 1", batch_size=2) == 3
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT SUM(message_count) FROM conversation")).scalar() == 5
+    assert run_migrations(engine) == [3, 4, 5, 6, 7, 8, 9]
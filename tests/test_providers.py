@@ -0,0 +1,50 @@
+import asyncio
+import pytest
+from app.services import providers
+from app.services.embedding_cache import EmbeddingCache, set_embedding_cache
+from app.services.fake_clients import FakeLLMClient, LocalClient
+from app.services.llm_service import call_gemini_chat_async, call_gemini_rag
+from app.services.rag_service import get_embeddings
+
+
+@pytest.fixture(name="local_provider")
+def local_provider_fixture(monkeypatch):
+    monkeypatch.setenv("LLM_PROVIDER", "local")
+    monkeypatch.setenv("LOCAL_LLM_REPLY", "Canned answer.")
+    monkeypatch.setattr(providers, "_client", None)
+    monkeypatch.setattr(providers, "_overrides", {role: None for role in providers.ROLES})
+    previous_cache = set_embedding_cache(EmbeddingCache(":memory:"))
+    yield
+    set_embedding_cache(previous_cache)
+
+
+# Test 1: One Lazily Created Client Serves Both Roles
+def test_shared_client_is_created_on_first_use(local_provider):
+    """Test that generation and embeddings share one client built on first use"""
+    assert providers._client is None
+
+    assert call_gemini_rag("Question?", "[1] Context") == "Canned answer."
+    reply = asyncio.run(call_gemini_chat_async(None, [{"role": "user", "content": "Hi"}]))
+    assert reply == "Canned answer."
+    first, again = get_embeddings(["same text", "same text"])
+
+    client = providers.get_client("embedding")
+    assert isinstance(client, LocalClient)
+    assert providers.get_client("llm") is client
+    assert first == again
+    assert client.llm.requests == 2
+
+
+# Test 2: Per-Role Overrides
+def test_role_override_and_restore(local_provider):
+    """Test that overriding one role leaves the other on the shared client"""
+    fake = FakeLLMClient(reply="From the fake.")
+    assert providers.set_client("llm", fake) is None
+
+    assert call_gemini_rag("Question?", "[1] Context") == "From the fake."
+    assert isinstance(providers.get_client("embedding"), LocalClient)
+    assert providers.set_client("llm", None) is fake
+    assert providers.get_client("llm") is providers.get_client("embedding")
+
+    with pytest.raises(ValueError):
+        providers.create_client("nonexistent")
@@ -0,0 +1,72 @@
+import numpy as np
+from app.services.response_cache import ResponseCache
+from app.services.vector_index import ConversationIndex
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_index(document_id=1, text="handbook", rows=3, dim=4):
+    return ConversationIndex.from_documents([
+        (document_id, f"doc {document_id}", [f"{text} {i}" for i in range(rows)], np.eye(rows, dim))
+    ])
+
+
+def citation(document_id):
+    return {"number": 1, "document_id": document_id, "title": f"doc {document_id}", "chunk": 0}
+
+
+# Test 1: Similarity Threshold and Scope
+def test_lookup_threshold_and_scope():
+    """Test that near-identical questions hit across conversations with the same documents, unless private"""
+    cache = ResponseCache(threshold=0.9)
+    index = make_index(document_id=1)
+    cache.store(None, index, [1.0, 0.0, 0.0, 0.0], "Twenty weeks.", [citation(1)])
+
+    assert cache.lookup(None, index, [0.0, 1.0, 0.0, 0.0]) is None
+    response, citations = cache.lookup(None, index, [1.0, 0.1, 0.0, 0.0])
+    assert response == "Twenty weeks."
+    assert citations[0]["document_id"] == 1
+
+    # The same content in another conversation reuses it, citing that conversation's copy
+    _, citations = cache.lookup(None, make_index(document_id=7), [1.0, 0.0, 0.0, 0.0])
+    assert citations[0]["document_id"] == 7
+
+    # Answers generated with a conversation's summary stay in that conversation
+    cache.store(10, index, [0.0, 0.0, 1.0, 0.0], "As discussed, yes.", [citation(1)])
+    assert cache.lookup(11, index, [0.0, 0.0, 1.0, 0.0]) is None
+    assert cache.lookup(None, index, [0.0, 0.0, 1.0, 0.0]) is None
+    assert cache.lookup(10, index, [0.0, 0.0, 1.0, 0.0])[0] == "As discussed, yes."
+
+    # Changed content is a different scope
+    assert cache.lookup(None, make_index(document_id=1, text="changed"), [1.0, 0.0, 0.0, 0.0]) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (3, 4)
+
+
+# Test 2: TTL and LRU Eviction
+def test_ttl_and_lru_eviction():
+    """Test that entries expire after the TTL and the least recently used one is evicted"""
+    clock = FakeClock()
+    cache = ResponseCache(threshold=0.99, ttl=60, max_entries=2, clock=clock)
+    index = make_index()
+    first, second, third = np.eye(4)[:3]
+
+    cache.store(1, index, first, "first", [])
+    cache.store(1, index, second, "second", [])
+    assert cache.lookup(1, index, first) is not None  # first becomes most recent
+    cache.store(1, index, third, "third", [])
+
+    assert cache.lookup(1, index, second) is None
+    assert cache.lookup(1, index, first) is not None
+    clock.now = 61
+    assert cache.lookup(1, index, first) is None
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["expirations"] == 2
+    assert stats["entries"] == 0
@@ -0,0 +1,80 @@
+import numpy as np
+from app.services.ann_index import IVFIndex
+from app.services.bm25 import BM25Index, reciprocal_rank_fusion
+from app.services.rag_service import cosine_similarity
+from app.services.vector_index import VectorIndex
+
+
+# Test 1: Top-k Matches Brute Force
+def test_vector_index_matches_cosine_loop():
+    """Test that matrix search returns the same ranking as per-chunk cosine"""
+    rng = np.random.default_rng(42)
+    embeddings = rng.standard_normal((200, 32)).tolist()
+    query = rng.standard_normal(32).tolist()
+
+    expected = sorted(
+        range(len(embeddings)),
+        key=lambda i: cosine_similarity(query, embeddings[i]),
+        reverse=True
+    )[:5]
+
+    scores, indices = VectorIndex.from_embeddings(embeddings).search(query, top_k=5)
+    assert list(indices) == expected
+    assert np.allclose(scores, [cosine_similarity(query, embeddings[i]) for i in expected], atol=1e-5)
+
+
+# Test 2: Zero Vectors
+def test_vector_index_zero_vectors():
+    """Test that zero embeddings score 0 instead of producing NaN"""
+    index = VectorIndex.from_embeddings([[0.0, 0.0], [1.0, 0.0]])
+    scores, indices = index.search([1.0, 0.0], top_k=5)
+    assert list(indices) == [1, 0]
+    assert scores.tolist() == [1.0, 0.0]
+
+    scores, _ = index.search([0.0, 0.0], top_k=1)
+    assert scores.tolist() == [0.0]
+
+
+# Test 3: IVF Index Against Exact Search
+def test_ivf_index_recall_and_persistence(tmp_path):
+    """Test that full probing is exact, updates apply, and the index round-trips"""
+    rng = np.random.default_rng(7)
+    embeddings = rng.standard_normal((600, 16))
+    index = IVFIndex(16, min_train=400)
+    for doc_id in range(6):
+        index.add(doc_id, embeddings[doc_id * 100:(doc_id + 1) * 100])
+    assert index.is_trained and index.n_lists > 1
+
+    query = rng.standard_normal(16)
+    _, exact_rows = VectorIndex.from_embeddings(embeddings).search(query, 10)
+    _, doc_ids, positions = index.search(query, 10, nprobe=index.n_lists)
+    assert (doc_ids * 100 + positions).tolist() == exact_rows.tolist()
+
+    assert index.remove([0, 1]) == 200
+    _, doc_ids, _ = index.search(query, 50, nprobe=index.n_lists)
+    assert not {0, 1} & set(doc_ids.tolist())
+
+    index.save(tmp_path / "ivf.npz")
+    loaded = IVFIndex.load(tmp_path / "ivf.npz")
+    assert len(loaded) == 400 and loaded.documents() == {2, 3, 4, 5}
+    assert [a.tolist() for a in loaded.search(query, 5, 2)] == [a.tolist() for a in index.search(query, 5, 2)]
+
+
+# Test 4: BM25 Merge, Removal and Fusion
+def test_bm25_concat_take_and_fusion():
+    """Test that merged/filtered BM25 indexes score like one built from scratch"""
+    first = ["the cat sat on the mat", "dogs chase cats"]
+    second = ["a mat made of straw", "the quick brown fox", "cat food prices"]
+    merged = BM25Index.from_chunks(first).concat(BM25Index.from_bytes(BM25Index.from_chunks(second).to_bytes()))
+    direct = BM25Index.from_chunks(first + second)
+    assert np.allclose(merged.scores("cat mat"), direct.scores("cat mat"))
+
+    keep = np.array([True, False, True, True, False])
+    assert np.allclose(merged.take(keep).scores("cat mat"),
+                       BM25Index.from_chunks([first[0], second[0], second[1]]).scores("cat mat"))
+
+    _, rows = direct.search("cat mat", 5)
+    assert rows.tolist()[0] == 0 and 1 not in rows.tolist()  # "cats" is a different token
+
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1]])
+    assert [row for row, _ in fused] == [1, 3, 2]
@@ -0,0 +1,100 @@
+import json
+import numpy as np
+from sqlalchemy import inspect, text
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.pool import StaticPool
+from app.database import SQLITE_PRAGMAS, create_app_engine
+from app.migrations import run_migrations
+from app.models import Conversation, Document, User
+from app.services.document_store import (
+    load_chunk, load_chunks, load_embeddings, migrate_document_storage, store_document_content
+)
+
+
+def make_engine():
+    return create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+
+
+# Test 1: Binary Round Trip
+def test_document_content_round_trip():
+    """Test that chunks and float32 embeddings survive storage unchanged"""
+    engine = make_engine()
+    SQLModel.metadata.create_all(engine)
+    chunks = ["first chunk", "second chunk", "third chunk"]
+    embeddings = np.random.default_rng(0).standard_normal((3, 8)).tolist()
+
+    with Session(engine) as db:
+        user = User(name="Store", email="store@test.com")
+        db.add(user)
+        db.commit()
+        conv = Conversation(user_id=user.id, title="t", mode="rag")
+        db.add(conv)
+        db.commit()
+        doc = Document(conversation_id=conv.id, title="doc", text="")
+        store_document_content(db, doc, chunks, embeddings)
+        db.commit()
+
+        loaded = db.get(Document, doc.id)
+        matrix = load_embeddings(loaded)
+        assert matrix.dtype == np.float32
+        assert matrix.shape == (3, 8)
+        assert np.allclose(matrix, embeddings, atol=1e-6)
+        assert load_chunks(db, doc.id) == chunks
+        assert load_chunk(db, doc.id, 1) == "second chunk"
+
+
+# Test 2: Legacy JSON Migration
+def test_migrate_legacy_json_document():
+    """Test that an old-schema JSON document is converted in place"""
+    engine = make_engine()
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE document (id INTEGER PRIMARY KEY, conversation_id INTEGER NOT NULL, "
+            "title VARCHAR NOT NULL, text VARCHAR NOT NULL, chunks VARCHAR NOT NULL, "
+            "embeddings VARCHAR NOT NULL, created_at DATETIME NOT NULL)"
+        ))
+        conn.execute(
+            text("INSERT INTO document VALUES (1, 1, 'old', '', :c, :e, '2025-01-01 00:00:00')"),
+            {"c": json.dumps(["a", "b"]), "e": json.dumps([[1.0, 0.0], [0.0, 1.0]])}
+        )
+    SQLModel.metadata.create_all(engine)
+    # Version 1 converts the row before later versions add their document columns
+    assert run_migrations(engine, target=1) == [1]
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT chunk_count, embedding_dim, chunks FROM document")).one() == (2, 2, "")
+    run_migrations(engine)
+
+    with Session(engine) as db:
+        assert load_chunks(db, 1) == ["a", "b"]
+    assert migrate_document_storage(engine) == 0
+
+    with Session(engine) as db:
+        doc = db.get(Document, 1)
+        assert doc.embeddings == ""
+        assert load_embeddings(doc).tolist() == [[1.0, 0.0], [0.0, 1.0]]
+
+
+# Test 3: Engine Factory
+def test_sqlite_engine_pragmas_and_indexes(tmp_path):
+    """Test that file databases get WAL and the tuning pragmas plus foreign-key indexes"""
+    engine = create_app_engine(f"sqlite:///{tmp_path / 'tuned.db'}")
+    SQLModel.metadata.create_all(engine)
+    run_migrations(engine)
+
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == SQLITE_PRAGMAS["busy_timeout"]
+    indexes = {
+        table: {ix["name"] for ix in inspect(engine).get_indexes(table)}
+        for table in ("document", "ingestionjob", "message", "conversation")
+    }
+    assert "ix_document_conversation_id" in indexes["document"]
+    assert "ix_ingestionjob_conversation_id" in indexes["ingestionjob"]
+    assert "ix_message_conversation_timestamp" in indexes["message"]
+    assert "ix_conversation_user_last_updated" in indexes["conversation"]
+    engine.dispose()